@@ -0,0 +1,136 @@
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """
+    Connection settings shared by every client the registry creates.
+
+    The defaults keep connections alive between warm invocations, allow enough
+    pooled connections for threaded stream processing, fail fast on a stuck
+    connection and let botocore's standard retry mode handle throttling.
+    """
+
+    region_name: Optional[str] = None
+    max_pool_connections: int = 50
+    tcp_keepalive: bool = True
+    retry_mode: str = "standard"
+    max_attempts: int = 3
+    connect_timeout: float = 2
+    read_timeout: float = 10
+
+    def botocore_config(self):
+        from botocore.config import Config
+
+        return Config(
+            region_name=self.region_name,
+            max_pool_connections=self.max_pool_connections,
+            tcp_keepalive=self.tcp_keepalive,
+            retries={"mode": self.retry_mode, "max_attempts": self.max_attempts},
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+        )
+
+
+@dataclass
+class ClientRegistry:
+    """
+    Creates boto3 clients, resources and tables on first use and keeps them for
+    the life of the process, so warm invocations reuse their connections
+    instead of paying for client construction and a new TCP/TLS handshake.
+
+    Clients are safe to share between threads. Resources and tables are shared
+    too, which is fine for the get/put/query calls cloudly makes.
+    """
+
+    settings: ClientSettings = field(default_factory=ClientSettings)
+    _session: Any = field(default=None, init=False, repr=False)
+    _cache: Dict[tuple, Any] = field(default_factory=dict, init=False, repr=False)
+    _lock: Any = field(default_factory=threading.RLock, init=False, repr=False)
+
+    def client(self, service_name: str, region_name: str = None):
+        return self._get(("client", service_name, region_name))
+
+    def resource(self, service_name: str, region_name: str = None):
+        return self._get(("resource", service_name, region_name))
+
+    def table(self, table_name: str, region_name: str = None):
+        key = ("table", table_name, region_name)
+        table = self._cache.get(key)
+        if table is None:
+            with self._lock:
+                table = self._cache.get(key)
+                if table is None:
+                    dynamodb = self.resource("dynamodb", region_name)
+                    table = self._cache[key] = dynamodb.Table(table_name)
+        return table
+
+    def configure(self, **settings):
+        """Change the connection settings. Clients created before are dropped."""
+
+        with self._lock:
+            self.settings = replace(self.settings, **settings)
+            self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._session = None
+
+    def _get(self, key: tuple):
+        value = self._cache.get(key)
+        if value is None:
+            with self._lock:
+                value = self._cache.get(key)
+                if value is None:
+                    value = self._cache[key] = self._create(*key)
+        return value
+
+    def _create(self, kind: str, service_name: str, region_name: Optional[str]):
+        # boto3 sessions are not thread safe, so clients are created under the
+        # lock from one session owned by the registry.
+        if self._session is None:
+            import boto3
+
+            self._session = boto3.session.Session()
+
+        create = self._session.client if kind == "client" else self._session.resource
+        return create(
+            service_name,
+            region_name=region_name or self.settings.region_name,
+            config=self.settings.botocore_config(),
+        )
+
+
+_registry = ClientRegistry()
+
+
+def registry() -> ClientRegistry:
+    """The process-wide registry used by cloudly."""
+
+    return _registry
+
+
+def client(service_name: str, region_name: str = None):
+    return _registry.client(service_name, region_name)
+
+
+def resource(service_name: str, region_name: str = None):
+    return _registry.resource(service_name, region_name)
+
+
+def table(table_name: str, region_name: str = None):
+    return _registry.table(table_name, region_name)
+
+
+def resolve_table(table_or_name: Any):
+    """
+    Accept a table name where a table is expected: names are looked up in the
+    registry, anything else (a boto3 Table, a stand-in) is returned as is.
+    """
+
+    if isinstance(table_or_name, str):
+        return _registry.table(table_or_name)
+    return table_or_name
@@ -0,0 +1,158 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+# Returned by loaders (and the cache) when a key does not exist.
+# Missing keys are cached too so that repeated reads of an unset flag stay cheap.
+MISSING = _Missing()
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    stale_until: float
+
+
+class _PendingLoad:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ConfigCache:
+    """
+    In-process cache for config values.
+
+    Entries are fresh for ttl seconds. After that they are served stale for up to
+    stale_ttl more seconds while a background refresh runs. Concurrent misses on
+    the same key share a single load. The cache lives as long as the process, so
+    it survives across warm lambda invocations.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60,
+        stale_ttl: float = 300,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.clock = clock
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._pending: Dict[Hashable, _PendingLoad] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = self.clock()
+            if now < entry.expires_at:
+                return entry.value
+            if now < entry.stale_until:
+                self._refresh(key, loader, ttl)
+                return entry.value
+
+        return self._load(key, loader, ttl)
+
+    def peek(self, key: Hashable, default: Any = None, stale=False) -> Any:
+        """
+        Return the cached value of key if it is still fresh (or cached at all
+        when stale is True), default otherwise. Never loads or refreshes.
+        """
+
+        entry = self._entries.get(key)
+        if entry is None or (not stale and self.clock() >= entry.expires_at):
+            return default
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is MISSING else self.ttl
+        expires_at = self.clock() + ttl
+        self._entries[key] = CacheEntry(value, expires_at, expires_at + self.stale_ttl)
+
+    def invalidate(self, key: Hashable = None, prefix: tuple = None):
+        """
+        Drop key, every tuple key starting with prefix, or everything.
+        """
+
+        if key is not None:
+            self._entries.pop(key, None)
+        elif prefix is not None:
+            size = len(prefix)
+            for cached_key in list(self._entries):
+                if isinstance(cached_key, tuple) and cached_key[:size] == prefix:
+                    self._entries.pop(cached_key, None)
+        else:
+            self._entries.clear()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]):
+        with self._lock:
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = _PendingLoad()
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = loader()
+            self.set(key, pending.value, ttl)
+            return pending.value
+        except Exception as ex:
+            pending.error = ex
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]):
+        if key in self._pending:
+            return
+
+        def refresh():
+            try:
+                self._load(key, loader, ttl)
+            except Exception as ex:
+                print(f"Unable to refresh cached config {key}", ex)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="config-refresh"
+                )
+        self._executor.submit(refresh)
+
+
+_shared_cache = ConfigCache()
+
+
+def shared_cache() -> ConfigCache:
+    """
+    A process-wide cache for ConfigClients to share: ConfigClient(..., cache=shared_cache()).
+    """
+
+    return _shared_cache
@@ -1,37 +1,357 @@
-from dataclasses import dataclass
-from typing import Any
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional
+
+from cloudly.aws.clients import resolve_table
+from cloudly.config.cache import MISSING, ConfigCache
+from cloudly.db.batch import batch_get, batch_write
+
+# Every partition has one small item whose version is bumped by each set.
+# Readers poll it to find out whether their cached snapshot is out of date.
+VERSION_KEY = "#VERSION"
+VERSION_FIELD = "version"
+
+_NOT_CACHED = object()
 
 
 @dataclass
 class ConfigClient:
+    """
+    Reads and writes config values stored under pk=APP#STAGE (or pk=APP when shared).
+
+    Reads go to the table unless a cache is given. Pass cache=shared_cache() to
+    share one ConfigCache with every client in the process, so values survive
+    across warm invocations; cached values can then be up to the cache's ttl plus
+    stale_ttl old.
+
+    With poll_interval set, reads check the partition's version item at most once
+    per interval and reload the whole partition only when the version has changed.
+    Polling keeps a cache fresh, so poll_interval requires a cache.
+
+    table can be a table name, the Table then comes from the shared client
+    registry (see cloudly.aws.clients).
+    """
+
     table: Any
     app_key: str
     value_field: str = "value"
     stage_name: str = "beta"
+    cache: Optional[ConfigCache] = None
+    ttl: Optional[float] = None
+    poll_interval: Optional[float] = None
+    _batch: threading.local = field(
+        default_factory=threading.local, init=False, repr=False, compare=False
+    )
 
-    def get(self, key: str, default=None, shared=False) -> Any:
+    def __post_init__(self):
+        if self.poll_interval is not None and self.cache is None:
+            raise ValueError("poll_interval requires a cache")
+        self.table = resolve_table(self.table)
+
+    def get(self, key: str, default=None, shared=False, ttl: float = None) -> Any:
         try:
             item_key = self.__get_key(key, shared)
-            response = self.table.get_item(Key=item_key)
-            return response.get("Item", {}).get(self.value_field)
+            if self.poll_interval is not None:
+                self.refresh_if_changed(shared)
+
+            if self.cache is None:
+                value = self.__read(item_key)
+            else:
+                value = self.cache.get(
+                    self.__cache_key(item_key),
+                    lambda: self.__read(item_key),
+                    self.ttl if ttl is None else ttl,
+                )
+            return None if value is MISSING else value
         except Exception as ex:
             print(f"Unable to read Config pk:{self.app_key} sk:{key}", ex)
             return default
 
     def set(self, key: str, value: Any, shared=False):
+        item_key = self.__get_key(key, shared)
+        pending_writes = getattr(self._batch, "writes", None)
+        if pending_writes is not None:
+            item = {**item_key, self.value_field: value}
+            pending_writes[(item_key["pk"], key)] = item
+            if self.cache is not None:
+                self.cache.set(self.__cache_key(item_key), value, self.ttl)
+            return
+
         try:
-            item_key = self.__get_key(key, shared)
             self.table.put_item(Item={**item_key, self.value_field: value})
+            if self.cache is not None:
+                self.cache.set(self.__cache_key(item_key), value, self.ttl)
         except Exception as ex:
+            if self.cache is not None:
+                self.cache.invalidate(self.__cache_key(item_key))
             print(f"Unable to read Config pk:{self.app_key} sk:{key}", ex)
+            return
+
+        self.__bump_version(item_key["pk"])
+
+    def get_many(self, keys: Iterable[str], shared=False) -> Dict[str, Any]:
+        """
+        Read several keys at once. Fresh cached values are used as-is and the rest
+        are fetched with batch_get_item. Missing keys map to None.
+        """
+
+        if self.poll_interval is not None:
+            self.refresh_if_changed(shared)
+
+        values = {}
+        item_keys = []
+        for key in keys:
+            if key in values:
+                continue
+
+            item_key = self.__get_key(key, shared)
+            value = _NOT_CACHED
+            if self.cache is not None:
+                value = self.cache.peek(self.__cache_key(item_key), _NOT_CACHED)
+            if value is _NOT_CACHED:
+                item_keys.append(item_key)
+                value = MISSING
+            values[key] = None if value is MISSING else value
+
+        if not item_keys:
+            return values
+
+        try:
+            items = batch_get(
+                self.table,
+                item_keys,
+                projection=("pk", "sk", self.value_field),
+            )
+        except Exception as ex:
+            print(f"Unable to read Config pk:{self.app_key}", ex)
+            return values
+
+        found = {item["sk"]: item.get(self.value_field) for item in items}
+        for item_key in item_keys:
+            value = found.get(item_key["sk"], MISSING)
+            values[item_key["sk"]] = None if value is MISSING else value
+            if self.cache is not None:
+                self.cache.set(self.__cache_key(item_key), value, self.ttl)
+
+        return values
+
+    def preload(self, include_shared=False) -> Dict[str, Any]:
+        """
+        Load every key of the app/stage partition (and the shared partition when
+        include_shared is True) into the cache with one paginated query each.
+        Stage values take precedence over shared ones in the returned dict.
+        """
+
+        values = {}
+        partitions = (True, False) if include_shared else (False,)
+        for shared in partitions:
+            pk = self.__get_key("", shared)["pk"]
+            try:
+                values.update(self.__load_partition(pk))
+            except Exception as ex:
+                print(f"Unable to preload Config pk:{pk}", ex)
+
+        return values
+
+    def refresh_if_changed(self, shared=False, force=False) -> bool:
+        """
+        Read the partition's version item (at most once per poll_interval unless
+        force is True) and reload the partition if the version has changed.
+        Returns True when the cached values were refreshed.
+        """
+
+        if self.cache is None:
+            return False
+
+        pk = self.__get_key("", shared)["pk"]
+        version_key = self.__version_cache_key(pk)
+        if not force and self.cache.peek(version_key, _NOT_CACHED) is not _NOT_CACHED:
+            return False
+
+        known = self.cache.peek(version_key, None, stale=True)
+        try:
+            response = self.table.get_item(
+                Key={"pk": pk, "sk": VERSION_KEY},
+                ProjectionExpression="#version",
+                ExpressionAttributeNames={"#version": VERSION_FIELD},
+            )
+            current = response.get("Item", {}).get(VERSION_FIELD, 0)
+        except Exception as ex:
+            print(f"Unable to read Config version pk:{pk}", ex)
+            return False
+
+        self.cache.set(version_key, current, self.poll_interval or self.ttl)
+        if known is None or known == current:
+            return False
+
+        self.cache.invalidate(prefix=self.__partition_cache_key(pk))
+        try:
+            self.__load_partition(pk)
+        except Exception as ex:
+            print(f"Unable to reload Config pk:{pk}", ex)
+        return True
 
     def get_or_set(self, key: str, default: str, shared=False):
-        value = self.get(key, None, shared)
-        if value:
-            return value
-        if default:
-            self.set(key, default, shared)
-        return default
+        """
+        Return the stored value of key, storing default first if key has no value.
+        This is a single update_item call using if_not_exists, so concurrent
+        callers all end up with whichever value was written first.
+        """
+
+        if not default:
+            value = self.get(key, None, shared)
+            return value if value else default
+
+        item_key = self.__get_key(key, shared)
+        if self.cache is not None:
+            value = self.cache.peek(self.__cache_key(item_key), MISSING)
+            if value is not MISSING and value is not None:
+                return value
+
+        try:
+            response = self.table.update_item(
+                Key=item_key,
+                UpdateExpression="SET #value = if_not_exists(#value, :default)",
+                ExpressionAttributeNames={"#value": self.value_field},
+                ExpressionAttributeValues={":default": default},
+                ReturnValues="ALL_OLD",
+            )
+        except Exception as ex:
+            print(f"Unable to read Config pk:{self.app_key} sk:{key}", ex)
+            return default
+
+        old = response.get("Attributes", {})
+        created = self.value_field not in old
+        value = default if created else old[self.value_field]
+        if self.cache is not None:
+            self.cache.set(self.__cache_key(item_key), value, self.ttl)
+        if created:
+            self.__bump_version(item_key["pk"])
+
+        return value
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect the set calls made inside the block and write them with
+        batch_write_item when it exits, bumping each partition version once.
+        Nothing is written when the block raises. Only the calls of the thread
+        that opened the batch are collected.
+
+            with config.batch():
+                config.set("a", 1)
+                config.set("b", 2)
+        """
+
+        if getattr(self._batch, "writes", None) is not None:
+            yield self
+            return
+
+        self._batch.writes = {}
+        try:
+            yield self
+        except BaseException:
+            self.__discard(self._batch.writes.values())
+            raise
+        else:
+            self.__flush(list(self._batch.writes.values()))
+        finally:
+            self._batch.writes = None
+
+    def __flush(self, items: list):
+        if not items:
+            return
+
+        try:
+            batch_write(self.table, puts=items)
+        except Exception as ex:
+            self.__discard(items)
+            print(f"Unable to write Config pk:{self.app_key}", ex)
+            return
+
+        for pk in dict.fromkeys(item["pk"] for item in items):
+            self.__bump_version(pk)
+
+    def __discard(self, items: Iterable[dict]):
+        if self.cache is not None:
+            for item in items:
+                self.cache.invalidate(self.__cache_key(item))
+
+    def __read(self, item_key: dict) -> Any:
+        response = self.table.get_item(Key=item_key)
+        if "Item" not in response:
+            return MISSING
+        return response["Item"].get(self.value_field)
+
+    def __load_partition(self, pk: str) -> Dict[str, Any]:
+        values = {}
+        for item in self.__query(pk):
+            if item["sk"] == VERSION_KEY:
+                continue
+            values[item["sk"]] = item.get(self.value_field)
+            if self.cache is not None:
+                item_key = {"pk": pk, "sk": item["sk"]}
+                self.cache.set(
+                    self.__cache_key(item_key),
+                    item.get(self.value_field),
+                    self.ttl,
+                )
+        return values
+
+    def __bump_version(self, pk: str):
+        try:
+            response = self.table.update_item(
+                Key={"pk": pk, "sk": VERSION_KEY},
+                UpdateExpression="ADD #version :one",
+                ExpressionAttributeNames={"#version": VERSION_FIELD},
+                ExpressionAttributeValues={":one": 1},
+                ReturnValues="UPDATED_NEW",
+            )
+        except Exception as ex:
+            print(f"Unable to update Config version pk:{pk}", ex)
+            return
+
+        if self.cache is None:
+            return
+
+        # Our own write should not make this container reload the partition,
+        # but a write by someone else since the last poll still has to.
+        version_key = self.__version_cache_key(pk)
+        known = self.cache.peek(version_key, None, stale=True)
+        current = response.get("Attributes", {}).get(VERSION_FIELD)
+        if known is not None and current == known + 1:
+            self.cache.set(version_key, current, self.poll_interval or self.ttl)
+
+    def __query(self, pk: str):
+        params = {
+            "KeyConditionExpression": "pk = :pk",
+            "ExpressionAttributeValues": {":pk": pk},
+            "ProjectionExpression": "sk, #value",
+            "ExpressionAttributeNames": {"#value": self.value_field},
+        }
+        while True:
+            response = self.table.query(**params)
+            yield from response.get("Items", [])
+
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            params["ExclusiveStartKey"] = last_key
+
+    def __cache_key(self, item_key: dict):
+        return (*self.__partition_cache_key(item_key["pk"]), item_key["sk"])
+
+    def __partition_cache_key(self, pk: str):
+        return (self.__table_id(), self.value_field, pk)
+
+    def __version_cache_key(self, pk: str):
+        return (self.__table_id(), VERSION_KEY, pk)
+
+    def __table_id(self):
+        # Tables without a name are keyed by the object itself, not its id(),
+        # which could be reused by another table once this one is collected.
+        return getattr(self.table, "name", None) or self.table
 
     def __get_key(self, key: str, shared=False):
         if shared is True:
@@ -0,0 +1,108 @@
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+
+
+def batch_get(
+    table: Any,
+    keys: Iterable[dict],
+    projection: Sequence[str] = None,
+    key_fields: Tuple[str, ...] = ("pk", "sk"),
+    max_attempts: int = 5,
+) -> List[dict]:
+    """
+    Read many items from table with batch_get_item.
+    Keys are deduped, sent in chunks of 100 and unprocessed keys are retried with
+    backoff. Items come back in no particular order. A boto3 Table is read
+    through its own client, so its session and endpoint are used.
+    """
+
+    unique = {tuple(key[f] for f in key_fields): key for key in keys}
+    keys = list(unique.values())
+    name = table.name
+    api = _batch_get_api(table)
+
+    options = {}
+    if projection:
+        names = {f"#p{i}": attr for i, attr in enumerate(projection)}
+        options["ProjectionExpression"] = ", ".join(names)
+        options["ExpressionAttributeNames"] = names
+
+    items = []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {name: {"Keys": keys[start : start + BATCH_GET_LIMIT], **options}}
+        for attempt in range(max_attempts):
+            response = api.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(name, []))
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            _backoff(attempt)
+        else:
+            raise RuntimeError(f"Unable to read {len(request[name]['Keys'])} items")
+
+    return items
+
+
+def batch_write(
+    table: Any,
+    puts: Iterable[dict] = (),
+    deletes: Iterable[dict] = (),
+    key_fields: Tuple[str, ...] = ("pk", "sk"),
+    max_attempts: int = 5,
+):
+    """
+    Write many items to table with batch_write_item.
+    Requests are deduped by key (the last one wins), sent in chunks of 25 and
+    unprocessed items are retried with backoff. A boto3 Table is written with
+    its batch_writer, which resends unprocessed items itself.
+    """
+
+    requests: Dict[tuple, dict] = {}
+    for item in puts:
+        key = tuple(item[f] for f in key_fields)
+        requests[key] = {"PutRequest": {"Item": item}}
+    for item in deletes:
+        key = tuple(item[f] for f in key_fields)
+        requests[key] = {"DeleteRequest": {"Key": {f: item[f] for f in key_fields}}}
+
+    pending = list(requests.values())
+    if not hasattr(table, "batch_write_item"):
+        _write_with_batch_writer(table, pending)
+        return
+
+    name = table.name
+    for start in range(0, len(pending), BATCH_WRITE_LIMIT):
+        request = {name: pending[start : start + BATCH_WRITE_LIMIT]}
+        for attempt in range(max_attempts):
+            response = table.batch_write_item(RequestItems=request)
+            request = response.get("UnprocessedItems")
+            if not request:
+                break
+            _backoff(attempt)
+        else:
+            raise RuntimeError(f"Unable to write {len(request[name])} items")
+
+
+def _backoff(attempt: int):
+    time.sleep(min(0.05 * 2**attempt, 1))
+
+
+def _write_with_batch_writer(table: Any, pending: List[dict]):
+    with table.batch_writer() as writer:
+        for request in pending:
+            if "PutRequest" in request:
+                writer.put_item(Item=request["PutRequest"]["Item"])
+            else:
+                writer.delete_item(Key=request["DeleteRequest"]["Key"])
+
+
+def _batch_get_api(table: Any):
+    # Stand-in tables implement batch_get_item themselves. A boto3 Table does
+    # not, but the client of its resource does, with the same session and
+    # endpoint, and converts values like the Table.
+    if hasattr(table, "batch_get_item"):
+        return table
+    return table.meta.client
@@ -0,0 +1,154 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from cloudly.db.batch import batch_write
+
+_PUT = "put"
+_DELETE = "delete"
+_READS = frozenset(("query", "scan", "batch_get_item"))
+
+
+class BufferedTable:
+    """
+    Wraps a table so put_item and delete_item calls are collected instead of sent.
+
+    Pending writes are deduped by key (the last write to an item wins) and sent
+    with batch_write_item by flush, or as soon as flush_threshold items are
+    pending. get_item sees pending writes, query and scan do not. Conditional
+    writes and every other table call are passed through to the table after
+    flushing, so they never overtake a buffered write. Safe to share between
+    threads.
+
+    Writes made inside a staged() block are held apart and only join the
+    buffer when the block exits without an error. A call passed through to the
+    table from inside the block sends the block's writes first, so those can no
+    longer be dropped.
+    """
+
+    def __init__(
+        self,
+        table: Any,
+        key_fields: Tuple[str, ...] = ("pk", "sk"),
+        flush_threshold: int = 500,
+    ):
+        self.table = table
+        self.key_fields = key_fields
+        self.flush_threshold = flush_threshold
+        self._pending: Dict[tuple, Tuple[str, dict]] = {}
+        self._lock = threading.RLock()
+        self._staged: ContextVar[Optional[dict]] = ContextVar(
+            "staged_writes", default=None
+        )
+
+    def put_item(self, Item: dict, **kwargs):
+        if kwargs:
+            self._flush_all()
+            return self.table.put_item(Item=Item, **kwargs)
+
+        self._add(Item, (_PUT, Item))
+        return {}
+
+    def delete_item(self, Key: dict, **kwargs):
+        if kwargs:
+            self._flush_all()
+            return self.table.delete_item(Key=Key, **kwargs)
+
+        self._add(Key, (_DELETE, Key))
+        return {}
+
+    def get_item(self, Key: dict, **kwargs):
+        key = self._key(Key)
+        staged = self._staged.get()
+        pending = staged.get(key) if staged else None
+        if pending is None:
+            pending = self._pending.get(key)
+        if pending is None:
+            return self.table.get_item(Key=Key, **kwargs)
+
+        action, item = pending
+        return {"Item": dict(item)} if action == _PUT else {}
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending = list(self._pending.values())
+            self._pending = {}
+
+            batch_write(
+                self.table,
+                puts=[item for action, item in pending if action == _PUT],
+                deletes=[key for action, key in pending if action == _DELETE],
+                key_fields=self.key_fields,
+            )
+
+    def clear(self):
+        """Drop the pending writes without sending them."""
+
+        with self._lock:
+            self._pending = {}
+
+    @contextmanager
+    def staged(self):
+        """
+        Hold the writes made in the block, by this thread or asyncio task, until
+        it exits. They are added to the buffer when it exits normally and
+        dropped when it raises.
+        """
+
+        staged = {}
+        token = self._staged.set(staged)
+        try:
+            yield self
+        finally:
+            self._staged.reset(token)
+
+        if not staged:
+            return
+        with self._lock:
+            self._pending.update(staged)
+            full = len(self._pending) >= self.flush_threshold
+        if full:
+            self.flush()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.table, name)
+        if name in _READS or not callable(attribute):
+            return attribute
+
+        def passthrough(*args, **kwargs):
+            self._flush_all()
+            return attribute(*args, **kwargs)
+
+        return passthrough
+
+    def _flush_all(self):
+        # Flush the writes staged by the calling thread or task too, which would
+        # otherwise be sent after the call and overwrite what it did.
+        staged = self._staged.get()
+        if staged:
+            with self._lock:
+                self._pending.update(staged)
+            staged.clear()
+        self.flush()
+
+    def _add(self, item: dict, write: Tuple[str, dict]):
+        staged = self._staged.get()
+        if staged is not None:
+            staged[self._key(item)] = write
+            return
+
+        with self._lock:
+            self._pending[self._key(item)] = write
+            full = len(self._pending) >= self.flush_threshold
+        if full:
+            self.flush()
+
+    def _key(self, item: dict) -> tuple:
+        return tuple(item.get(name) for name in self.key_fields)
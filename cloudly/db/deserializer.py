@@ -0,0 +1,93 @@
+from base64 import b64decode
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Any, Dict, Iterator
+
+
+def deserialize(attribute: dict) -> Any:
+    """
+    Convert one DynamoDB attribute value, e.g. {"N": "10"}, to a python value.
+    Numbers become Decimal and binary values are base64 decoded to bytes, like
+    boto3's TypeDeserializer but without its per-call dispatch overhead.
+    """
+
+    ((tag, value),) = attribute.items()
+    return _DECODERS[tag](value)
+
+
+def deserialize_image(image: dict) -> Dict[str, Any]:
+    """
+    Eagerly convert a whole DynamoDB JSON image (NewImage, OldImage, Keys).
+    Can be used as the normalizer of ParseDynamoJson.
+    """
+
+    return {name: deserialize(value) for name, value in image.items()}
+
+
+class LazyImage(Mapping):
+    """
+    A read-only mapping over a DynamoDB JSON image that decodes each attribute
+    the first time it is read. Processors that look at a couple of fields of a
+    wide item only pay for those fields. Use dict(image) to get a plain dict.
+    """
+
+    __slots__ = ("_raw", "_decoded")
+
+    def __init__(self, raw: dict):
+        self._raw = raw or {}
+        self._decoded = {}
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._decoded[name]
+        except KeyError:
+            value = self._decoded[name] = deserialize(self._raw[name])
+            return value
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in self._decoded:
+            return self._decoded[name]
+        if name not in self._raw:
+            return default
+        return self[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._raw
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __bool__(self) -> bool:
+        return bool(self._raw)
+
+    def __repr__(self) -> str:
+        return f"LazyImage({dict(self)!r})"
+
+
+def _decode_map(value: dict) -> dict:
+    return {name: deserialize(item) for name, item in value.items()}
+
+
+def _decode_list(value: list) -> list:
+    return [deserialize(item) for item in value]
+
+
+def _decode_binary(value) -> bytes:
+    return value if isinstance(value, (bytes, bytearray)) else b64decode(value)
+
+
+_DECODERS = {
+    "S": str,
+    "N": Decimal,
+    "BOOL": bool,
+    "NULL": lambda _: None,
+    "M": _decode_map,
+    "L": _decode_list,
+    "B": _decode_binary,
+    "SS": set,
+    "NS": lambda value: set(map(Decimal, value)),
+    "BS": lambda value: set(map(_decode_binary, value)),
+}
@@ -0,0 +1,13 @@
+def error_code(ex: Exception) -> str:
+    """
+    The DynamoDB error code of an exception raised by a table call, e.g.
+    ConditionalCheckFailedException. Works for botocore ClientErrors and for
+    stand-ins that expose the same response shape.
+    """
+
+    response = getattr(ex, "response", None) or {}
+    return response.get("Error", {}).get("Code") or ex.__class__.__name__
+
+
+def is_conditional_check_failed(ex: Exception) -> bool:
+    return error_code(ex) == "ConditionalCheckFailedException"
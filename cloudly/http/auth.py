@@ -2,16 +2,17 @@ from functools import wraps
 from typing import Any
 from cloudly.http.exceptions import NotAuthorizedError
 
+from cloudly.aws.clients import client
 from cloudly.http.request import RequestContext
 
 
 def aws_cognito():
-    import boto3
+    # Shared with every other caller in the process, so warm invocations reuse
+    # the client and its connections.
+    return client("cognito-idp")
 
-    return boto3.client("cognito-idp")
 
-
-def inject_user(cognito_client: Any):
+def inject_user(cognito_client: Any = None):
     def wrapper(func) -> Any:
         @wraps(func)
         def decoration(event, context) -> Any:
@@ -33,7 +34,9 @@ def inject_user(cognito_client: Any):
             if not accessToken:
                 return None
 
-            response = cognito_client.get_user(AccessToken=accessToken)
+            response = (cognito_client or aws_cognito()).get_user(
+                AccessToken=accessToken
+            )
             user = {attr["Name"]: attr["Value"] for attr in response["UserAttributes"]}
             user["username"] = response["Username"]
             return user
@@ -0,0 +1,429 @@
+"""
+Measure the cost of dispatching requests through http_api handlers.
+
+Each Case builds a decorated handler and an API Gateway v2 event, varying the
+body size, validation schema, number of middleware steps, authorization groups
+and whether the request succeeds or fails. Warm dispatches are timed in this
+process (latency percentiles, throughput and memory allocated per request) and
+the first invocation is timed in a fresh interpreter, which is what a cold
+lambda pays. The memory taken by each item of a validated list is reported too.
+
+    python -m cloudly.http.benchmark --iterations 2000 --json > results.json
+    python -m cloudly.http.benchmark --compare results.json
+
+Results are JSON so runs of different versions can be compared.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flowfast.step import Mapping, Task
+
+from cloudly.http.decorators import http_api
+from cloudly.http.exceptions import HttpResponseError
+from cloudly.http.validators import (
+    Validator,
+    boolean_field,
+    decimal_field,
+    int_field,
+    list_field,
+    string_field,
+)
+
+SUCCESS = None
+VALIDATION_ERROR = "validation"
+FORBIDDEN = "forbidden"
+HTTP_ERROR = "http"
+EXCEPTION = "exception"
+
+
+@dataclass
+class Case:
+    """
+    One request shape. schema is "flat", "nested" or "list" (list_items items in
+    a list_field). error picks the failure path to exercise, None for success.
+    """
+
+    name: str
+    body_bytes: int = 256
+    schema: str = "flat"
+    list_items: int = 0
+    steps: int = 1
+    groups: Tuple[str, ...] = ()
+    error: Optional[str] = SUCCESS
+
+
+# Runs in a fresh interpreter. Only the modules a handler module imports are
+# timed, not the benchmark's own.
+_COLD_SCRIPT = """
+import time
+started = time.perf_counter()
+import cloudly.http.decorators
+import cloudly.http.validators
+imported = time.perf_counter()
+from cloudly.http.benchmark import _cold_case
+_cold_case(%r, imported - started)
+"""
+
+CASES = (
+    Case("flat-small"),
+    Case("flat-64k", body_bytes=64 * 1024),
+    Case("nested", schema="nested"),
+    Case("list-100", schema="list", list_items=100),
+    Case("list-1000", schema="list", list_items=1000),
+    Case("steps-0", steps=0),
+    Case("steps-5", steps=5),
+    Case("steps-20", steps=20),
+    Case("groups", groups=("admin", "staff", "support")),
+    Case("error-validation", error=VALIDATION_ERROR),
+    Case("error-forbidden", groups=("admin",), error=FORBIDDEN),
+    Case("error-http", error=HTTP_ERROR),
+    Case("error-exception", error=EXCEPTION),
+)
+
+
+@dataclass
+class CaseResult:
+    name: str
+    status_code: int
+    iterations: int
+    p50_us: float
+    p90_us: float
+    p99_us: float
+    max_us: float
+    requests_per_second: float
+    peak_bytes_per_request: float
+    retained_bytes_per_request: float
+    cold: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class AddStep(Task):
+    index: int = 0
+    fail_with: Optional[str] = None
+
+    def process(self, input: Mapping) -> Mapping:
+        if self.fail_with == HTTP_ERROR:
+            raise HttpResponseError(404, {"error": "Not found"})
+        if self.fail_with == EXCEPTION:
+            raise RuntimeError("step failed")
+        return {**input, f"step{self.index}": True}
+
+
+def schema_for(case: Case) -> dict:
+    if case.schema == "nested":
+        return {
+            "customer": {
+                "name": string_field("name", min=2, max=50, required=True),
+                "email": string_field("email", type="email", required=True),
+            },
+            "address": {
+                "line1": string_field("line1", max=100, required=True),
+                "city": string_field("city", max=50),
+                "zip": string_field("zip", pattern=r"^\d{5}$"),
+            },
+            "age": int_field("age", min=0, max=150),
+        }
+    if case.schema == "list":
+        return {
+            "name": string_field("name", min=2, max=50, required=True),
+            "items": list_field(
+                "items",
+                min_items=1,
+                item_schema={
+                    "sku": string_field("sku", max=20, required=True),
+                    "quantity": int_field("quantity", min=1, max=100),
+                    "price": decimal_field("price", min="0"),
+                },
+            ),
+        }
+    return {
+        "name": string_field("name", min=2, max=50, required=True),
+        "email": string_field("email", type="email"),
+        "age": int_field("age", min=0, max=150),
+        "amount": decimal_field("amount", min="0"),
+        "active": boolean_field("active"),
+        "status": string_field("status", options=("NEW", "ACTIVE", "CLOSED")),
+    }
+
+
+def body_for(case: Case) -> dict:
+    name = "" if case.error == VALIDATION_ERROR else "Ama Mensah"
+    if case.schema == "nested":
+        body = {
+            "customer": {"name": name, "email": "ama@example.com"},
+            "address": {"line1": "1 Ring Road", "city": "Accra", "zip": "00233"},
+            "age": 30,
+        }
+    elif case.schema == "list":
+        body = {
+            "name": name,
+            "items": [
+                {"sku": f"SKU-{i}", "quantity": 2, "price": "9.99"}
+                for i in range(case.list_items)
+            ],
+        }
+    else:
+        body = {
+            "name": name,
+            "email": "ama@example.com",
+            "age": 30,
+            "amount": "120.50",
+            "active": True,
+            "status": "ACTIVE",
+        }
+
+    padding = case.body_bytes - len(json.dumps(body))
+    if padding > 0:
+        body["notes"] = "n" * padding
+    return body
+
+
+def event_for(case: Case) -> dict:
+    user_groups = ("guest",) if case.error == FORBIDDEN else case.groups or ("staff",)
+    return {
+        "version": "2.0",
+        "routeKey": "POST /items",
+        "rawPath": "/items",
+        "headers": {"content-type": "application/json"},
+        "requestContext": {
+            "accountId": "123456789012",
+            "appId": "benchmark",
+            "authorizer": {
+                "jwt": {
+                    "claims": {
+                        "client_id": "benchmark-client",
+                        "username": "ama",
+                        "cognito:groups": f"[{' '.join(user_groups)}]",
+                    }
+                }
+            },
+            "http": {"method": "POST", "path": "/items", "sourceIp": "127.0.0.1"},
+        },
+        "body": json.dumps(body_for(case)),
+    }
+
+
+def handler_for(case: Case) -> Callable[[dict, dict], dict]:
+    steps = [AddStep(i) for i in range(case.steps)]
+    if case.error in (HTTP_ERROR, EXCEPTION):
+        steps.append(AddStep(case.steps, fail_with=case.error))
+
+    @http_api(
+        *steps,
+        validation_schema=schema_for(case),
+        allow_groups=list(case.groups) or None,
+    )
+    def handler(event, context):
+        pass
+
+    return handler
+
+
+def run_case(case: Case, iterations: int = 1000, warmup: int = 50) -> CaseResult:
+    handler, event = handler_for(case), event_for(case)
+
+    # Error paths print their context, keep that out of the timings' way.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(warmup):
+            response = handler(event, None)
+
+        timings = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request_started = time.perf_counter_ns()
+            handler(event, None)
+            timings.append(time.perf_counter_ns() - request_started)
+        seconds = time.perf_counter() - started
+
+        peak, retained = _allocations(handler, event, max(iterations // 10, 10))
+
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return CaseResult(
+        name=case.name,
+        status_code=response["statusCode"],
+        iterations=iterations,
+        p50_us=quantiles[49] / 1000,
+        p90_us=quantiles[89] / 1000,
+        p99_us=quantiles[98] / 1000,
+        max_us=max(timings) / 1000,
+        requests_per_second=iterations / seconds,
+        peak_bytes_per_request=peak,
+        retained_bytes_per_request=retained,
+    )
+
+
+def cold_start(case: Case) -> Dict[str, float]:
+    """
+    Time importing cloudly, building the handler and the first two dispatches
+    of case in a new interpreter.
+    """
+
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", _COLD_SCRIPT % case.name],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    total_ms = (time.perf_counter() - started) * 1000
+    return {**json.loads(output.splitlines()[-1]), "process_ms": total_ms}
+
+
+def run_suite(
+    cases: Sequence[Case] = CASES,
+    iterations: int = 1000,
+    cold: bool = True,
+) -> dict:
+    results = []
+    for case in cases:
+        result = run_case(case, iterations)
+        if cold:
+            result.cold = cold_start(case)
+        results.append(asdict(result))
+
+    return {
+        "python": platform.python_version(),
+        "cloudly": _version(),
+        "iterations": iterations,
+        "bytes_per_validated_item": bytes_per_validated_item(),
+        "cases": results,
+    }
+
+
+def bytes_per_validated_item(items: int = 1000) -> float:
+    """
+    Memory taken by each cleaned item of a validated list_field, the cleaned
+    list and values included. The parsed body is not counted.
+    """
+
+    case = Case("list", schema="list", list_items=items)
+    validator = Validator(schema_for(case))
+    data = json.loads(json.dumps(body_for(case)))
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        cleaned = validator.validate(data)
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return held / len(cleaned["items"])
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    before = {case["name"]: case for case in baseline["cases"]}
+    lines = []
+    for case in current["cases"]:
+        old = before.get(case["name"])
+        if old is None:
+            continue
+        change = (case["p50_us"] - old["p50_us"]) / old["p50_us"] * 100
+        lines.append(
+            f"{case['name']:<20} p50 {old['p50_us']:>9.1f}us -> "
+            f"{case['p50_us']:>9.1f}us ({change:+.1f}%)"
+        )
+    return lines
+
+
+def _allocations(handler, event: dict, iterations: int) -> Tuple[float, float]:
+    tracemalloc.start()
+    try:
+        peaks = []
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            handler(event, None)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        return statistics.mean(peaks), retained / iterations
+    finally:
+        tracemalloc.stop()
+
+
+def _cold_case(name: str, import_seconds: float):
+    built_started = time.perf_counter()
+    case = _cases_by_name()[name]
+    handler, event = handler_for(case), event_for(case)
+    built = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        handler(event, None)
+        first = time.perf_counter()
+        handler(event, None)
+    second = time.perf_counter()
+
+    print(
+        json.dumps(
+            {
+                "import_ms": import_seconds * 1000,
+                "build_ms": (built - built_started) * 1000,
+                "first_dispatch_ms": (first - built) * 1000,
+                "second_dispatch_ms": (second - first) * 1000,
+            }
+        )
+    )
+
+
+def _cases_by_name() -> Dict[str, Case]:
+    return {case.name: case for case in CASES}
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("cloudly")
+    except Exception:
+        return "unknown"
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m cloudly.http.benchmark",
+        description="Measure http_api dispatch latency and cold start.",
+    )
+    parser.add_argument("--case", nargs="*", help="case names (default all)")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--no-cold", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--compare", help="results file of a previous run")
+    args = parser.parse_args(argv)
+
+    cases = CASES
+    if args.case:
+        by_name = _cases_by_name()
+        cases = [by_name[name] for name in args.case]
+
+    results = run_suite(cases, args.iterations, cold=not args.no_cold)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    elif args.compare:
+        with open(args.compare) as file:
+            print("\n".join(compare(json.load(file), results)))
+    else:
+        print(f"{results['bytes_per_validated_item']:,.0f} bytes per validated item")
+        for case in results["cases"]:
+            cold = case["cold"].get("first_dispatch_ms")
+            print(
+                f"{case['name']:<20} {case['status_code']} "
+                f"p50 {case['p50_us']:>9.1f}us p99 {case['p99_us']:>9.1f}us "
+                f"{case['requests_per_second']:>9.0f} req/s "
+                f"{case['peak_bytes_per_request'] / 1024:>8.1f} KiB/req"
+                + (f" cold {cold:.2f}ms" if cold is not None else "")
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
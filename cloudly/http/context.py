@@ -2,6 +2,8 @@ from typing import List, Optional, Union
 
 
 class RequestContext:
+    __slots__ = ("_ctx",)
+
     def __init__(self, event: dict):
         self._ctx = event.get("requestContext", {})
 
@@ -53,6 +55,10 @@ class RequestContext:
     def client_ip_address(self) -> Optional[str]:
         return self._ctx.get("http", {}).get("sourceIp")
 
+    @property
+    def method(self) -> Optional[str]:
+        return self._ctx.get("http", {}).get("method")
+
     @property
     def path(self) -> Optional[str]:
         return self._ctx.get("http", {}).get("path")
@@ -1,10 +1,30 @@
 from functools import wraps
-from typing import Any, Callable, List
+from typing import Any, Callable, Iterable, List, Optional
 from flowfast.step import Step
+from flowfast.workflow import Workflow
 
-from cloudly.http.request import AwsLambdaApiHandler
+from cloudly.http.idempotency import Idempotency
+from cloudly.http.request import AwsLambdaApiHandler, build_pipeline
+from cloudly.http.response import HttpResponse
+from cloudly.http.throttle import Throttle
+from cloudly.http.validators import Validator
 from cloudly.logging.logger import Logger
 
+# Event sources used by common keep-warm schedulers: serverless-plugin-warmup
+# and EventBridge scheduled rules.
+WARMUP_SOURCES = ("serverless-plugin-warmup", "aws.events")
+
+
+def is_warmup_event(event: Any) -> bool:
+    """
+    True for keep-warm pings: events from WARMUP_SOURCES or with "warmer": true.
+    An empty event is not a warmup, API Gateway never sends one.
+    """
+
+    if not isinstance(event, dict):
+        return False
+    return event.get("source") in WARMUP_SOURCES or event.get("warmer") is True
+
 
 def http_api(
     *args: List[Step],
@@ -13,11 +33,46 @@ def http_api(
     clean_response: Callable[[Any], Any] = None,
     allow_groups: list = None,
     deny_groups: list = None,
-    logger: Logger = None
+    logger: Logger = None,
+    warmup: Optional[Callable[[dict], bool]] = is_warmup_event,
+    on_prewarm: Iterable[Callable[[], Any]] = (),
+    sparse_fields: bool = False,
+    throttle: Throttle = None,
+    idempotency: Idempotency = None,
 ):
+    """
+    warmup: Callable[[dict], bool] = is_warmup_event
+    Events it returns True for are answered with an empty 200 right away, after
+    running prewarm if it has not run yet. Pass None to disable.
+
+    on_prewarm: Iterable[Callable[[], Any]] = ()
+    One-time initialization run by prewarm, e.g. opening clients or
+    ConfigClient.preload. The decorated handler gets a prewarm() method that
+    builds the pipeline and validator and runs these. Call it at module level
+    to pay for it during lambda init instead of in the first request.
+
+    sparse_fields: bool = False
+    Let clients pick the response fields with ?fields=id,name,address.city.
+    Only the selected fields are copied and serialized.
+
+    throttle: Throttle = None
+    Limit the request rate of each caller. Requests over the limit get a 429
+    right after the permission check, before the body is parsed.
+
+    idempotency: Idempotency = None
+    Run requests with an Idempotency-Key header once. Retries get the stored
+    response back, duplicates sent while the first one runs get a 409.
+    """
+
     def wrapper(func) -> Any:
+        state = _HandlerState(args, validation_schema, tuple(on_prewarm))
+
         @wraps(func)
         def decoration(event, context) -> Any:
+            if warmup is not None and warmup(event):
+                state.prewarm()
+                return HttpResponse(200)
+
             func(event, context)
             return AwsLambdaApiHandler(
                 event=event,
@@ -27,8 +82,52 @@ def http_api(
                 allow_groups=allow_groups,
                 deny_groups=deny_groups,
                 logger=logger,
+                pipeline=state.pipeline(),
+                validator=state.validator(),
+                sparse_fields=sparse_fields,
+                throttle=throttle,
+                idempotency=idempotency,
             ).dispatch(status)
 
+        decoration.prewarm = state.prewarm
         return decoration
 
     return wrapper
+
+
+def prewarm(*handlers: Callable[[dict, Any], Any]):
+    """Run the prewarm hook of each http_api handler."""
+
+    for handler in handlers:
+        handler.prewarm()
+
+
+class _HandlerState:
+    """The parts of an http_api handler that are built once and reused."""
+
+    def __init__(self, middleware, validation_schema, on_prewarm):
+        self.middleware = middleware
+        self.validation_schema = validation_schema
+        self.on_prewarm = on_prewarm
+        self.prewarmed = False
+        self._pipeline: Optional[Workflow] = None
+        self._validator: Optional[Validator] = None
+
+    def pipeline(self) -> Optional[Workflow]:
+        if self._pipeline is None:
+            self._pipeline = build_pipeline(self.middleware)
+        return self._pipeline
+
+    def validator(self) -> Optional[Validator]:
+        if self._validator is None and self.validation_schema:
+            self._validator = Validator(self.validation_schema)
+        return self._validator
+
+    def prewarm(self):
+        if self.prewarmed:
+            return
+        self.pipeline()
+        self.validator()
+        for initialize in self.on_prewarm:
+            initialize()
+        self.prewarmed = True
@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+METADATA_FIELDS = frozenset(("_request",))
+
+
+@dataclass(frozen=True)
+class FieldSelector:
+    """
+    A compiled sparse fieldset such as "id,name,address.city".
+
+    select walks only the requested fields, so the result is built from them
+    instead of copying the whole response. A field that holds a list applies
+    its sub-fields to every element. A child of None selects the whole value.
+    """
+
+    fields: Tuple[Tuple[str, Optional["FieldSelector"]], ...]
+
+    def select(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            selected = {}
+            for name, child in self.fields:
+                if name in value:
+                    field_value = value[name]
+                    selected[name] = (
+                        field_value if child is None else child.select(field_value)
+                    )
+            return selected
+        if isinstance(value, (list, tuple)):
+            return [self.select(element) for element in value]
+        return value
+
+
+@lru_cache(maxsize=256)
+def compile_fields(spec: str) -> Optional[FieldSelector]:
+    """
+    Compile a comma separated list of dotted field paths. Returns None when spec
+    names no fields. Metadata fields such as _request can not be selected.
+    """
+
+    tree = {}
+    for path in spec.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names) or names[0] in METADATA_FIELDS:
+            continue
+
+        node = tree
+        for name in names[:-1]:
+            child = node.setdefault(name, {})
+            if child is None:
+                break
+            node = child
+        else:
+            node[names[-1]] = None
+
+    return _freeze(tree) if tree else None
+
+
+def _freeze(tree: dict) -> FieldSelector:
+    return FieldSelector(
+        tuple(
+            (name, None if child is None else _freeze(child))
+            for name, child in tree.items()
+        )
+    )
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from cloudly.aws.clients import resolve_table
+from cloudly.db.errors import is_conditional_check_failed
+from cloudly.http.context import RequestContext
+from cloudly.http.response import HttpResponse
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+
+@dataclass
+class Claim:
+    """
+    The outcome of Idempotency.claim: the request may run when response is None,
+    otherwise response is returned as is. key is the claimed item key, None when
+    there is nothing to complete (no Idempotency-Key header). token tells this
+    claim apart from a later one of the same key.
+    """
+
+    key: Optional[dict] = None
+    response: Optional[dict] = None
+    token: Optional[str] = None
+
+
+@dataclass
+class Idempotency:
+    """
+    Runs a request once per Idempotency-Key header, caller and path. The caller
+    is the username or client id, or the source IP for anonymous requests.
+
+    The first request claims the key by writing an IN_PROGRESS item with a
+    conditional put. Its response is stored when the status is below 500 and
+    returned to later requests with the same key without running anything.
+    After a 5xx the claim is deleted so a retry runs again. While a request
+    runs, duplicates get a 409; a key reused with a different body gets a 422.
+
+    Stored responses expire after ttl_seconds, claims of requests that never
+    finished (e.g. a timed out lambda) after in_progress_seconds. Set ttl_attribute
+    as the TTL attribute of the table so DynamoDB removes them. A request whose
+    claim expired and was taken over by a retry neither stores its response
+    nor releases the key. Requests without the header or a caller, or when the
+    table can not be reached, run normally.
+    """
+
+    table: Any
+    ttl_seconds: int = 24 * 60 * 60
+    in_progress_seconds: int = 60
+    header: str = "Idempotency-Key"
+    ttl_attribute: str = "expires"
+    clock: Callable[[], float] = time.time
+
+    def __post_init__(self):
+        self.table = resolve_table(self.table)
+
+    def claim(self, event: dict) -> Claim:
+        idempotency_key = self._header_value(event)
+        caller = _caller(event)
+        if not idempotency_key or caller is None:
+            return Claim()
+        if len(idempotency_key) > 255:
+            return Claim(
+                response=HttpResponse(400, {"error": "Invalid Idempotency-Key"})
+            )
+
+        key = {"pk": f"IDEMPOTENCY#{caller}", "sk": idempotency_key}
+        fingerprint = _fingerprint(event)
+        token = uuid.uuid4().hex
+        now = int(self.clock())
+        try:
+            self.table.put_item(
+                Item={
+                    **key,
+                    "status": IN_PROGRESS,
+                    "fingerprint": fingerprint,
+                    "token": token,
+                    self.ttl_attribute: now + self.in_progress_seconds,
+                },
+                ConditionExpression="attribute_not_exists(pk) OR #expires < :now",
+                ExpressionAttributeNames={"#expires": self.ttl_attribute},
+                ExpressionAttributeValues={":now": now},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return Claim(key=key, token=token)
+        except Exception as ex:
+            if not is_conditional_check_failed(ex):
+                print("Unable to claim idempotency key", idempotency_key, ex)
+                return Claim()
+            error_response = getattr(ex, "response", None) or {}
+            existing = error_response.get("Item") or self._get(key)
+
+        if existing is None:
+            return Claim(response=_in_progress())
+        if existing.get("fingerprint") != fingerprint:
+            return Claim(
+                response=HttpResponse(
+                    422,
+                    {"error": "Idempotency-Key was used for a different request"},
+                )
+            )
+        if existing.get("status") == COMPLETED:
+            return Claim(response=json.loads(existing["response"]))
+        return Claim(response=_in_progress())
+
+    def complete(self, claim: Claim, event: dict, response: dict):
+        """Store response for the claimed key, or release the key after a 5xx."""
+
+        if claim.key is None:
+            return
+        if response.get("statusCode", 500) >= 500:
+            self._release(claim, event)
+            return
+        try:
+            self.table.put_item(
+                Item={
+                    **claim.key,
+                    "status": COMPLETED,
+                    "fingerprint": _fingerprint(event),
+                    "response": json.dumps(response, separators=(",", ":")),
+                    self.ttl_attribute: int(self.clock()) + self.ttl_seconds,
+                },
+                **_still_claimed(claim, event),
+            )
+        except Exception as ex:
+            if is_conditional_check_failed(ex):
+                print("Idempotency key was claimed again", claim.key["sk"])
+                return
+            print("Unable to store idempotent response", claim.key["sk"], ex)
+            self._release(claim, event)
+
+    def _release(self, claim: Claim, event: dict):
+        try:
+            self.table.delete_item(Key=claim.key, **_still_claimed(claim, event))
+        except Exception as ex:
+            if not is_conditional_check_failed(ex):
+                print("Unable to release idempotency key", claim.key["sk"], ex)
+
+    def _get(self, key: dict) -> Optional[dict]:
+        return self.table.get_item(Key=key, ConsistentRead=True).get("Item")
+
+    def _header_value(self, event: dict) -> Optional[str]:
+        headers = event.get("headers") or {}
+        value = headers.get(self.header) or headers.get(self.header.lower())
+        if value is None:
+            wanted = self.header.lower()
+            for name, header_value in headers.items():
+                if name.lower() == wanted:
+                    return header_value
+        return value
+
+
+def _caller(event: dict) -> Optional[str]:
+    context = RequestContext(event)
+    caller = context.username or context.client_id or context.client_ip_address
+    if not caller:
+        return None
+    return f"{caller}#{context.method or ''} {context.path or ''}"
+
+
+def _still_claimed(claim: Claim, event: dict) -> dict:
+    # The claim may have expired and been taken over by a retry, whose item
+    # must not be overwritten or deleted.
+    return {
+        "ConditionExpression": (
+            "#status = :in_progress AND fingerprint = :fp AND #token = :token"
+        ),
+        "ExpressionAttributeNames": {"#status": "status", "#token": "token"},
+        "ExpressionAttributeValues": {
+            ":in_progress": IN_PROGRESS,
+            ":fp": _fingerprint(event),
+            ":token": claim.token,
+        },
+    }
+
+
+def _fingerprint(event: dict) -> str:
+    body = event.get("body") or ""
+    return hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def _in_progress() -> dict:
+    return HttpResponse(
+        409, {"error": "A request with this Idempotency-Key is in progress"}
+    )
@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cloudly.aws.clients import resolve_table
+from cloudly.db.batch import batch_get
+
+_NOT_LOADED = object()
+
+
+class TableLoader:
+    """
+    Reads items of one table for the duration of one request.
+
+    Every key is read at most once: results (including missing items) are
+    memoized. queue and load_many are the batched API. Keys passed to queue are
+    not read right away but together with the next load or load_many, so a step
+    can queue everything it needs and get it with a single batch_get_item:
+
+        users = request["loaders"].table(users_table)
+        for order in orders:
+            users.queue({"pk": order["user"], "sk": "PROFILE"})
+        profiles = [users.load({"pk": o["user"], "sk": "PROFILE"}) for o in orders]
+
+    load reads a key alone with get_item when nothing is queued, so loads in a
+    loop are not batched. Items written during the request are not seen unless
+    primed or cleared.
+    """
+
+    def __init__(self, table: Any, key_fields: Tuple[str, ...] = ("pk", "sk")):
+        self.table = table
+        self.key_fields = key_fields
+        self.batches = 0
+        self._items: Dict[tuple, Any] = {}
+        self._queued: Dict[tuple, dict] = {}
+
+    def queue(self, key: dict):
+        cache_key = self._key(key)
+        if self._items.get(cache_key, _NOT_LOADED) is _NOT_LOADED:
+            self._queued[cache_key] = key
+
+    def load(self, key: dict) -> Optional[dict]:
+        cache_key = self._key(key)
+        item = self._items.get(cache_key, _NOT_LOADED)
+        if item is not _NOT_LOADED:
+            return item
+        if self._queued:
+            return self.load_many([key])[0]
+
+        key = {name: key[name] for name in self.key_fields}
+        item = self._items[cache_key] = self.table.get_item(Key=key).get("Item")
+        return item
+
+    def load_many(self, keys: Iterable[dict]) -> List[Optional[dict]]:
+        keys = list(keys)
+        for key in keys:
+            self.queue(key)
+        self.dispatch()
+        return [self._items[self._key(key)] for key in keys]
+
+    def dispatch(self):
+        """Read all queued keys now."""
+
+        if not self._queued:
+            return
+
+        queued, self._queued = self._queued, {}
+        self.batches += 1
+        found = batch_get(self.table, queued.values(), key_fields=self.key_fields)
+        for cache_key in queued:
+            self._items[cache_key] = None
+        for item in found:
+            self._items[self._key(item)] = item
+
+    def prime(self, key: dict, item: Optional[dict]):
+        """Remember item (None for no item) as the value of key, e.g. after a write."""
+
+        self._items[self._key(key)] = item
+
+    def clear(self, key: dict = None):
+        if key is None:
+            self._items.clear()
+        else:
+            self._items.pop(self._key(key), None)
+
+    def _key(self, key: dict) -> tuple:
+        return tuple(key[name] for name in self.key_fields)
+
+
+class Loaders:
+    """
+    The request-scoped loaders, one per table, found in input["_request"]["loaders"]
+    of every http_api step.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[Any, TableLoader] = {}
+
+    def table(self, table: Any, key_fields: Tuple[str, ...] = ("pk", "sk")):
+        """The loader of table, which can be a Table or a table name."""
+
+        table = resolve_table(table)
+        name = getattr(table, "name", None) or id(table)
+        loader = self._loaders.get(name)
+        if loader is None:
+            loader = self._loaders[name] = TableLoader(table, key_fields)
+        return loader
+
+    def load(self, table: Any, key: dict) -> Optional[dict]:
+        return self.table(table).load(key)
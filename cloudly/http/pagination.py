@@ -0,0 +1,194 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Callable, Optional, Sequence, Union
+
+from flowfast.step import Task, Mapping
+
+from cloudly.aws.clients import resolve_table
+from cloudly.http.exceptions import HttpResponseError
+
+_SIGNATURE_BYTES = 16
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorCodec:
+    """
+    Turns a LastEvaluatedKey into an opaque cursor and back.
+
+    The cursor is the key as compact JSON (numbers tagged as {"N": "1.5"},
+    binary as {"B": "<base64>"}) followed by an HMAC-SHA256 of it, both base64url
+    encoded without padding. A cursor only decodes with the secret and scope it
+    was encoded with, so clients can not forge keys or replay a cursor of one
+    query in another.
+    """
+
+    def __init__(self, secret: Union[str, bytes]):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        if not secret:
+            raise ValueError("A cursor secret is required")
+        self._secret = secret
+
+    def encode(self, key: dict, scope: str = "") -> str:
+        payload = json.dumps(
+            {name: _tag(value) for name, value in key.items()},
+            separators=(",", ":"),
+        ).encode()
+        signature = self._sign(payload, scope)
+        return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+    def decode(self, cursor: str, scope: str = "") -> dict:
+        try:
+            payload, signature = (_b64decode(part) for part in cursor.split("."))
+        except (ValueError, binascii.Error):
+            raise InvalidCursor("Malformed cursor")
+
+        if not hmac.compare_digest(signature, self._sign(payload, scope)):
+            raise InvalidCursor("Cursor signature does not match")
+        return {name: _untag(value) for name, value in json.loads(payload).items()}
+
+    def _sign(self, payload: bytes, scope: str) -> bytes:
+        message = scope.encode() + b"\0" + payload
+        digest = hmac.new(self._secret, message, hashlib.sha256).digest()
+        return digest[:_SIGNATURE_BYTES]
+
+
+@dataclass
+class Paginate(Task):
+    """
+    Reads one page of a query into input[output] and the cursor of the next page
+    (None on the last page) into input["next"].
+
+    query builds the Query parameters (KeyConditionExpression,
+    ExpressionAttributeValues, IndexName, FilterExpression...) from the input.
+    The page size comes from the limit query string parameter, default_limit if
+    missing and never more than max_limit. Only the projection attributes are
+    read when it is set. The cursor query string parameter continues where the
+    previous page stopped; it is bound to the key condition, index and
+    expression values, so a cursor of another query is rejected with a 400.
+
+        @http_api(
+            Paginate(orders_table, orders_of_user, secret=CURSOR_SECRET),
+            clean_response=page_response,
+        )
+    """
+
+    table: Any = None
+    query: Callable[[Mapping], dict] = None
+    secret: Union[str, bytes] = None
+    default_limit: int = 25
+    max_limit: int = 100
+    projection: Optional[Sequence[str]] = None
+    output: str = "items"
+    _codec: CursorCodec = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.table is None:
+            raise ValueError("Paginate needs a table")
+        if self.query is None:
+            raise ValueError("Paginate needs a query")
+        if not 0 < self.default_limit <= self.max_limit:
+            raise ValueError("default_limit must be between 1 and max_limit")
+        self._codec = CursorCodec(self.secret)
+
+    def process(self, input: Mapping) -> Mapping:
+        parameters = input["_request"]["event"].get("queryStringParameters") or {}
+
+        params = dict(self.query(input))
+        scope = _scope_of(params)
+        params["Limit"] = self._limit(parameters.get("limit"))
+        if self.projection:
+            self._project(params)
+
+        cursor = parameters.get("cursor")
+        if cursor:
+            try:
+                params["ExclusiveStartKey"] = self._codec.decode(cursor, scope)
+            except InvalidCursor:
+                raise HttpResponseError(400, {"error": "Invalid cursor"})
+
+        response = resolve_table(self.table).query(**params)
+        last_key = response.get("LastEvaluatedKey")
+        return {
+            **input,
+            self.output: response.get("Items", []),
+            "next": self._codec.encode(last_key, scope) if last_key else None,
+        }
+
+    def _limit(self, value: Optional[str]) -> int:
+        if value is None:
+            return self.default_limit
+        try:
+            limit = int(value)
+        except ValueError:
+            raise HttpResponseError(400, {"error": "Invalid limit"})
+        return max(1, min(limit, self.max_limit))
+
+    def _project(self, params: dict):
+        names = dict(params.get("ExpressionAttributeNames", {}))
+        placeholders = []
+        for index, attribute in enumerate(self.projection):
+            placeholder = f"#p{index}"
+            names[placeholder] = attribute
+            placeholders.append(placeholder)
+        params["ProjectionExpression"] = ", ".join(placeholders)
+        params["ExpressionAttributeNames"] = names
+
+
+def page_response(input: Mapping, output: str = "items") -> dict:
+    """
+    The response of a Paginate step: {"items": [...], "next": cursor}. Use it as
+    clean_response of http_api or as data_shaper of RespondWith.
+    """
+
+    return {output: input[output], "next": input["next"]}
+
+
+def _scope_of(params: dict) -> str:
+    return json.dumps(
+        [
+            params.get("IndexName"),
+            params.get("KeyConditionExpression"),
+            params.get("ExpressionAttributeValues"),
+        ],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=_tag,
+    )
+
+
+def _tag(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (Decimal, int)) and not isinstance(value, bool):
+        return {"N": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": _b64encode(bytes(value))}
+    raise TypeError(f"Unsupported key attribute type: {type(value).__name__}")
+
+
+def _untag(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and len(value) == 1:
+        if "N" in value:
+            return Decimal(value["N"])
+        if "B" in value:
+            return _b64decode(value["B"])
+    raise InvalidCursor("Unsupported key attribute")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
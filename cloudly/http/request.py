@@ -1,11 +1,15 @@
 import json
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Iterable, List
+from typing import Any, Callable, Iterable, List, Optional, Union
 from flowfast.base import Step
 from flowfast.workflow import Workflow
 from cloudly.http.context import RequestContext
 from cloudly.http.exceptions import NotAuthorizedError, HttpResponseError
+from cloudly.http.fields import FieldSelector, compile_fields
+from cloudly.http.idempotency import Claim, Idempotency
+from cloudly.http.loader import Loaders
+from cloudly.http.throttle import Throttle
 from cloudly.http.security import user_groups
 
 from cloudly.http.validators import ValidationError, Validator
@@ -21,11 +25,32 @@ class HttpRequest(ABC):
     deny_groups: list = None
     logger: Logger = None
 
+    # Not fields here: subclasses declare them after their own fields, so the
+    # positional order of their constructors does not change.
+    throttle = None  # Throttle
+    idempotency = None  # Idempotency
+
     def dispatch(self, status_code=200):
+        claim = Claim()
+        response = self._dispatch(status_code, claim)
+        if claim.key is not None:
+            self.idempotency.complete(claim, self.event, response)
+        return response
+
+    def _dispatch(self, status_code: int, claim: Claim):
         try:
             # IMPORTANT: Must be first statement in the execution
             self._check_permissions()
 
+            if self.throttle is not None and not self.throttle.allow(self.event):
+                return self._too_many_requests()
+
+            if self.idempotency is not None:
+                claimed = self.idempotency.claim(self.event)
+                if claimed.response is not None:
+                    return claimed.response
+                claim.key, claim.token = claimed.key, claimed.token
+
             data = json.loads(self.event.get("body", "{}"))
             cleaned_data = self.validate(data)
             record = self.execute(cleaned_data)
@@ -63,6 +88,11 @@ class HttpRequest(ABC):
                 data={"error": "We hit a snag processing your request."},
             )
 
+    def _too_many_requests(self):
+        response = self.respond(status_code=429, data={"error": "Too many requests"})
+        response["headers"]["Retry-After"] = str(self.throttle.retry_after)
+        return response
+
     def _log_error(self, title: str, ex: Exception, extra: dict = None):
         print(title, ex, "Context:")
         print("Context:", extra or {})
@@ -88,51 +118,81 @@ class HttpRequest(ABC):
         )
 
 
+def build_pipeline(middleware: Union[Step, Iterable[Step]]) -> Optional[Workflow]:
+    all_steps = tuple()
+    if issubclass(middleware.__class__, Step):
+        all_steps = (middleware,)
+    elif isinstance(middleware, Iterable):
+        all_steps = tuple(middleware)
+
+    if not all_steps:
+        return None
+
+    pipeline = Workflow(all_steps[0])
+    for step in all_steps[1:]:
+        pipeline = pipeline.next(step)
+    return pipeline
+
+
 @dataclass
 class AwsLambdaApiHandler(HttpRequest):
+    """
+    pipeline and validator can be built once and passed in (http_api does), so
+    they are not rebuilt from middleware and validation_schema on every request.
+
+    With sparse_fields, a ?fields=a,b.c query parameter selects the fields of
+    the response that are returned (see cloudly.http.fields).
+    """
+
     logger: Logger = None
     middleware: List[Step] = None
     validation_schema: dict = None
     clean_response: Callable[[Any], Any] = None
+    pipeline: Workflow = None
+    validator: Validator = None
+    sparse_fields: bool = False
+    throttle: Throttle = None
+    idempotency: Idempotency = None
 
     def execute(self, cleaned_data: dict) -> dict:
-        all_steps = tuple()
-        if issubclass(self.middleware.__class__, Step):
-            all_steps = (self.middleware,)
-        elif isinstance(self.middleware, Iterable):
-            all_steps = self.middleware
-
-        if not all_steps:
+        pipeline = self.pipeline or build_pipeline(self.middleware)
+        if pipeline is None:
             return {}
 
-        first_step = all_steps[0]
         request_data = {
             **cleaned_data,
             "_request": {
                 "event": self.event,
                 "context": RequestContext(self.event),
                 "@user": self.event.get("@user"),
+                "loaders": Loaders(),
             },
         }
 
-        pipeline = Workflow(first_step)
-        for step in all_steps[1:]:
-            pipeline = pipeline.next(step)
-
         result = pipeline.run(request_data)
         cleaned_result = self.clean_response(result) if self.clean_response else result
+        selector = self._field_selector()
+        if selector is not None:
+            return selector.select(cleaned_result)
         return self._exclude_metadata(cleaned_result)
 
     def validate(self, data: dict) -> dict:
         if not self.validation_schema:
             return data
-        return Validator(self.validation_schema).validate(data)
+        validator = self.validator or Validator(self.validation_schema)
+        return validator.validate(data)
 
     def _exclude_metadata(self, results: dict):
         if results is None:
             return
 
-        if isinstance(results, dict):
+        if isinstance(results, dict) and "_request" in results:
             return {k: v for k, v in results.items() if k not in ["_request"]}
 
         return results
+
+    def _field_selector(self) -> Optional[FieldSelector]:
+        if not self.sparse_fields:
+            return None
+        spec = (self.event.get("queryStringParameters") or {}).get("fields")
+        return compile_fields(spec) if spec else None
@@ -0,0 +1,107 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from cloudly.aws.clients import resolve_table
+from cloudly.db.errors import is_conditional_check_failed
+from cloudly.http.context import RequestContext
+
+
+def caller_key(context: RequestContext) -> Optional[str]:
+    """Throttle by app client, or by user for tokens without a client_id."""
+
+    return context.client_id or context.username
+
+
+@dataclass
+class Throttle:
+    """
+    Limits each caller to rate requests per second, with bursts of up to burst
+    requests, using a token bucket per caller kept in the process. Callers for
+    which key returns None are not limited.
+
+    Buckets are per lambda container, so the real limit grows with concurrency.
+    Set table to also enforce rate across containers: each allowed request then
+    adds to a per-caller counter of the current window_seconds window with a
+    conditional update, which fails once the window is full. Counter items
+    expire through the ttl_attribute. If the table can not be reached, the
+    request is allowed.
+    """
+
+    rate: float
+    burst: Optional[float] = None
+    key: Callable[[RequestContext], Optional[str]] = caller_key
+    table: Any = None
+    window_seconds: int = 60
+    ttl_attribute: str = "expires"
+    max_callers: int = 10_000
+    clock: Callable[[], float] = time.monotonic
+    wall_clock: Callable[[], float] = time.time
+    _buckets: "OrderedDict[str, list]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _lock: Any = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.burst is None:
+            self.burst = max(1.0, self.rate)
+        self.table = resolve_table(self.table)
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(1 / self.rate))
+
+    def allow(self, event: dict) -> bool:
+        caller = self.key(RequestContext(event))
+        if caller is None:
+            return True
+        if not self._take_token(caller):
+            return False
+        return self.table is None or self._count_in_table(caller)
+
+    def _take_token(self, caller: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(caller)
+            if bucket is None:
+                bucket = self._buckets[caller] = [self.burst, now]
+                if len(self._buckets) > self.max_callers:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(caller)
+
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1
+            return True
+
+    def _count_in_table(self, caller: str) -> bool:
+        now = self.wall_clock()
+        window = int(now // self.window_seconds) * self.window_seconds
+        try:
+            self.table.update_item(
+                Key={"pk": f"THROTTLE#{caller}", "sk": str(window)},
+                UpdateExpression="ADD #count :one SET #expires = :expires",
+                ConditionExpression="attribute_not_exists(#count) OR #count < :limit",
+                ExpressionAttributeNames={
+                    "#count": "count",
+                    "#expires": self.ttl_attribute,
+                },
+                ExpressionAttributeValues={
+                    ":one": 1,
+                    ":limit": math.ceil(self.rate * self.window_seconds),
+                    ":expires": window + 2 * self.window_seconds,
+                },
+            )
+            return True
+        except Exception as ex:
+            if is_conditional_check_failed(ex):
+                return False
+            print(f"Unable to count request of {caller}", ex)
+            return True
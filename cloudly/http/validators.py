@@ -6,10 +6,17 @@ from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from flowfast.step import Task, Mapping
 
 from cloudly.http.exceptions import ValidationError
+from cloudly.slots import add_slots
 
 
+@add_slots
 @dataclass
 class Rule(ABC):
+    """
+    Rules are slotted. Subclasses decorated with @dataclass work as before,
+    apply add_slots to them as well to keep their instances free of __dict__.
+    """
+
     field_name: str = None
 
     @abstractmethod
@@ -66,12 +73,15 @@ class Validator:
 
 
 class Required(Rule):
+    __slots__ = ()
+
     def validate(self, value: Any, **kwargs) -> str:
         if value or value is False:
             return self.valid(value)
         return self.error("value is required")
 
 
+@add_slots
 @dataclass
 class MinLength(Rule):
     min: int = 0
@@ -87,6 +97,7 @@ class MinLength(Rule):
         return self.valid(value)
 
 
+@add_slots
 @dataclass
 class MaxLength(Rule):
     max: int = None
@@ -103,6 +114,7 @@ class MaxLength(Rule):
 
 
 class Email(Rule):
+    __slots__ = ()
     pattern = r"^\S+@\S+\.\S+$"
 
     def validate(self, value: Any, raw_data: dict = None) -> str:
@@ -112,6 +124,7 @@ class Email(Rule):
         return RegexValidator(self.field_name, self.pattern).validate(value)
 
 
+@add_slots
 @dataclass
 class DecimalNumber(Rule):
     decimal_places: int = 2
@@ -141,6 +154,7 @@ class DecimalNumber(Rule):
             return self.error("must be a decimal")
 
 
+@add_slots
 @dataclass
 class IntegerNumber(Rule):
     max: Optional[int] = None
@@ -161,6 +175,7 @@ class IntegerNumber(Rule):
             return self.error(f"must be an integer between {self.min} and {self.max}")
 
 
+@add_slots
 @dataclass
 class RegexValidator(Rule):
     pattern: str = "*"
@@ -178,6 +193,7 @@ class RegexValidator(Rule):
             return self.error(f"does not match the pattern {self.pattern}")
 
 
+@add_slots
 @dataclass
 class OptionsValidator(Rule):
     options: Iterable[Any] = field(default_factory=tuple)
@@ -189,6 +205,7 @@ class OptionsValidator(Rule):
         return self.valid(value)
 
 
+@add_slots
 @dataclass
 class BooleanValidator(Rule):
     default_value: bool = None
@@ -276,6 +293,7 @@ class RunValidation(Task):
         return Validator(self.schema).validate(input)
 
 
+@add_slots
 @dataclass
 class ListFieldValidator(Rule):
     item_schema: dict = None
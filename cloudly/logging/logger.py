@@ -4,6 +4,8 @@ from logging import Handler, LogRecord
 import logging
 from typing import Any
 
+from cloudly.aws.clients import resolve_table
+
 
 class DynamoTableHandler(Handler):
     def __init__(self, client_id: str, database_table: Any, level=logging.INFO):
@@ -75,7 +77,8 @@ class Logger:
         cls, name: str, client_id: str, database_table: Any, level=logging.INFO
     ):
         _logger = logging.getLogger(name)
-        handler = DynamoTableHandler(client_id, database_table, level)
+        table = resolve_table(database_table)
+        handler = DynamoTableHandler(client_id, table, level)
         _logger.setLevel(level)
         for h in _logger.handlers:
             _logger.removeHandler(h)
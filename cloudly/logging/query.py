@@ -0,0 +1,141 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+Timestamp = Union[int, float, Decimal, datetime]
+
+
+@dataclass
+class MetricBucket:
+    start: Decimal
+    count: int = 0
+    values: Dict[str, Decimal] = field(default_factory=dict)
+
+
+@dataclass
+class LogQuery:
+    """
+    Read back the logs written by DynamoTableHandler.
+
+    Logs are stored under pk=CLIENT_ID and sk=LOGS#<eventType>#<timestamp>, so a
+    client, event type and time window map onto a single sort-key range query.
+    Results are streamed page by page and only the requested attributes are read.
+    """
+
+    database_table: Any
+    client_id: str
+    page_size: int = 100
+
+    def logs(
+        self,
+        event_type: str,
+        start: Timestamp,
+        end: Optional[Timestamp] = None,
+        fields: Iterable[str] = None,
+        newest_first: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Yield the log entries of event_type between start and end (inclusive).
+        When fields is given, only those attributes of each log are read.
+
+        The bounds are compared with the sort keys as strings, so they only work
+        as epoch-second timestamps with as many integer digits as the stored ones
+        (any time between 2001 and 2286). A bound like 999 does not select 1000.5.
+        """
+
+        names = {"#data": "data"}
+        if fields:
+            projection = []
+            for index, name in enumerate(fields):
+                names[f"#f{index}"] = name
+                projection.append(f"#data.#f{index}")
+            projection = ", ".join(projection)
+        else:
+            projection = "#data"
+
+        items = self._query(
+            event_type,
+            start,
+            end,
+            ProjectionExpression=projection,
+            ExpressionAttributeNames=names,
+            ScanIndexForward=not newest_first,
+        )
+        for item in items:
+            yield item.get("data", {})
+
+    def metrics(
+        self,
+        event_type: str,
+        start: Timestamp,
+        end: Optional[Timestamp] = None,
+        bucket_seconds: int = 60,
+        metric: str = None,
+    ) -> List[MetricBucket]:
+        """
+        Roll up the metrics of event_type into fixed buckets of bucket_seconds.
+        Rows are summed as they stream in, so memory grows with the number of
+        buckets and not with the number of rows.
+        """
+
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be greater than 0")
+
+        size = Decimal(bucket_seconds)
+        buckets: Dict[Decimal, MetricBucket] = {}
+        rows = self.logs(event_type, start, end, fields=("timestamp", "metric"))
+        for row in rows:
+            timestamp = row.get("timestamp")
+            values = row.get("metric")
+            if timestamp is None or not isinstance(values, dict):
+                continue
+
+            bucket_start = (Decimal(timestamp) // size) * size
+            bucket = buckets.get(bucket_start)
+            if bucket is None:
+                bucket = buckets[bucket_start] = MetricBucket(bucket_start)
+
+            bucket.count += 1
+            for name, value in values.items():
+                if metric and name != metric:
+                    continue
+                bucket.values[name] = bucket.values.get(name, 0) + Decimal(str(value))
+
+        return [buckets[key] for key in sorted(buckets)]
+
+    def _query(
+        self,
+        event_type: str,
+        start: Timestamp,
+        end: Optional[Timestamp],
+        **kwargs,
+    ) -> Iterator[dict]:
+        end = time.time() if end is None else end
+        prefix = f"LOGS#{event_type}#"
+        params = {
+            "KeyConditionExpression": "pk = :pk AND sk BETWEEN :start AND :end",
+            "ExpressionAttributeValues": {
+                ":pk": self.client_id.upper(),
+                ":start": f"{prefix}{_to_decimal(start)}",
+                ":end": f"{prefix}{_to_decimal(end)}",
+            },
+            "Limit": self.page_size,
+            **kwargs,
+        }
+
+        while True:
+            response = self.database_table.query(**params)
+            yield from response.get("Items", [])
+
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            params["ExclusiveStartKey"] = last_key
+
+
+def _to_decimal(value: Timestamp) -> Decimal:
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return Decimal(str(value))
@@ -0,0 +1,64 @@
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Type, TypeVar
+
+T = TypeVar("T")
+
+
+def add_slots(cls: Type[T]) -> Type[T]:
+    """
+    Give a dataclass __slots__, like dataclass(slots=True) of python 3.10+.
+    Apply it on top of @dataclass:
+
+        @add_slots
+        @dataclass(frozen=True)
+        class Point:
+            x: int
+            y: int = 0
+
+    Instances then have no __dict__, which saves roughly a hundred bytes per
+    object. The class is recreated, so methods using super() without arguments
+    do not work in it. Fields already slotted by a base class are not repeated,
+    and fields with init=False need a default_factory.
+    """
+
+    if not is_dataclass(cls):
+        raise TypeError(f"{cls.__name__} is not a dataclass")
+    if "__slots__" in cls.__dict__:
+        raise TypeError(f"{cls.__name__} already specifies __slots__")
+
+    for f in fields(cls):
+        if not f.init and f.default is not MISSING:
+            # __init__ leaves these to the class attribute, which the slot replaces
+            raise TypeError(f"Use a default_factory for the init=False field {f.name}")
+
+    inherited = set()
+    for base in cls.__mro__[1:]:
+        slots = base.__dict__.get("__slots__", ())
+        inherited.update((slots,) if isinstance(slots, str) else slots)
+    field_names = tuple(f.name for f in fields(cls) if f.name not in inherited)
+
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = field_names
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+
+    slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted.__qualname__ = cls.__qualname__
+
+    if cls.__dataclass_params__.frozen:
+        # Frozen classes block __setattr__, which the default pickling of
+        # slotted objects uses.
+        slotted.__getstate__ = _getstate
+        slotted.__setstate__ = _setstate
+    return slotted
+
+
+def _getstate(self):
+    return [getattr(self, f.name) for f in fields(self)]
+
+
+def _setstate(self, state):
+    for f, value in zip(fields(self), state):
+        object.__setattr__(self, f.name, value)
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    List,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from cloudly.streams.parallel import partition_by_key
+
+T = TypeVar("T")
+
+_loops = threading.local()
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """
+    An event loop for the calling thread that is created once and then reused,
+    so async clients and connections opened by processors survive across warm
+    invocations.
+    """
+
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+def run_sync(coroutine: Awaitable[T]) -> T:
+    return event_loop().run_until_complete(coroutine)
+
+
+async def run_partitioned_async(
+    items: Iterable[T],
+    handler: Callable[[T], Awaitable[Any]],
+    key: Callable[[T], Hashable],
+    max_concurrency: int = 16,
+    fatal: Tuple[Type[Exception], ...] = (),
+) -> List[Tuple[int, Exception]]:
+    """
+    The coroutine counterpart of run_partitioned. Each key is a task that
+    handles its items in order, and at most max_concurrency items are handled
+    at once across all keys. Failures are reported exactly like run_partitioned.
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    stop = asyncio.Event()
+    fatal_errors: List[Tuple[int, Exception]] = []
+
+    async def run_group(group: List[Tuple[int, T]]) -> List[Tuple[int, Exception]]:
+        for position, (index, item) in enumerate(group):
+            if stop.is_set():
+                return []
+            try:
+                async with semaphore:
+                    await handler(item)
+            except fatal as ex:
+                fatal_errors.append((index, ex))
+                stop.set()
+                return []
+            except Exception as ex:
+                return [(i, ex) for i, _ in group[position:]]
+        return []
+
+    groups = partition_by_key(items, key)
+    results = await asyncio.gather(*(run_group(group) for group in groups))
+
+    if fatal_errors:
+        raise min(fatal_errors, key=lambda failure: failure[0])[1]
+
+    failures = (failure for result in results for failure in result)
+    return sorted(failures, key=lambda failure: failure[0])
@@ -0,0 +1,414 @@
+"""
+Measure StreamProcessor throughput for a set of processors.
+
+Runs synthetic or captured DynamoDB stream batches through StreamProcessor
+against an InMemoryTable with simulated latency, and reports records/sec, the
+time spent in each processor, the peak memory of a batch run and the memory
+taken by each Change.
+
+    python -m cloudly.streams.benchmark myapp.processors:OrderTotals \\
+        --records 10000 --batch-size 100 --width 40 --skew 1.5 --latency-ms 2
+
+Use --replay to run captured events (a lambda event, a list of records or one
+event per line) instead, and --json to get a machine readable result.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type
+
+from cloudly.config.cache import ConfigCache
+from cloudly.config.client import ConfigClient
+from cloudly.logging.logger import Logger
+from cloudly.streams.common import (
+    AsyncDbStreamProcessor,
+    Change,
+    DbStreamProcessor,
+    StreamProcessor,
+)
+from cloudly.testing.table import InMemoryTable, fixed_latency
+
+DEFAULT_EVENT_MIX = {"INSERT": 0.2, "MODIFY": 0.7, "REMOVE": 0.1}
+
+
+@dataclass
+class Workload:
+    """
+    Shape of the synthetic stream. width is the number of attributes per item
+    image, keys the number of distinct items and skew how much the records
+    concentrate on a few of them (0 is uniform, 1 or more is a hot-key mix).
+    """
+
+    records: int = 1000
+    batch_size: int = 100
+    width: int = 20
+    keys: int = 1000
+    skew: float = 0.0
+    event_mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_EVENT_MIX))
+    seed: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    records: int
+    batches: int
+    seconds: float
+    records_per_second: float
+    processor_seconds: Dict[str, float]
+    processor_calls: Dict[str, int]
+    failed: int
+    deferred: int
+    failed_batches: int
+    table_calls: Dict[str, int]
+    peak_memory_bytes: Optional[int] = None
+    bytes_per_change: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def synthetic_events(workload: Workload) -> Iterator[dict]:
+    """Yield lambda events of workload.batch_size stream records each."""
+
+    rng = random.Random(workload.seed)
+    events, weights = zip(*workload.event_mix.items())
+    batch = []
+    for sequence in range(1, workload.records + 1):
+        index = int(workload.keys * rng.random() ** (1 + workload.skew))
+        event = rng.choices(events, weights)[0]
+        batch.append(_record(sequence, event, index, workload.width, rng))
+        if len(batch) == workload.batch_size:
+            yield {"Records": batch}
+            batch = []
+    if batch:
+        yield {"Records": batch}
+
+
+def replay_events(paths: Iterable[str], batch_size: int = None) -> Iterator[dict]:
+    """
+    Yield the lambda events captured in the given files. A file holds a lambda
+    event, a list of records or one event per line. With batch_size, the records
+    of all the files are re-batched to that size.
+    """
+
+    if batch_size is None:
+        for path in paths:
+            yield from _read_events(path)
+        return
+
+    batch = []
+    for record in (r for path in paths for r in _read_records(path)):
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield {"Records": batch}
+            batch = []
+    if batch:
+        yield {"Records": batch}
+
+
+def run_benchmark(
+    processor_classes: Sequence[Type[DbStreamProcessor]],
+    events: Iterable[dict],
+    table: Any = None,
+    measure_memory: bool = True,
+    **options,
+) -> BenchmarkResult:
+    """
+    Run every event through a StreamProcessor built from processor_classes and
+    options (max_workers, coalesce, buffer_writes, ...). Failed records do not
+    stop the run, they are counted in the result. All the records of a batch
+    that raised count as failed.
+
+    Peak memory is measured in a second pass over the same events, against a
+    copy of the table as it was before the timed run, so the tracing overhead
+    does not skew the timings. Processor times are summed over
+    threads, so with max_workers > 1 they can add up to more than seconds.
+    """
+
+    events = list(events)
+    table = table if table is not None else InMemoryTable(name="benchmark")
+    memory_table = _copy_table(table) if measure_memory else None
+    stream = _stream_processor(processor_classes, table, options)
+    timings = _time_processors(stream)
+
+    failed = deferred = failed_batches = 0
+    started = time.perf_counter()
+    for event in events:
+        try:
+            stream.run(event)
+        except Exception:
+            failed_batches += 1
+            failed += len(event.get("Records", []))
+            continue
+        failed += stream.last_report.failed
+        deferred += stream.last_report.deferred
+    seconds = time.perf_counter() - started
+
+    records = sum(len(event.get("Records", [])) for event in events)
+    result = BenchmarkResult(
+        records=records,
+        batches=len(events),
+        seconds=seconds,
+        records_per_second=records / seconds if seconds else 0.0,
+        processor_seconds={name: t.seconds for name, t in timings.items()},
+        processor_calls={name: t.calls for name, t in timings.items()},
+        failed=failed,
+        deferred=deferred,
+        failed_batches=failed_batches,
+        table_calls=dict(getattr(table, "calls", {})),
+    )
+
+    if measure_memory:
+        result.peak_memory_bytes = _peak_memory(
+            processor_classes, memory_table, events, options
+        )
+        result.bytes_per_change = bytes_per_change(events)
+    return result
+
+
+def bytes_per_change(events: Iterable[dict]) -> float:
+    """
+    Memory taken by each Change built from the records of events, its lazy
+    images included. The records themselves are not counted.
+    """
+
+    records = [record for event in events for record in event.get("Records", [])]
+    if not records:
+        return 0.0
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        changes = [Change.from_stream(record) for record in records]
+        held = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(changes)
+    finally:
+        tracemalloc.stop()
+    return held / len(changes)
+
+
+@dataclass
+class _Timing:
+    seconds: float = 0.0
+    calls: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, started: float):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.seconds += elapsed
+            self.calls += 1
+
+
+def _stream_processor(classes, table, options) -> StreamProcessor:
+    logger = logging.getLogger("cloudly.benchmark")
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+
+    config = ConfigClient(table, "benchmark", cache=ConfigCache())
+    return StreamProcessor(list(classes), table, Logger(logger), config, **options)
+
+
+def _time_processors(stream: StreamProcessor) -> Dict[str, _Timing]:
+    timings = {}
+    for processor in stream.processors:
+        timing = timings[processor.__class__.__name__] = _Timing()
+        if isinstance(processor, AsyncDbStreamProcessor):
+            processor.process_async = _timed_async(processor.process_async, timing)
+        else:
+            processor.process = _timed(processor.process, timing)
+    return timings
+
+
+def _timed(method, timing: _Timing):
+    def timed(change):
+        started = time.perf_counter()
+        try:
+            return method(change)
+        finally:
+            timing.add(started)
+
+    return timed
+
+
+def _timed_async(method, timing: _Timing):
+    async def timed(change):
+        started = time.perf_counter()
+        try:
+            return await method(change)
+        finally:
+            timing.add(started)
+
+    return timed
+
+
+def _copy_table(table: Any) -> InMemoryTable:
+    # The items of table without its latency, taken before the timed run
+    # changes them. Only InMemoryTable items can be copied.
+    copy = InMemoryTable(
+        name=getattr(table, "name", "benchmark"),
+        key_fields=getattr(table, "key_fields", ("pk", "sk")),
+    )
+    items = getattr(table, "items", None)
+    if isinstance(items, dict):
+        copy.load(items.values())
+    return copy
+
+
+def _peak_memory(classes, table, events: List[dict], options) -> int:
+    stream = _stream_processor(classes, table, options)
+    tracemalloc.start()
+    try:
+        for event in events:
+            try:
+                stream.run(event)
+            except Exception:
+                pass  # already counted by the timed run
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _record(sequence: int, event: str, index: int, width: int, rng) -> dict:
+    keys = {"pk": {"S": f"ITEM#{index}"}, "sk": {"S": "DETAILS"}}
+    record = {
+        "eventID": f"{sequence:032x}",
+        "eventName": event,
+        "eventSource": "aws:dynamodb",
+        "dynamodb": {
+            "Keys": keys,
+            "SequenceNumber": str(sequence),
+            "StreamViewType": "NEW_AND_OLD_IMAGES",
+        },
+    }
+    if event != "INSERT":
+        record["dynamodb"]["OldImage"] = _image(keys, width, rng)
+    if event != "REMOVE":
+        record["dynamodb"]["NewImage"] = _image(keys, width, rng)
+    return record
+
+
+def _image(keys: dict, width: int, rng) -> dict:
+    image = dict(keys)
+    image["status"] = {"S": rng.choice(("NEW", "PENDING", "DONE"))}
+    for n in range(max(width - len(image), 0)):
+        kind = n % 5
+        if kind == 0:
+            value = {"S": f"value-{rng.randrange(10_000)}"}
+        elif kind == 1:
+            value = {"N": str(rng.randrange(1_000_000))}
+        elif kind == 2:
+            value = {"BOOL": rng.random() < 0.5}
+        elif kind == 3:
+            value = {"M": {"name": {"S": "nested"}, "count": {"N": str(n)}}}
+        else:
+            value = {"L": [{"S": "a"}, {"N": "1"}]}
+        image[f"field{n}"] = value
+    return image
+
+
+def _read_events(path: str) -> Iterator[dict]:
+    with open(path) as file:
+        text = file.read().strip()
+    try:
+        documents = [json.loads(text)]
+    except json.JSONDecodeError:
+        documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    for document in documents:
+        yield {"Records": document} if isinstance(document, list) else document
+
+
+def _read_records(path: str) -> Iterator[dict]:
+    for event in _read_events(path):
+        yield from event.get("Records", [])
+
+
+def _load_class(path: str) -> type:
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    pairs = (part.split("=") for part in text.split(",") if part)
+    return {event.strip().upper(): float(weight) for event, weight in pairs}
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m cloudly.streams.benchmark",
+        description="Measure StreamProcessor throughput.",
+    )
+    parser.add_argument("processors", nargs="+", help="module:ProcessorClass")
+    parser.add_argument("--replay", nargs="*", help="captured event files")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument(
+        "--batch-size", type=int, help="records per batch (default 100)"
+    )
+    parser.add_argument("--width", type=int, default=20)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=0.0)
+    parser.add_argument("--mix", default="INSERT=0.2,MODIFY=0.7,REMOVE=0.1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--coalesce", action="store_true")
+    parser.add_argument("--buffer-writes", action="store_true")
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        events = replay_events(args.replay, args.batch_size)
+    else:
+        events = synthetic_events(
+            Workload(
+                records=args.records,
+                batch_size=args.batch_size or 100,
+                width=args.width,
+                keys=args.keys,
+                skew=args.skew,
+                event_mix=_parse_mix(args.mix),
+                seed=args.seed,
+            )
+        )
+
+    latency = fixed_latency(args.latency_ms) if args.latency_ms else None
+    result = run_benchmark(
+        [_load_class(path) for path in args.processors],
+        events,
+        table=InMemoryTable(name="benchmark", latency=latency),
+        measure_memory=not args.no_memory,
+        max_workers=args.workers,
+        report_batch_item_failures=True,
+        coalesce=args.coalesce,
+        buffer_writes=args.buffer_writes,
+    )
+
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+        return
+
+    print(f"{result.records} records in {result.batches} batches")
+    print(f"{result.seconds:.3f}s, {result.records_per_second:,.0f} records/sec")
+    print(f"failed {result.failed}, deferred {result.deferred}")
+    if result.failed_batches:
+        print(f"{result.failed_batches} batches raised")
+    for name, seconds in result.processor_seconds.items():
+        calls = result.processor_calls[name]
+        print(f"  {name}: {seconds:.3f}s over {calls} calls")
+    if result.peak_memory_bytes is not None:
+        print(f"peak memory {result.peak_memory_bytes / 1024:,.1f} KiB")
+        print(f"{result.bytes_per_change:,.0f} bytes per change")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
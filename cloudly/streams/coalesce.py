@@ -0,0 +1,38 @@
+from dataclasses import replace
+from typing import Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def net_event(first: str, last: str) -> Optional[str]:
+    """
+    The event type of a run of changes to one item, from its first and last
+    events. None means the item was created and removed again, so nothing
+    happened as far as the rest of the system is concerned.
+    """
+
+    if first == "INSERT":
+        return None if last == "REMOVE" else "INSERT"
+    if last == "REMOVE":
+        return "REMOVE"
+    return "MODIFY"
+
+
+def coalesce_changes(changes: Sequence[T]) -> Optional[T]:
+    """
+    Collapse the changes of one item, in stream order, into a single Change with
+    the first old image, the last new image and the net event type.
+    """
+
+    if not changes:
+        return None
+
+    first, last = changes[0], changes[-1]
+    if len(changes) == 1:
+        return first
+
+    event = net_event(first.event, last.event)
+    if event is None:
+        return None
+
+    return replace(last, old=first.old, new=last.new, event=event)
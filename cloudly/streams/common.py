@@ -1,20 +1,51 @@
+import asyncio
+import sys
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Any, Callable, Iterable, Type
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
 from flowfast.step import Task, Mapping
-from flowfast.workflow import Workflow
 from flowfast.base import Step
+from cloudly.aws.clients import resolve_table
 from cloudly.logging.logger import Logger
+from cloudly.slots import add_slots
 from cloudly.config.client import ConfigClient
-
-
-@dataclass
+from cloudly.db.buffer import BufferedTable
+from cloudly.db.deserializer import LazyImage, deserialize_image
+from cloudly.streams.exceptions import (
+    BatchProcessingError,
+    DeadlineExceededError,
+    RecordProcessingError,
+)
+from cloudly.streams.aio import run_partitioned_async, run_sync
+from cloudly.streams.coalesce import coalesce_changes
+from cloudly.streams.deadline import BatchReport, Deadline
+from cloudly.streams.dedup import ProcessedEvents
+from cloudly.streams.parallel import partition_by_key, record_key, run_partitioned
+from cloudly.streams.routing import RoutingIndex, routing_index
+
+
+@add_slots
+@dataclass(frozen=True)
 class Change:
+    """
+    One record of a DynamoDB stream. Changes are created for every record of a
+    batch, so they are slotted and immutable; use dataclasses.replace to derive
+    a changed copy.
+    """
+
     pk: str
     sk: str
     old: dict
     new: dict
     event: str
+    event_id: str = None
+    _changed_fields: Optional[Dict[Tuple[str, ...], dict]] = field(
+        default_factory=lambda: None, init=False, repr=False, compare=False
+    )
 
     @property
     def is_insert(self):
@@ -31,27 +62,53 @@ class Change:
     def get_changed_fields(self, change: "Change", fields: Iterable[str]) -> dict:
         """
         Get all the changed fields that are part of Meta.fields
+        The diff of a change is computed once per distinct fields; every call
+        gets its own copy of it.
         """
 
+        cache_key = tuple(fields)
+        cache = self._changed_fields
+        if change is self and cache is not None and cache_key in cache:
+            return dict(cache[cache_key])
+
         changed_fields = {}
         old = DynamicObject(change.old)
         new = DynamicObject(change.new)
 
-        for field in fields:
-            field_name = field.split(".")[-1]
+        for field in cache_key:
+            field_name = _split_path(field)[-1]
             old_value = old.get(field)
             new_value = new.get(field)
             if old_value != new_value:
                 changed_fields[field_name] = new_value
 
+        if change is self:
+            if cache is None:
+                cache = {}
+                object.__setattr__(self, "_changed_fields", cache)
+            cache[cache_key] = dict(changed_fields)
         return changed_fields
 
     @classmethod
-    def from_stream(cls, record: dict, normalizer: Callable[[dict], dict]):
+    def from_stream(
+        cls, record: dict, normalizer: Optional[Callable[[dict], dict]] = None
+    ):
+        """
+        Without a normalizer the images are LazyImage mappings that decode
+        attributes on first access with cloudly's own deserializer.
+        """
+
         event_name = record.get("eventName")
-        new = normalizer(record["dynamodb"].get("NewImage", {}))
-        old = normalizer(record["dynamodb"].get("OldImage", {}))
-        keys = normalizer(record["dynamodb"].get("Keys", {}))
+        if event_name is not None:
+            event_name = sys.intern(event_name)
+        if normalizer is None:
+            new = LazyImage(record["dynamodb"].get("NewImage"))
+            old = LazyImage(record["dynamodb"].get("OldImage"))
+            keys = deserialize_image(record["dynamodb"].get("Keys", {}))
+        else:
+            new = normalizer(record["dynamodb"].get("NewImage", {}))
+            old = normalizer(record["dynamodb"].get("OldImage", {}))
+            keys = normalizer(record["dynamodb"].get("Keys", {}))
 
         return cls(
             pk=keys.get("pk"),
@@ -59,15 +116,17 @@ class Change:
             old=old,
             new=new,
             event=event_name,
+            event_id=record.get("eventID"),
         )
 
 
-@dataclass
+@add_slots
+@dataclass(frozen=True)
 class DynamicObject:
     data: dict
 
     def get(self, item):
-        parts = item.split(".")
+        parts = _split_path(item)
 
         if len(parts) == 1:
             return self.data.get(item)
@@ -81,6 +140,19 @@ class DynamicObject:
         return obj
 
 
+def _batch_failure(ex: Exception) -> Exception:
+    """A record failure that is not reported fails the whole batch."""
+
+    if type(ex) is RecordProcessingError:
+        return BatchProcessingError(ex.processor, ex.cause)
+    return ex
+
+
+@lru_cache(maxsize=1024)
+def _split_path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split("."))
+
+
 @dataclass
 class EventFilter(ABC):
     change: Change
@@ -98,6 +170,20 @@ class EventFilter(ABC):
         return True
 
 
+class ErrorPolicy:
+    """
+    What a DbStreamProcessor does when execute raises.
+
+    SWALLOW: log the error and carry on as if the record was processed.
+    FAIL_RECORD: log the error and report the record as failed so it is retried.
+    FAIL_BATCH: log the error and fail the whole batch so all of it is retried.
+    """
+
+    SWALLOW = "swallow"
+    FAIL_RECORD = "fail-record"
+    FAIL_BATCH = "fail-batch"
+
+
 @dataclass
 class DbStreamProcessor(Step[Change, Change], ABC):
     """
@@ -110,6 +196,19 @@ class DbStreamProcessor(Step[Change, Change], ABC):
     If no events are registered, the processor will process all events.
 
     can_process_event will return true if any of the registered events is raised.
+
+    Processors can also declare what they care about statically. StreamProcessor
+    compiles these into a routing index once, so a processor is not even called
+    for records it would ignore:
+
+        event_types = ("INSERT", "MODIFY")    # eventName values to process
+        pk_prefix = "ORDER#"                  # or a tuple of prefixes
+        sk_prefix = ("ITEM#", "FEE#")
+        watch_fields = ("status", "payment.amount")  # run only if one changed
+
+    on_error: str = ErrorPolicy.SWALLOW
+    Decides whether a failure in execute is swallowed, fails the record or fails
+    the whole batch. See ErrorPolicy.
     """
 
     database_table: Any
@@ -117,15 +216,28 @@ class DbStreamProcessor(Step[Change, Change], ABC):
     config: ConfigClient
 
     events = None
+    event_types = None
+    pk_prefix = None
+    sk_prefix = None
+    watch_fields = None
+    on_error = ErrorPolicy.SWALLOW
 
     def process(self, input: Change) -> Change:
         try:
             if self.can_process_event(input):
                 self.execute(input)
         except Exception as ex:
-            self.logger.exception(f"{self.__class__.__name__} failed", ex)
+            self._handle_error(ex)
         return input
 
+    def _handle_error(self, ex: Exception):
+        name = self.__class__.__name__
+        self.logger.exception(f"{name} failed", ex)
+        if self.on_error == ErrorPolicy.FAIL_RECORD:
+            raise RecordProcessingError(name, ex) from ex
+        if self.on_error == ErrorPolicy.FAIL_BATCH:
+            raise BatchProcessingError(name, ex) from ex
+
     def can_process_event(self, change: Change) -> bool:
         if not self.events:
             return True
@@ -137,15 +249,41 @@ class DbStreamProcessor(Step[Change, Change], ABC):
         return change
 
 
+@dataclass
+class AsyncDbStreamProcessor(DbStreamProcessor, ABC):
+    """
+    Base class for processors whose execute is a coroutine, e.g. processors that
+    mostly wait on HTTP APIs. StreamProcessor runs them on a persistent event
+    loop so many records can wait at the same time, while records of the same
+    item still run in order. They can be mixed with DbStreamProcessor classes.
+    """
+
+    def process(self, input: Change) -> Change:
+        return run_sync(self.process_async(input))
+
+    async def process_async(self, input: Change) -> Change:
+        try:
+            if self.can_process_event(input):
+                await self.execute(input)
+        except Exception as ex:
+            self._handle_error(ex)
+        return input
+
+    @abstractmethod
+    async def execute(self, change: Change) -> Change:
+        return change
+
+
 @dataclass
 class ParseDynamoJson(Task):
     """
     Parse the DynamoDB JSON format into a Change object
      normalizer: Callable[[dict], dict] = None
       where normalizer is a function that takes a DynamoDB json format and returns a regular json format
+      When no normalizer is given, images are decoded lazily by cloudly.db.deserializer
     """
 
-    normalizer: Callable[[dict], dict]
+    normalizer: Callable[[dict], dict] = None
 
     def process(self, input: Mapping) -> Mapping:
         return Change.from_stream(input, self.normalizer)
@@ -157,32 +295,354 @@ class StreamProcessor:
     This class is used to process events from DynamoDB streams.
     It will read the events from the stream and execute the processors
     that are registered for the given event.
+
+    database_table can be a table name, the Table then comes from the shared
+    client registry (see cloudly.aws.clients).
+
+    normalizer: Callable[[dict], dict] = None
+    Converts DynamoDB JSON images into plain dicts. Leave it out to use cloudly's
+    deserializer, which decodes image attributes lazily (see LazyImage).
+
+    max_workers: int = 1
+    When greater than 1, records are grouped by item key and different items are
+    processed concurrently on up to max_workers threads. Records of the same item
+    are still processed one at a time, in stream order. Processors must be safe
+    to share between threads.
+
+    report_batch_item_failures: bool = False
+    Set this when the event source mapping has ReportBatchItemFailures enabled.
+    run then keeps going past failed records and returns a batchItemFailures
+    response with their sequence numbers, so only those records are retried.
+    Later records of a failed item are reported too, to keep them in order.
+    Otherwise a failed record fails the batch: it is raised as a
+    BatchProcessingError and the whole batch is retried.
+
+    coalesce: bool = False
+    Collapse all the records of an item in the batch into one net Change (first
+    old image, last new image, combined event type) and run the processors once
+    per item. An item inserted and removed in the same batch is skipped. Only use
+    it when no processor needs to see every intermediate state.
+
+    buffer_writes: bool = False
+    Give processors a BufferedTable instead of database_table. Their put_item and
+    delete_item calls are deduped by key and sent with batch_write_item at the
+    end of the batch, or every flush_threshold items. Writes made while
+    processing a record that fails are dropped, and so are all pending writes
+    when the batch fails.
+
+    processed_events: ProcessedEvents = None
+    Skip processors that already succeeded for a record (by eventID) when Lambda
+    redelivers it. A processor whose error is swallowed counts as succeeded.
+    With coalesce, the net change is tracked by the eventID of its last record.
+    With buffer_writes, a record is only marked once its writes are flushed.
+
+    safety_margin_ms: int = 5000
+    When run is given the lambda context, it stops starting new records once
+    less than safety_margin_ms remain and reports the records it did not get to
+    as failures (with report_batch_item_failures) so only they are redelivered.
+    The first record of a batch is always started, and a margin that is not
+    below the time left at the start is lowered to half of it. Without
+    report_batch_item_failures the deadline is not checked, since the whole
+    batch would be retried anyway.
+    last_report holds the per-record timings of the last batch, which helps
+    when tuning the batch size.
+
+    max_concurrency: int = 16
+    When any processor is an AsyncDbStreamProcessor, the batch runs on an event
+    loop that is kept across warm invocations instead of on threads. Items are
+    processed concurrently (same-item records in order) with at most
+    max_concurrency records in flight. Synchronous processors in the same batch,
+    and the processed_events reads and writes, run on worker threads with
+    asyncio.to_thread so they do not block the loop.
     """
 
     processor_classes: Iterable[Type[DbStreamProcessor]]
     database_table: Any
     logger: Logger
     config: ConfigClient
-    normalizer: Callable[[dict], dict]
-
-    def run(self, event: dict):
+    normalizer: Callable[[dict], dict] = None
+    max_workers: int = 1
+    report_batch_item_failures: bool = False
+    coalesce: bool = False
+    buffer_writes: bool = False
+    flush_threshold: int = 500
+    processed_events: ProcessedEvents = None
+    safety_margin_ms: int = 5000
+    max_concurrency: int = 16
+    last_report: BatchReport = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    _processors: Tuple[DbStreamProcessor, ...] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _parser: ParseDynamoJson = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _routes: RoutingIndex = field(default=None, init=False, repr=False, compare=False)
+    _buffer: BufferedTable = field(default=None, init=False, repr=False, compare=False)
+    _is_async: bool = field(default=False, init=False, repr=False, compare=False)
+    _markers: List[Tuple[str, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _record_markers: ContextVar = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def run(self, event: dict, context: Any = None):
         records = event.get("Records", [])
+        report = self.last_report = BatchReport(len(records))
 
         if not records:
             self.logger.warn("Stream processor called with no records to process")
+            return self._respond(records, [])
+
+        started = time.perf_counter()
+        # Without batchItemFailures the whole batch is retried anyway, so
+        # stopping early would only turn a late success into a failure.
+        deadline = Deadline(
+            context if self.report_batch_item_failures else None,
+            self.safety_margin_ms,
+        )
+        self._prepare()
+        if self.coalesce:
+            items = partition_by_key(records, record_key)
+            process, key = self._process_item_records, _first_index
+            process_async = self._process_item_records_async
+            sequence_number = _first_sequence_number
+        else:
+            items, process, key = records, self.process_record, record_key
+            process_async = self.process_record_async
+            sequence_number = _sequence_number
+
+        def handler(item):
+            deadline.check()
+            item_started = time.perf_counter()
+            try:
+                with self._staged():
+                    process(item)
+            finally:
+                report.record(sequence_number(item), item_started)
+
+        async def async_handler(item):
+            deadline.check()
+            item_started = time.perf_counter()
+            try:
+                with self._staged():
+                    await process_async(item)
+            finally:
+                report.record(sequence_number(item), item_started)
+
+        try:
+            if self._is_async:
+                failures = run_sync(
+                    run_partitioned_async(
+                        items,
+                        async_handler,
+                        key=key,
+                        max_concurrency=self.max_concurrency,
+                        fatal=(BatchProcessingError,),
+                    )
+                )
+            elif self.max_workers <= 1 and not self.report_batch_item_failures:
+                for item in items:
+                    handler(item)
+                failures = []
+            else:
+                failures = run_partitioned(
+                    items,
+                    handler,
+                    key=key,
+                    max_workers=self.max_workers,
+                    fatal=(BatchProcessingError,),
+                )
+            self._flush()
+        except Exception as ex:
+            self._discard()
+            self.logger.exception("DB Stream processing failed!", ex)
+            raise _batch_failure(ex)
+        finally:
+            report.seconds = time.perf_counter() - started
+
+        if self.coalesce:
+            failures = [(i, ex) for index, ex in failures for i, _ in items[index]]
+
+        logged = set()
+        for index, ex in failures:
+            if isinstance(ex, DeadlineExceededError):
+                report.deferred += 1
+            elif id(ex) not in logged:
+                logged.add(id(ex))
+                self.logger.exception(f"DB Stream processing failed at {index}", ex)
+
+        report.failed = len(failures) - report.deferred
+        if report.deferred:
+            self.logger.warn(
+                f"Stopped before timeout, {report.deferred} records left for retry"
+            )
+
+        if failures and not self.report_batch_item_failures:
+            raise _batch_failure(failures[0][1])
+
+        return self._respond(records, failures)
+
+    @property
+    def processors(self) -> Tuple[DbStreamProcessor, ...]:
+        """The processor instances, in registration order. Built on first use."""
+
+        self._prepare()
+        return self._processors
+
+    def process_record(self, record: dict) -> Change:
+        """
+        Parse one stream record and run the processors routed to it, in the order
+        they were registered.
+        """
+
+        self._prepare()
+        change = self._parser.process(record)
+        return self.process_change(change)
+
+    def process_change(self, change: Change) -> Change:
+        for processor in self._routed(change):
+            processor.process(change)
+            self._mark_done(change, processor)
+        return change
+
+    async def process_record_async(self, record: dict) -> Change:
+        self._prepare()
+        change = self._parser.process(record)
+        return await self.process_change_async(change)
+
+    async def process_change_async(self, change: Change) -> Change:
+        for processor in await self._routed_async(change):
+            if isinstance(processor, AsyncDbStreamProcessor):
+                await processor.process_async(change)
+            else:
+                await asyncio.to_thread(processor.process, change)
+            await self._mark_done_async(change, processor)
+        return change
+
+    def _routed(self, change: Change) -> List[DbStreamProcessor]:
+        processors = [self._processors[p] for p in self._routes.route(change)]
+        if self.processed_events is None or not change.event_id or not processors:
+            return processors
+
+        done = self.processed_events.completed(change.event_id)
+        return [p for p in processors if p.__class__.__name__ not in done]
+
+    async def _routed_async(self, change: Change) -> List[DbStreamProcessor]:
+        if self.processed_events is None:
+            return self._routed(change)
+        return await asyncio.to_thread(self._routed, change)
+
+    async def _mark_done_async(self, change: Change, processor: DbStreamProcessor):
+        if self.processed_events is not None and change.event_id:
+            await asyncio.to_thread(self._mark_done, change, processor)
+
+    def _mark_done(self, change: Change, processor: DbStreamProcessor):
+        if self.processed_events is None or not change.event_id:
+            return
+
+        marker = (change.event_id, processor.__class__.__name__)
+        markers = self._record_markers.get() if self._buffer is not None else None
+        if markers is None:
+            self.processed_events.mark_done(*marker)
+        else:
+            # The processor's writes are still buffered, the marker waits for them
+            markers.append(marker)
+
+    def _coalesce(self, records: List[Tuple[int, dict]]) -> Optional[Change]:
+        return coalesce_changes([self._parser.process(record) for _, record in records])
+
+    def _process_item_records(self, records: List[Tuple[int, dict]]):
+        change = self._coalesce(records)
+        if change is not None:
+            self.process_change(change)
+
+    async def _process_item_records_async(self, records: List[Tuple[int, dict]]):
+        change = self._coalesce(records)
+        if change is not None:
+            await self.process_change_async(change)
+
+    def _prepare(self):
+        # Processors, parser and routes are built on first use and then reused.
+        # Keep the StreamProcessor at module level to reuse them across warm
+        # invocations.
+        if self._processors is not None:
             return
 
-        steps = tuple(
-            cls(self.database_table, self.logger, self.config)
-            for cls in self.processor_classes
+        classes = tuple(self.processor_classes)
+        table = self.database_table = resolve_table(self.database_table)
+        if self.buffer_writes:
+            table = BufferedTable(table, flush_threshold=self.flush_threshold)
+            self._buffer = table
+            self._markers = []
+            self._record_markers = ContextVar("record_markers", default=None)
+
+        self._parser = ParseDynamoJson(self.normalizer)
+        self._routes = routing_index(classes)
+        self._processors = tuple(
+            cls(table, self.logger, self.config) for cls in classes
+        )
+        self._is_async = any(
+            isinstance(processor, AsyncDbStreamProcessor)
+            for processor in self._processors
         )
 
-        pipeline = Workflow(ParseDynamoJson(self.normalizer))
-        for step in steps:
-            pipeline = pipeline.next(step)
+    @contextmanager
+    def _staged(self):
+        # Writes and processed markers of a record are only kept once it has been
+        # processed, so records that fail (and are redelivered) leave nothing
+        # behind. Markers are written after the buffer is flushed.
+        if self._buffer is None:
+            yield
+            return
 
+        markers = []
+        token = self._record_markers.set(markers)
         try:
-            _ = tuple(Workflow.for_each(pipeline).run(records))
-        except Exception as ex:
-            self.logger.exception("DB Stream processing failed!", ex)
-            raise
+            with self._buffer.staged():
+                yield
+        finally:
+            self._record_markers.reset(token)
+        self._markers.extend(markers)
+
+    def _flush(self):
+        if self._buffer is None:
+            return
+
+        self._buffer.flush()
+        markers, self._markers = self._markers, []
+        for event_id, name in markers:
+            self.processed_events.mark_done(event_id, name)
+
+    def _discard(self):
+        # The buffer outlives the invocation, a failed batch must not leave
+        # writes or markers behind for the next one.
+        if self._buffer is not None:
+            self._buffer.clear()
+            self._markers = []
+
+    def _respond(self, records: list, failures: list):
+        if not self.report_batch_item_failures:
+            return None
+
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": records[index]["dynamodb"]["SequenceNumber"]}
+                for index, _ in failures
+            ]
+        }
+
+
+def _first_index(records: List[Tuple[int, dict]]) -> int:
+    return records[0][0]
+
+
+def _sequence_number(record: dict) -> str:
+    return record.get("dynamodb", {}).get("SequenceNumber")
+
+
+def _first_sequence_number(records: List[Tuple[int, dict]]) -> str:
+    return _sequence_number(records[0][1])
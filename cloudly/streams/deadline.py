@@ -0,0 +1,82 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from cloudly.streams.exceptions import DeadlineExceededError
+
+
+class Deadline:
+    """
+    Tells a batch to stop taking new records when the lambda has less than
+    margin_ms left to run, based on the invocation context.
+    Without a context there is no deadline.
+
+    The first check always passes, so every batch makes progress. When margin_ms
+    is not below the time left at that point (a short lambda timeout), it is
+    lowered to half of it.
+    """
+
+    def __init__(self, context: Any = None, margin_ms: int = 5000):
+        self.context = context
+        self.margin_ms = margin_ms
+        self._started = False
+        self._lock = threading.Lock()
+
+    def remaining_ms(self) -> Optional[int]:
+        if self.context is None:
+            return None
+        return self.context.get_remaining_time_in_millis()
+
+    def check(self):
+        remaining = self.remaining_ms()
+        if remaining is None:
+            return
+
+        with self._lock:
+            if not self._started:
+                self._started = True
+                if self.margin_ms >= remaining:
+                    self.margin_ms = remaining // 2
+                return
+
+        if remaining < self.margin_ms:
+            raise DeadlineExceededError(remaining)
+
+
+@dataclass
+class RecordTiming:
+    sequence_number: str
+    seconds: float
+
+
+@dataclass
+class BatchReport:
+    """
+    What happened to the last batch: how long each record (or coalesced item)
+    took and how many records were left for the next delivery.
+    """
+
+    size: int
+    timings: List[RecordTiming] = field(default_factory=list)
+    failed: int = 0
+    deferred: int = 0
+    seconds: float = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record(self, sequence_number: str, started: float):
+        timing = RecordTiming(sequence_number, time.perf_counter() - started)
+        with self._lock:
+            self.timings.append(timing)
+
+    @property
+    def average_seconds(self) -> float:
+        if not self.timings:
+            return 0
+        return sum(t.seconds for t in self.timings) / len(self.timings)
+
+    @property
+    def slowest(self) -> Optional[RecordTiming]:
+        return max(self.timings, key=lambda t: t.seconds, default=None)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, FrozenSet
+
+from cloudly.aws.clients import resolve_table
+from cloudly.db.errors import is_conditional_check_failed
+
+
+class ProcessedEvents:
+    """
+    Remembers which processors already handled a stream record, so records that
+    Lambda redelivers after a retry or timeout are not processed twice.
+
+    Each success is stored as pk=PROCESSED#<eventID>, sk=<processor name> with a
+    conditional write and a TTL attribute, so the table cleans itself up. The
+    processors done for an event are read with one query and kept in an
+    in-memory LRU, which lets a warm container skip the table entirely.
+    """
+
+    def __init__(
+        self,
+        table: Any,
+        ttl: int = 24 * 60 * 60,
+        max_entries: int = 10_000,
+        ttl_attribute: str = "expires",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.table = resolve_table(table)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.ttl_attribute = ttl_attribute
+        self.clock = clock
+        self._done: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def completed(self, event_id: str) -> FrozenSet[str]:
+        """
+        Names of the processors that already succeeded for event_id.
+        """
+
+        with self._lock:
+            done = self._done.get(event_id)
+            if done is not None:
+                self._done.move_to_end(event_id)
+                return done
+
+        done = frozenset(self._query(event_id))
+        self._remember(event_id, done)
+        return done
+
+    def mark_done(self, event_id: str, processor: str):
+        with self._lock:
+            done = self._done.get(event_id, frozenset())
+        self._remember(event_id, done | {processor})
+
+        try:
+            self.table.put_item(
+                Item={
+                    "pk": self._pk(event_id),
+                    "sk": processor,
+                    self.ttl_attribute: int(self.clock() + self.ttl),
+                },
+                ConditionExpression="attribute_not_exists(pk)",
+            )
+        except Exception as ex:
+            if not is_conditional_check_failed(ex):
+                print(f"Unable to record {processor} for {event_id}", ex)
+
+    def _query(self, event_id: str):
+        params = {
+            "KeyConditionExpression": "pk = :pk",
+            "ExpressionAttributeValues": {":pk": self._pk(event_id)},
+            "ProjectionExpression": "sk, #expires",
+            "ExpressionAttributeNames": {"#expires": self.ttl_attribute},
+            "ConsistentRead": True,
+        }
+        now = self.clock()
+        while True:
+            response = self.table.query(**params)
+            for item in response.get("Items", []):
+                # TTL deletion is lazy, so expired markers can still be returned.
+                if item.get(self.ttl_attribute, now + 1) > now:
+                    yield item["sk"]
+
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            params["ExclusiveStartKey"] = last_key
+
+    def _remember(self, event_id: str, done: FrozenSet[str]):
+        with self._lock:
+            self._done[event_id] = done
+            self._done.move_to_end(event_id)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+
+    def _pk(self, event_id: str) -> str:
+        return f"PROCESSED#{event_id}"
@@ -0,0 +1,25 @@
+class RecordProcessingError(Exception):
+    """
+    Raised when a stream record could not be processed and should be retried.
+    """
+
+    def __init__(self, processor: str, cause: Exception = None):
+        self.processor = processor
+        self.cause = cause
+        super().__init__(f"{processor} failed: {cause}")
+
+
+class BatchProcessingError(RecordProcessingError):
+    """
+    Raised when a failure should make the whole batch be retried.
+    """
+
+
+class DeadlineExceededError(RecordProcessingError):
+    """
+    Raised instead of starting a record when the lambda is about to time out.
+    """
+
+    def __init__(self, remaining_ms: int):
+        self.remaining_ms = remaining_ms
+        super().__init__("StreamProcessor", f"only {remaining_ms}ms left")
@@ -0,0 +1,117 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+def record_key(record: dict) -> str:
+    """
+    Identify the item a raw stream record belongs to from its Keys, without
+    deserializing the images.
+    """
+
+    keys = record.get("dynamodb", {}).get("Keys", {})
+    return json.dumps(keys, sort_keys=True, separators=(",", ":"))
+
+
+def partition_by_key(
+    items: Iterable[T], key: Callable[[T], Hashable]
+) -> List[List[Tuple[int, T]]]:
+    """
+    Group items by key, keeping their original position and relative order.
+    """
+
+    groups: Dict[Hashable, List[Tuple[int, T]]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(key(item), []).append((index, item))
+    return list(groups.values())
+
+
+def run_partitioned(
+    items: Iterable[T],
+    handler: Callable[[T], Any],
+    key: Callable[[T], Hashable],
+    max_workers: int = 1,
+    fatal: Tuple[Type[Exception], ...] = (),
+) -> List[Tuple[int, Exception]]:
+    """
+    Run handler over items on at most max_workers threads.
+    Items with the same key run one after another in their original order, and
+    once one of them fails the rest of that key is skipped so a later change is
+    never applied before an earlier one. Different keys run concurrently. With a
+    single worker everything runs in the original order on the calling thread.
+
+    Returns (index, exception) for every item that did not complete, ordered by
+    index so error reporting does not depend on thread scheduling. Skipped items
+    carry the exception of the item that failed before them. An exception of one
+    of the fatal types stops all work and is raised once running items finish.
+    """
+
+    stop = threading.Event()
+    fatal_errors: List[Tuple[int, Exception]] = []
+
+    def run_group(group: List[Tuple[int, T]]) -> List[Tuple[int, Exception]]:
+        for position, (index, item) in enumerate(group):
+            if stop.is_set():
+                return []
+            try:
+                handler(item)
+            except fatal as ex:
+                fatal_errors.append((index, ex))
+                stop.set()
+                return []
+            except Exception as ex:
+                return [(i, ex) for i, _ in group[position:]]
+        return []
+
+    if max_workers <= 1:
+        results = [_run_in_order(items, handler, key, fatal)]
+    else:
+        groups = partition_by_key(items, key)
+        workers = max(1, min(max_workers, len(groups)))
+        with ThreadPoolExecutor(workers, thread_name_prefix="stream") as executor:
+            results = list(executor.map(run_group, groups))
+
+    if fatal_errors:
+        raise min(fatal_errors, key=_index)[1]
+
+    return sorted((failure for result in results for failure in result), key=_index)
+
+
+def _run_in_order(
+    items: Iterable[T],
+    handler: Callable[[T], Any],
+    key: Callable[[T], Hashable],
+    fatal: Tuple[Type[Exception], ...],
+) -> List[Tuple[int, Exception]]:
+    failures = []
+    failed_keys: Dict[Hashable, Exception] = {}
+    for index, item in enumerate(items):
+        item_key = key(item)
+        if item_key in failed_keys:
+            failures.append((index, failed_keys[item_key]))
+            continue
+        try:
+            handler(item)
+        except fatal:
+            raise
+        except Exception as ex:
+            failures.append((index, ex))
+            failed_keys[item_key] = ex
+    return failures
+
+
+def _index(failure: Tuple[int, Exception]) -> int:
+    return failure[0]
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+EVENT_TYPES = ("INSERT", "MODIFY", "REMOVE")
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    The static routing declaration of one processor class.
+    None means the processor does not filter on that attribute.
+    """
+
+    position: int
+    pk_prefixes: Optional[Tuple[str, ...]] = None
+    sk_prefixes: Optional[Tuple[str, ...]] = None
+    fields: Optional[Tuple[str, ...]] = None
+
+    def matches(self, change) -> bool:
+        if self.pk_prefixes and not (change.pk or "").startswith(self.pk_prefixes):
+            return False
+        if self.sk_prefixes and not (change.sk or "").startswith(self.sk_prefixes):
+            return False
+        if self.fields and not change.get_changed_fields(change, self.fields):
+            return False
+        return True
+
+
+class RoutingIndex:
+    """
+    Maps a change to the processors that declared an interest in it.
+
+    Processor classes declare what they care about with class attributes:
+
+        event_types = ("INSERT", "MODIFY")
+        pk_prefix = "ORDER#"          # or a tuple of prefixes
+        sk_prefix = ("ITEM#", "FEE#")
+        watch_fields = ("status", "payment.amount")
+
+    Routes are bucketed by event type once, so for each record only the routes
+    of its event type are checked, with a single str.startswith per key.
+    route returns positions into the processor_classes the index was built for.
+    """
+
+    def __init__(self, processor_classes: Iterable[Type]):
+        self._routes: Dict[str, List[Route]] = {name: [] for name in EVENT_TYPES}
+        self._unknown: List[Route] = []
+
+        for position, cls in enumerate(processor_classes):
+            route = Route(
+                position,
+                _as_tuple(getattr(cls, "pk_prefix", None)),
+                _as_tuple(getattr(cls, "sk_prefix", None)),
+                _as_tuple(getattr(cls, "watch_fields", None)),
+            )
+            event_types = _as_tuple(getattr(cls, "event_types", None))
+            for name in event_types or EVENT_TYPES:
+                self._routes.setdefault(name, []).append(route)
+            if not event_types:
+                self._unknown.append(route)
+
+    def route(self, change) -> List[int]:
+        routes = self._routes.get(change.event, self._unknown)
+        return [route.position for route in routes if route.matches(change)]
+
+
+@lru_cache(maxsize=32)
+def routing_index(processor_classes: Tuple[Type, ...]) -> RoutingIndex:
+    """
+    Routing only depends on class attributes, so the index is built once per
+    distinct tuple of processor classes and shared.
+    """
+
+    return RoutingIndex(processor_classes)
+
+
+def _as_tuple(value) -> Optional[Tuple[str, ...]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
@@ -0,0 +1,665 @@
+"""
+A small interpreter for DynamoDB expressions, used by InMemoryTable.
+
+Supports condition, filter and key condition expressions (comparisons,
+BETWEEN, IN, AND/OR/NOT, attribute_exists, attribute_not_exists,
+attribute_type, begins_with, contains and size), update expressions (SET with
++, -, if_not_exists and list_append, REMOVE, ADD and DELETE) and projection
+expressions, with #name and :value placeholders and nested paths.
+"""
+
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+
+MISSING = object()
+
+Path = Tuple[Union[str, int], ...]
+Operand = Callable[[dict, dict], Any]
+Predicate = Callable[[dict, dict], bool]
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<name>#[A-Za-z0-9_]+)|(?P<value>:[A-Za-z0-9_]+)|(?P<number>\d+)"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_]*)|(?P<op><>|<=|>=|[=<>()\[\],.+-]))"
+)
+_COMPARATORS = ("=", "<>", "<", "<=", ">", ">=")
+_CONDITION_FUNCTIONS = (
+    "attribute_exists",
+    "attribute_not_exists",
+    "attribute_type",
+    "begins_with",
+    "contains",
+)
+_UPDATE_CLAUSES = ("SET", "REMOVE", "ADD", "DELETE")
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Condition:
+    text: str
+    tree: tuple
+    evaluate: Predicate = field(repr=False, compare=False)
+    names: FrozenSet[str] = frozenset()
+    values: FrozenSet[str] = frozenset()
+
+
+@dataclass(frozen=True)
+class Update:
+    text: str
+    actions: Tuple[tuple, ...]
+    names: FrozenSet[str] = frozenset()
+    values: FrozenSet[str] = frozenset()
+
+    def apply(self, item: dict, values: dict) -> Tuple[dict, List[str]]:
+        """
+        The updated copy of item and the top-level attributes that changed.
+        Every operand is read from item as it was before the update.
+        """
+
+        updated = dict(item)
+        computed = []
+        for action, path, operand in self.actions:
+            value = operand(item, values) if operand else None
+            if value is MISSING:
+                raise ExpressionError(
+                    "The provided expression refers to an attribute that does not "
+                    "exist in the item"
+                )
+            computed.append((action, path, value))
+
+        for action, path, value in computed:
+            updated = _APPLY[action](updated, path, value)
+
+        changed = []
+        for _, path, _ in self.actions:
+            if path[0] not in changed:
+                changed.append(path[0])
+        return updated, changed
+
+
+@dataclass(frozen=True)
+class Projection:
+    text: str
+    paths: Tuple[Path, ...]
+    names: FrozenSet[str] = frozenset()
+
+    def apply(self, item: dict) -> dict:
+        projected = {}
+        for path in self.paths:
+            value = resolve(item, path)
+            if value is not MISSING:
+                _place(projected, path, value)
+        return _lists(projected)
+
+
+@lru_cache(maxsize=512)
+def _parse_condition(text: str, names: Tuple[Tuple[str, str], ...]) -> Condition:
+    parser = _Parser(text, dict(names))
+    tree = parser.condition()
+    parser.end()
+    return Condition(
+        text, tree, _compile(tree), frozenset(parser.names), frozenset(parser.values)
+    )
+
+
+@lru_cache(maxsize=512)
+def _parse_update(text: str, names: Tuple[Tuple[str, str], ...]) -> Update:
+    parser = _Parser(text, dict(names))
+    actions = parser.update()
+    parser.end()
+    _check_overlaps([path for _, path, _ in actions])
+    return Update(
+        text, tuple(actions), frozenset(parser.names), frozenset(parser.values)
+    )
+
+
+@lru_cache(maxsize=512)
+def _parse_projection(text: str, names: Tuple[Tuple[str, str], ...]) -> Projection:
+    parser = _Parser(text, dict(names))
+    paths = [parser.path()]
+    while parser.accept(","):
+        paths.append(parser.path())
+    parser.end()
+    _check_overlaps(paths)
+    return Projection(text, tuple(paths), frozenset(parser.names))
+
+
+def parse_condition(text: str, names: Optional[Dict[str, str]] = None) -> Condition:
+    return _parse_condition(text, _freeze(names))
+
+
+def parse_update(text: str, names: Optional[Dict[str, str]] = None) -> Update:
+    return _parse_update(text, _freeze(names))
+
+
+def parse_projection(text: str, names: Optional[Dict[str, str]] = None) -> Projection:
+    return _parse_projection(text, _freeze(names))
+
+
+def resolve(item: Any, path: Path) -> Any:
+    value = item
+    for segment in path:
+        if isinstance(segment, int):
+            if not isinstance(value, list) or segment >= len(value):
+                return MISSING
+        elif not isinstance(value, dict) or segment not in value:
+            return MISSING
+        value = value[segment]
+    return value
+
+
+def type_of(value: Any) -> str:
+    """The DynamoDB type descriptor (S, N, BOOL, M, SS, ...) of a python value."""
+
+    if isinstance(value, bool):
+        return "BOOL"
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "S"
+    if isinstance(value, (int, Decimal, float)):
+        return "N"
+    if isinstance(value, (bytes, bytearray)) or hasattr(value, "value"):
+        return "B"
+    if isinstance(value, dict):
+        return "M"
+    if isinstance(value, (list, tuple)):
+        return "L"
+    if isinstance(value, (set, frozenset)) and value:
+        return type_of(next(iter(value))) + "S"
+    raise ExpressionError(f"Unsupported type {value.__class__.__name__}")
+
+
+class _Parser:
+    def __init__(self, text: str, names: Dict[str, str]):
+        self.text = text
+        self.names_map = names
+        self.names = set()
+        self.values = set()
+        self.tokens = self._tokenize(text)
+        self.position = 0
+
+    def condition(self) -> tuple:
+        left = self._and()
+        while self.accept_word("OR"):
+            left = ("or", left, self._and())
+        return left
+
+    def update(self) -> List[tuple]:
+        actions = []
+        while self.peek() is not None:
+            clause = self.word().upper()
+            if clause not in _UPDATE_CLAUSES:
+                raise self.error(f"Unexpected {clause}")
+            while True:
+                actions.append(self._update_action(clause))
+                if not self.accept(","):
+                    break
+        if not actions:
+            raise self.error("Empty update expression")
+        return actions
+
+    def path(self) -> Path:
+        segments = [self._path_element()]
+        while True:
+            if self.accept("."):
+                segments.append(self._path_element())
+            elif self.accept("["):
+                kind, token = self.take()
+                if kind != "number":
+                    raise self.error("Expected a list index")
+                segments.append(int(token))
+                self.expect("]")
+            else:
+                return tuple(segments)
+
+    def end(self):
+        if self.peek() is not None:
+            raise self.error(f"Unexpected {self.peek()[1]}")
+
+    def peek(self, offset: int = 0) -> Optional[Tuple[str, str]]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise self.error("Unexpected end of expression")
+        self.position += 1
+        return token
+
+    def accept(self, op: str) -> bool:
+        if self.peek() == ("op", op):
+            self.position += 1
+            return True
+        return False
+
+    def accept_word(self, word: str) -> bool:
+        token = self.peek()
+        if token and token[0] == "word" and token[1].upper() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, op: str):
+        if not self.accept(op):
+            raise self.error(f"Expected {op}")
+
+    def word(self) -> str:
+        kind, token = self.take()
+        if kind != "word":
+            raise self.error(f"Unexpected {token}")
+        return token
+
+    def error(self, message: str) -> ExpressionError:
+        return ExpressionError(f"Invalid expression {self.text!r}: {message}")
+
+    def _tokenize(self, text: str) -> List[Tuple[str, str]]:
+        tokens, position, text = [], 0, text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise ExpressionError(
+                    f"Invalid expression {text!r}: syntax error at {position}"
+                )
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        return tokens
+
+    def _and(self) -> tuple:
+        left = self._not()
+        while self.accept_word("AND"):
+            left = ("and", left, self._not())
+        return left
+
+    def _not(self) -> tuple:
+        if self.accept_word("NOT"):
+            return ("not", self._not())
+        return self._primary()
+
+    def _primary(self) -> tuple:
+        if self.accept("("):
+            inner = self.condition()
+            self.expect(")")
+            return inner
+
+        token, following = self.peek(), self.peek(1)
+        if (
+            token
+            and token[0] == "word"
+            and token[1] in _CONDITION_FUNCTIONS
+            and following == ("op", "(")
+        ):
+            name = self.word()
+            return ("function", name, tuple(self._arguments()))
+
+        left = self._operand()
+        token = self.peek()
+        if token and token[0] == "op" and token[1] in _COMPARATORS:
+            self.take()
+            return ("compare", token[1], left, self._operand())
+        if self.accept_word("BETWEEN"):
+            low = self._operand()
+            if not self.accept_word("AND"):
+                raise self.error("Expected AND in BETWEEN")
+            return ("between", left, low, self._operand())
+        if self.accept_word("IN"):
+            return ("in", left, tuple(self._arguments()))
+        raise self.error("Expected a comparison")
+
+    def _arguments(self) -> List[tuple]:
+        self.expect("(")
+        arguments = [self._operand()]
+        while self.accept(","):
+            arguments.append(self._operand())
+        self.expect(")")
+        return arguments
+
+    def _operand(self) -> tuple:
+        token, following = self.peek(), self.peek(1)
+        if token and token[0] == "value":
+            self.take()
+            self.values.add(token[1])
+            return ("value", token[1])
+        if token == ("word", "size") and following == ("op", "("):
+            self.take()
+            self.expect("(")
+            path = self.path()
+            self.expect(")")
+            return ("size", path)
+        return ("path", self.path())
+
+    def _update_action(self, clause: str) -> tuple:
+        path = self.path()
+        if clause == "REMOVE":
+            return ("remove", path, None)
+        if clause == "SET":
+            self.expect("=")
+            return ("set", path, _compile_operand(self._set_value()))
+
+        token = self.take()
+        if token[0] != "value":
+            raise self.error(f"{clause} takes a :value")
+        self.values.add(token[1])
+        return (clause.lower(), path, _compile_operand(("value", token[1])))
+
+    def _set_value(self) -> tuple:
+        left = self._set_operand()
+        if self.accept("+"):
+            return ("plus", left, self._set_operand())
+        if self.accept("-"):
+            return ("minus", left, self._set_operand())
+        return left
+
+    def _set_operand(self) -> tuple:
+        token, following = self.peek(), self.peek(1)
+        if token and token[0] == "word" and following == ("op", "("):
+            name = self.word()
+            self.expect("(")
+            if name == "if_not_exists":
+                path = self.path()
+                self.expect(",")
+                default = self._set_value()
+                self.expect(")")
+                return ("if_not_exists", path, default)
+            if name == "list_append":
+                first = self._set_value()
+                self.expect(",")
+                second = self._set_value()
+                self.expect(")")
+                return ("list_append", first, second)
+            raise self.error(f"Unknown function {name}")
+        return self._operand()
+
+    def _path_element(self) -> str:
+        kind, token = self.take()
+        if kind == "word":
+            return token
+        if kind == "name":
+            if token not in self.names_map:
+                raise ExpressionError(
+                    f"An expression attribute name used in the document path is "
+                    f"not defined; attribute name: {token}"
+                )
+            self.names.add(token)
+            return self.names_map[token]
+        raise self.error(f"Unexpected {token}")
+
+
+def _compile(tree: tuple) -> Predicate:
+    kind = tree[0]
+    if kind == "and":
+        left, right = _compile(tree[1]), _compile(tree[2])
+        return lambda item, values: left(item, values) and right(item, values)
+    if kind == "or":
+        left, right = _compile(tree[1]), _compile(tree[2])
+        return lambda item, values: left(item, values) or right(item, values)
+    if kind == "not":
+        inner = _compile(tree[1])
+        return lambda item, values: not inner(item, values)
+    if kind == "compare":
+        op, left, right = tree[1], _compile_operand(tree[2]), _compile_operand(tree[3])
+        return lambda item, values: _compare(
+            op, left(item, values), right(item, values)
+        )
+    if kind == "between":
+        value, low, high = map(_compile_operand, tree[1:])
+
+        def between(item, values):
+            v = value(item, values)
+            return _compare(">=", v, low(item, values)) and _compare(
+                "<=", v, high(item, values)
+            )
+
+        return between
+    if kind == "in":
+        value = _compile_operand(tree[1])
+        options = [_compile_operand(option) for option in tree[2]]
+        return lambda item, values: any(
+            _compare("=", value(item, values), option(item, values))
+            for option in options
+        )
+    return _compile_function(tree[1], [_compile_operand(arg) for arg in tree[2]])
+
+
+def _compile_function(name: str, arguments: List[Operand]) -> Predicate:
+    def arity(count):
+        if len(arguments) != count:
+            raise ExpressionError(f"{name} takes {count} arguments")
+
+    if name in ("attribute_exists", "attribute_not_exists"):
+        arity(1)
+        (path,) = arguments
+        exists = name == "attribute_exists"
+        return lambda item, values: (path(item, values) is not MISSING) == exists
+
+    arity(2)
+    first, second = arguments
+    if name == "attribute_type":
+        return lambda item, values: _is_type(first(item, values), second(item, values))
+    if name == "begins_with":
+        return lambda item, values: _begins_with(
+            first(item, values), second(item, values)
+        )
+    return lambda item, values: _contains(first(item, values), second(item, values))
+
+
+def _compile_operand(tree: tuple) -> Operand:
+    kind = tree[0]
+    if kind == "value":
+        name = tree[1]
+
+        def value(item, values):
+            if name not in values:
+                raise ExpressionError(
+                    f"An expression attribute value used in expression is not "
+                    f"defined; attribute value: {name}"
+                )
+            return values[name]
+
+        return value
+    if kind == "path":
+        path = tree[1]
+        return lambda item, values: resolve(item, path)
+    if kind == "size":
+        path = tree[1]
+        return lambda item, values: _size(resolve(item, path))
+    if kind == "if_not_exists":
+        path, default = tree[1], _compile_operand(tree[2])
+
+        def if_not_exists(item, values):
+            current = resolve(item, path)
+            return default(item, values) if current is MISSING else current
+
+        return if_not_exists
+    if kind == "list_append":
+        first, second = _compile_operand(tree[1]), _compile_operand(tree[2])
+
+        def list_append(item, values):
+            a, b = first(item, values), second(item, values)
+            if not isinstance(a, list) or not isinstance(b, list):
+                raise ExpressionError("list_append takes two lists")
+            return a + b
+
+        return list_append
+
+    left, right = _compile_operand(tree[1]), _compile_operand(tree[2])
+    sign = 1 if kind == "plus" else -1
+
+    def arithmetic(item, values):
+        a, b = left(item, values), right(item, values)
+        if type_of(a) != "N" or type_of(b) != "N":
+            raise ExpressionError(
+                "An operand in the update expression has an incorrect data type"
+            )
+        return Decimal(a) + sign * Decimal(b)
+
+    return arithmetic
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    if a is MISSING or b is MISSING:
+        return op == "<>"
+
+    same_type = type_of(a) == type_of(b)
+    if op == "=":
+        return same_type and a == b
+    if op == "<>":
+        return not same_type or a != b
+    if not same_type or type_of(a) not in ("S", "N", "B"):
+        return False
+    if op == "<":
+        return a < b
+    if op == "<=":
+        return a <= b
+    if op == ">":
+        return a > b
+    return a >= b
+
+
+def _is_type(value: Any, expected: Any) -> bool:
+    return value is not MISSING and type_of(value) == expected
+
+
+def _begins_with(value: Any, prefix: Any) -> bool:
+    if isinstance(value, str) and isinstance(prefix, str):
+        return value.startswith(prefix)
+    if isinstance(value, (bytes, bytearray)) and isinstance(prefix, (bytes, bytearray)):
+        return value.startswith(prefix)
+    return False
+
+
+def _contains(value: Any, operand: Any) -> bool:
+    if isinstance(value, str):
+        return isinstance(operand, str) and operand in value
+    if isinstance(value, (set, frozenset, list)):
+        return any(_compare("=", element, operand) for element in value)
+    return False
+
+
+def _size(value: Any) -> Any:
+    if value is MISSING:
+        return MISSING
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, bytearray, dict, list, set, frozenset)):
+        return len(value)
+    return MISSING
+
+
+def _set(item: dict, path: Path, value: Any) -> dict:
+    return _write(item, path, lambda container, key: _store(container, key, value))
+
+
+def _remove(item: dict, path: Path, _=None) -> dict:
+    def remove(container, key):
+        if isinstance(container, dict):
+            container.pop(key, None)
+        elif isinstance(key, int) and key < len(container):
+            del container[key]
+
+    return _write(item, path, remove, create=False)
+
+
+def _add(item: dict, path: Path, value: Any) -> dict:
+    current = resolve(item, path)
+    if current is MISSING:
+        updated = value
+    elif type_of(current) == "N" and type_of(value) == "N":
+        updated = Decimal(current) + Decimal(value)
+    elif type_of(current) == type_of(value) and type_of(value).endswith("S"):
+        updated = set(current) | set(value)
+    else:
+        raise ExpressionError(
+            "An operand in the update expression has an incorrect data type"
+        )
+    return _set(item, path, updated)
+
+
+def _delete(item: dict, path: Path, value: Any) -> dict:
+    current = resolve(item, path)
+    if current is MISSING:
+        return item
+    if not isinstance(current, (set, frozenset)) or type_of(current) != type_of(value):
+        raise ExpressionError(
+            "An operand in the update expression has an incorrect data type"
+        )
+    remaining = set(current) - set(value)
+    return _set(item, path, remaining) if remaining else _remove(item, path)
+
+
+_APPLY = {"set": _set, "remove": _remove, "add": _add, "delete": _delete}
+
+
+def _write(item: dict, path: Path, action, create: bool = True) -> dict:
+    # Copies the containers along path, so the original item is left untouched.
+    updated = dict(item)
+    container = updated
+    for segment in path[:-1]:
+        child = resolve(container, (segment,))
+        if child is MISSING or not isinstance(child, (dict, list)):
+            if not create:
+                return updated
+            raise ExpressionError(
+                "The document path provided in the update expression is invalid "
+                "for update"
+            )
+        child = dict(child) if isinstance(child, dict) else list(child)
+        container[segment] = child
+        container = child
+    action(container, path[-1])
+    return updated
+
+
+def _store(container: Any, key: Union[str, int], value: Any):
+    if isinstance(container, list):
+        if not isinstance(key, int):
+            raise ExpressionError("The document path provided is invalid for update")
+        if key >= len(container):
+            container.append(value)
+        else:
+            container[key] = value
+    elif isinstance(key, int):
+        raise ExpressionError("The document path provided is invalid for update")
+    else:
+        container[key] = value
+
+
+def _check_overlaps(paths: List[Path]):
+    for index, path in enumerate(paths):
+        for other in paths[index + 1 :]:
+            shorter = min(len(path), len(other))
+            if path[:shorter] == other[:shorter]:
+                raise ExpressionError(
+                    f"Two document paths overlap with each other: {path}, {other}"
+                )
+
+
+class _Indexed(dict):
+    """A list being projected, keyed by the original index."""
+
+
+def _place(target: dict, path: Path, value: Any):
+    container = target
+    for segment, following in zip(path, path[1:]):
+        if segment not in container:
+            container[segment] = _Indexed() if isinstance(following, int) else {}
+        container = container[segment]
+    container[path[-1]] = value
+
+
+def _lists(value: Any) -> Any:
+    if isinstance(value, _Indexed):
+        return [_lists(value[index]) for index in sorted(value)]
+    if isinstance(value, dict):
+        return {name: _lists(child) for name, child in value.items()}
+    return value
+
+
+def _freeze(names: Optional[Dict[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((names or {}).items()))
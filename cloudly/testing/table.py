@@ -0,0 +1,716 @@
+import math
+import random
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cloudly.testing.expressions import (
+    ExpressionError,
+    parse_condition,
+    parse_projection,
+    parse_update,
+    type_of,
+)
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # botocore is only needed to talk to AWS
+
+    class ClientError(Exception):
+        """The shape of botocore's ClientError, for code that reads .response."""
+
+        def __init__(self, error_response: dict, operation_name: str):
+            self.response = error_response
+            self.operation_name = operation_name
+            error = error_response.get("Error", {})
+            super().__init__(
+                f"An error occurred ({error.get('Code')}) when calling the "
+                f"{operation_name} operation: {error.get('Message')}"
+            )
+
+
+Latency = Callable[[], float]
+
+MAX_ITEM_BYTES = 400 * 1024
+MAX_BATCH_GET = 100
+MAX_BATCH_WRITE = 25
+PAGE_BYTES = 1024 * 1024
+
+
+def fixed_latency(milliseconds: float) -> Latency:
+    seconds = milliseconds / 1000
+    return lambda: seconds
+
+
+def uniform_latency(low_ms: float, high_ms: float, seed: int = None) -> Latency:
+    rng = random.Random(seed)
+    return lambda: rng.uniform(low_ms, high_ms) / 1000
+
+
+def lognormal_latency(median_ms: float, p99_ms: float, seed: int = None) -> Latency:
+    """
+    A long tailed latency with the given median and 99th percentile, which is a
+    good fit for measured DynamoDB round trips.
+    """
+
+    rng = random.Random(seed)
+    mu = math.log(median_ms)
+    sigma = math.log(p99_ms / median_ms) / 2.326
+    return lambda: rng.lognormvariate(mu, sigma) / 1000
+
+
+def sampled_latency(samples_ms: Sequence[float], seed: int = None) -> Latency:
+    """Replay latencies measured against a real table, in random order."""
+
+    rng = random.Random(seed)
+    return lambda: rng.choice(samples_ms) / 1000
+
+
+class InMemoryTable:
+    """
+    A stand-in for a boto3 DynamoDB Table resource that keeps items in memory.
+
+    It implements get_item, put_item, update_item, delete_item, query,
+    batch_get_item and batch_write_item with condition, update, key condition,
+    filter and projection expressions (see cloudly.testing.expressions), and
+    fails the way DynamoDB does: errors are ClientErrors whose response carries
+    the DynamoDB error code, so cloudly.db.errors works with them. Key
+    conditions and expressions must be strings, boto3 condition objects are not
+    supported, and there are no secondary indexes.
+
+    To test I/O patterns under realistic conditions:
+
+    latency: called once per request for the seconds to sleep, see
+    fixed_latency, uniform_latency, lognormal_latency and sampled_latency.
+
+    partition_read_capacity, partition_write_capacity: read and write capacity
+    units per second each partition key may consume. Beyond that, single item
+    calls and queries raise ProvisionedThroughputExceededException and batch
+    calls return the affected keys as unprocessed.
+
+    unprocessed_rate: the chance that any key of a batch call is returned as
+    unprocessed, to exercise retry paths.
+
+    Consumed read and write capacity units are counted per operation in
+    consumed_read and consumed_write, using DynamoDB's rounding (4KB per read
+    unit, halved for eventually consistent reads, and 1KB per write unit).
+    Calls are counted in calls.
+    """
+
+    def __init__(
+        self,
+        name: str = "table",
+        latency: Optional[Latency] = None,
+        key_fields: Tuple[str, ...] = ("pk", "sk"),
+        partition_read_capacity: float = None,
+        partition_write_capacity: float = None,
+        unprocessed_rate: float = 0.0,
+        seed: int = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.latency = latency
+        self.key_fields = key_fields
+        self.partition_read_capacity = partition_read_capacity
+        self.partition_write_capacity = partition_write_capacity
+        self.unprocessed_rate = unprocessed_rate
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._partitions: Dict[Any, Dict[Any, dict]] = {}
+        self._buckets: Dict[Tuple[str, Any], List[float]] = {}
+        self._lock = threading.RLock()
+        self.reset_stats()
+
+    @property
+    def table_name(self) -> str:
+        return self.name
+
+    @property
+    def items(self) -> Dict[tuple, dict]:
+        """Every item by key tuple, for assertions."""
+
+        with self._lock:
+            return {
+                self._key(item): item
+                for partition in self._partitions.values()
+                for item in partition.values()
+            }
+
+    def load(self, items: Iterable[dict]):
+        """Store items directly, without latency, capacity or call counting."""
+
+        with self._lock:
+            for item in items:
+                self._store(_copy(item))
+
+    def reset_stats(self):
+        self.calls: Dict[str, int] = {}
+        self.consumed_read: Dict[str, float] = {}
+        self.consumed_write: Dict[str, float] = {}
+        self.throttled = 0
+        self.unprocessed = 0
+
+    @property
+    def total_read_units(self) -> float:
+        return sum(self.consumed_read.values())
+
+    @property
+    def total_write_units(self) -> float:
+        return sum(self.consumed_write.values())
+
+    def get_item(
+        self,
+        Key: dict,
+        ProjectionExpression: str = None,
+        ExpressionAttributeNames: dict = None,
+        ConsistentRead: bool = False,
+        ReturnConsumedCapacity: str = "NONE",
+    ) -> dict:
+        operation = "GetItem"
+        self._call("get_item")
+        with self._validation(operation):
+            key = self._check_key(Key)
+            projection = self._projection(
+                ProjectionExpression, ExpressionAttributeNames
+            )
+            _check_unused(ExpressionAttributeNames, None, [projection])
+
+        with self._lock:
+            self._throttle("read", key[0], operation)
+            item = self._get(key)
+            units = _read_units(_item_size(item) if item else 0, ConsistentRead)
+            self._consume("read", "get_item", key[0], units)
+
+        response = {}
+        if item is not None:
+            response["Item"] = _copy(projection.apply(item) if projection else item)
+        return self._with_capacity(response, ReturnConsumedCapacity, read=units)
+
+    def put_item(
+        self,
+        Item: dict,
+        ConditionExpression: str = None,
+        ExpressionAttributeNames: dict = None,
+        ExpressionAttributeValues: dict = None,
+        ReturnValues: str = "NONE",
+        ReturnValuesOnConditionCheckFailure: str = "NONE",
+        ReturnConsumedCapacity: str = "NONE",
+    ) -> dict:
+        operation = "PutItem"
+        self._call("put_item")
+        item = _copy(Item)
+        values = _copy(ExpressionAttributeValues or {})
+        with self._validation(operation):
+            key = self._check_key(item)
+            _check_size(item)
+            condition = self._condition(ConditionExpression, ExpressionAttributeNames)
+            _check_unused(ExpressionAttributeNames, values, [condition])
+
+        with self._lock:
+            self._throttle("write", key[0], operation)
+            old = self._get(key)
+            units = _write_units(max(_item_size(item), _item_size(old or {})))
+            self._consume("write", "put_item", key[0], units)
+            self._check_condition(
+                condition, old, values, operation, ReturnValuesOnConditionCheckFailure
+            )
+            self._store(item)
+
+        response = {}
+        if ReturnValues == "ALL_OLD" and old is not None:
+            response["Attributes"] = _copy(old)
+        return self._with_capacity(response, ReturnConsumedCapacity, write=units)
+
+    def update_item(
+        self,
+        Key: dict,
+        UpdateExpression: str = None,
+        ConditionExpression: str = None,
+        ExpressionAttributeNames: dict = None,
+        ExpressionAttributeValues: dict = None,
+        ReturnValues: str = "NONE",
+        ReturnValuesOnConditionCheckFailure: str = "NONE",
+        ReturnConsumedCapacity: str = "NONE",
+    ) -> dict:
+        operation = "UpdateItem"
+        self._call("update_item")
+        values = _copy(ExpressionAttributeValues or {})
+        with self._validation(operation):
+            key = self._check_key(Key)
+            update = parse_update(UpdateExpression, ExpressionAttributeNames)
+            condition = self._condition(ConditionExpression, ExpressionAttributeNames)
+            _check_unused(ExpressionAttributeNames, values, [update, condition])
+            updated_keys = set(self.key_fields).intersection(
+                path[0] for _, path, _ in update.actions
+            )
+            if updated_keys:
+                raise ExpressionError(
+                    f"Cannot update attribute {updated_keys.pop()}. This attribute "
+                    f"is part of the key"
+                )
+
+        with self._lock:
+            self._throttle("write", key[0], operation)
+            old = self._get(key)
+            current = old if old is not None else self._key_item(Key)
+            with self._validation(operation):
+                new, changed = update.apply(current, values)
+                _check_size(new)
+            units = _write_units(max(_item_size(new), _item_size(old or {})))
+            self._consume("write", "update_item", key[0], units)
+            self._check_condition(
+                condition, old, values, operation, ReturnValuesOnConditionCheckFailure
+            )
+            self._store(new)
+
+        response = {}
+        attributes = _return_values(ReturnValues, old, new, changed)
+        if attributes is not None:
+            response["Attributes"] = _copy(attributes)
+        return self._with_capacity(response, ReturnConsumedCapacity, write=units)
+
+    def delete_item(
+        self,
+        Key: dict,
+        ConditionExpression: str = None,
+        ExpressionAttributeNames: dict = None,
+        ExpressionAttributeValues: dict = None,
+        ReturnValues: str = "NONE",
+        ReturnValuesOnConditionCheckFailure: str = "NONE",
+        ReturnConsumedCapacity: str = "NONE",
+    ) -> dict:
+        operation = "DeleteItem"
+        self._call("delete_item")
+        values = _copy(ExpressionAttributeValues or {})
+        with self._validation(operation):
+            key = self._check_key(Key)
+            condition = self._condition(ConditionExpression, ExpressionAttributeNames)
+            _check_unused(ExpressionAttributeNames, values, [condition])
+
+        with self._lock:
+            self._throttle("write", key[0], operation)
+            old = self._get(key)
+            units = _write_units(_item_size(old or {}))
+            self._consume("write", "delete_item", key[0], units)
+            self._check_condition(
+                condition, old, values, operation, ReturnValuesOnConditionCheckFailure
+            )
+            self._partitions.get(key[0], {}).pop(key[1], None)
+
+        response = {}
+        if ReturnValues == "ALL_OLD" and old is not None:
+            response["Attributes"] = _copy(old)
+        return self._with_capacity(response, ReturnConsumedCapacity, write=units)
+
+    def query(
+        self,
+        KeyConditionExpression: str,
+        ExpressionAttributeValues: dict,
+        ExpressionAttributeNames: dict = None,
+        FilterExpression: str = None,
+        ProjectionExpression: str = None,
+        ExclusiveStartKey: dict = None,
+        Limit: int = None,
+        ScanIndexForward: bool = True,
+        ConsistentRead: bool = False,
+        Select: str = None,
+        IndexName: str = None,
+        ReturnConsumedCapacity: str = "NONE",
+    ) -> dict:
+        operation = "Query"
+        self._call("query")
+        names, values = ExpressionAttributeNames, _copy(ExpressionAttributeValues)
+        with self._validation(operation):
+            if IndexName:
+                raise ExpressionError("InMemoryTable has no secondary indexes")
+            key_condition = parse_condition(KeyConditionExpression, names)
+            pk = self._partition_key(key_condition, values)
+            row_filter = self._condition(FilterExpression, names)
+            projection = self._projection(ProjectionExpression, names)
+            _check_unused(names, values, [key_condition, row_filter, projection])
+
+        with self._lock:
+            self._throttle("read", pk, operation)
+            partition = self._partitions.get(pk, {})
+            matching = [
+                partition[sk]
+                for sk in sorted(partition, key=_sort_key, reverse=not ScanIndexForward)
+                if key_condition.evaluate(partition[sk], values)
+            ]
+            if ExclusiveStartKey:
+                start = self._key(ExclusiveStartKey)
+                position = next(
+                    (i for i, item in enumerate(matching) if self._key(item) == start),
+                    None,
+                )
+                matching = matching[position + 1 :] if position is not None else []
+
+            evaluated, size = [], 0
+            for item in matching:
+                evaluated.append(item)
+                size += _item_size(item)
+                if len(evaluated) == Limit or size >= PAGE_BYTES:
+                    break
+
+            units = _read_units(size, ConsistentRead)
+            self._consume("read", "query", pk, units)
+            items = [
+                item
+                for item in evaluated
+                if row_filter is None or row_filter.evaluate(item, values)
+            ]
+
+        response = {"Count": len(items), "ScannedCount": len(evaluated)}
+        if Select != "COUNT":
+            response["Items"] = [
+                _copy(projection.apply(item) if projection else item) for item in items
+            ]
+        if len(evaluated) < len(matching):
+            last = evaluated[-1]
+            response["LastEvaluatedKey"] = {f: last[f] for f in self.key_fields}
+        return self._with_capacity(response, ReturnConsumedCapacity, read=units)
+
+    def batch_get_item(
+        self, RequestItems: dict, ReturnConsumedCapacity: str = "NONE"
+    ) -> dict:
+        operation = "BatchGetItem"
+        self._call("batch_get_item")
+        request = self._batch_request(RequestItems, operation)
+        keys = request.get("Keys", [])
+        consistent = request.get("ConsistentRead", False)
+        with self._validation(operation):
+            if len(keys) > MAX_BATCH_GET:
+                raise ExpressionError(
+                    "Too many items requested for the BatchGetItem call"
+                )
+            key_tuples = [self._check_key(key) for key in keys]
+            if len(set(key_tuples)) < len(key_tuples):
+                raise ExpressionError("Provided list of item keys contains duplicates")
+            names = request.get("ExpressionAttributeNames")
+            projection = self._projection(request.get("ProjectionExpression"), names)
+            _check_unused(names, None, [projection])
+
+        found, unprocessed, units = [], [], 0
+        with self._lock:
+            for key, key_tuple in zip(keys, key_tuples):
+                if self._skip_in_batch("read", key_tuple[0]):
+                    unprocessed.append(key)
+                    continue
+                item = self._get(key_tuple)
+                item_units = _read_units(_item_size(item) if item else 0, consistent)
+                self._consume("read", "batch_get_item", key_tuple[0], item_units)
+                units += item_units
+                if item is not None:
+                    found.append(projection.apply(item) if projection else item)
+
+        response = {"Responses": {self.name: _copy(found)}, "UnprocessedKeys": {}}
+        if unprocessed:
+            response["UnprocessedKeys"][self.name] = {**request, "Keys": unprocessed}
+        return self._with_capacity(
+            response, ReturnConsumedCapacity, read=units, batch=True
+        )
+
+    def batch_write_item(
+        self, RequestItems: dict, ReturnConsumedCapacity: str = "NONE"
+    ) -> dict:
+        operation = "BatchWriteItem"
+        self._call("batch_write_item")
+        requests = self._batch_request(RequestItems, operation)
+        with self._validation(operation):
+            if len(requests) > MAX_BATCH_WRITE:
+                raise ExpressionError(
+                    "Too many items requested for the BatchWriteItem call"
+                )
+            writes = []
+            for request in requests:
+                if "PutRequest" in request:
+                    item = _copy(request["PutRequest"]["Item"])
+                    _check_size(item)
+                    writes.append((request, self._check_key(item), item))
+                else:
+                    key = request["DeleteRequest"]["Key"]
+                    writes.append((request, self._check_key(key), None))
+            keys = [key for _, key, _ in writes]
+            if len(set(keys)) < len(keys):
+                raise ExpressionError("Provided list of item keys contains duplicates")
+
+        unprocessed, units = [], 0
+        with self._lock:
+            for request, key, item in writes:
+                if self._skip_in_batch("write", key[0]):
+                    unprocessed.append(request)
+                    continue
+                old = self._get(key)
+                size = max(_item_size(item or {}), _item_size(old or {}))
+                self._consume("write", "batch_write_item", key[0], _write_units(size))
+                units += _write_units(size)
+                if item is not None:
+                    self._store(item)
+                else:
+                    self._partitions.get(key[0], {}).pop(key[1], None)
+
+        response = {"UnprocessedItems": {self.name: unprocessed} if unprocessed else {}}
+        return self._with_capacity(
+            response, ReturnConsumedCapacity, write=units, batch=True
+        )
+
+    def _call(self, operation: str):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency is not None:
+            time.sleep(self.latency())
+
+    def _key(self, item: dict) -> tuple:
+        return tuple(item.get(name) for name in self.key_fields)
+
+    def _key_item(self, key: dict) -> dict:
+        return {name: key[name] for name in self.key_fields}
+
+    def _check_key(self, key: dict) -> tuple:
+        values = self._key(key)
+        for name, value in zip(self.key_fields, values):
+            if value is None or type_of(value) not in ("S", "N", "B"):
+                raise ExpressionError(
+                    "The provided key element does not match the schema"
+                )
+            if value == "":
+                raise ExpressionError(
+                    f"One or more parameter values are not valid. The AttributeValue "
+                    f"for a key attribute cannot contain an empty string value. "
+                    f"Key: {name}"
+                )
+        return values if len(values) == 2 else (values[0], None)
+
+    def _get(self, key: tuple) -> Optional[dict]:
+        return self._partitions.get(key[0], {}).get(key[1])
+
+    def _store(self, item: dict):
+        pk = item[self.key_fields[0]]
+        sk = item[self.key_fields[1]] if len(self.key_fields) > 1 else None
+        self._partitions.setdefault(pk, {})[sk] = item
+
+    def _condition(self, expression: str, names: dict):
+        return parse_condition(expression, names) if expression else None
+
+    def _projection(self, expression: str, names: dict):
+        return parse_projection(expression, names) if expression else None
+
+    def _check_condition(
+        self, condition, item: dict, values: dict, operation: str, return_values: str
+    ):
+        if condition is None:
+            return
+        with self._validation(operation):
+            passed = condition.evaluate(item or {}, values)
+        if not passed:
+            error = _error(
+                "ConditionalCheckFailedException",
+                "The conditional request failed",
+                operation,
+            )
+            if return_values == "ALL_OLD" and item is not None:
+                error.response["Item"] = _copy(item)
+            raise error
+
+    def _partition_key(self, condition, values: dict) -> Any:
+        pk_name = self.key_fields[0]
+        for node in _conjuncts(condition.tree):
+            if (
+                node[0] == "compare"
+                and node[1] == "="
+                and node[2] == ("path", (pk_name,))
+                and node[3][0] == "value"
+            ):
+                return values[node[3][1]]
+        raise ExpressionError("Query condition missed key schema element")
+
+    def _batch_request(self, request_items: dict, operation: str):
+        unknown = set(request_items) - {self.name}
+        if unknown:
+            raise _error(
+                "ResourceNotFoundException",
+                f"Requested resource not found: Table: {unknown.pop()} not found",
+                operation,
+            )
+        return request_items.get(self.name, {})
+
+    def _throttle(self, kind: str, pk: Any, operation: str):
+        if not self._has_capacity(kind, pk):
+            self.throttled += 1
+            raise _error(
+                "ProvisionedThroughputExceededException",
+                "The level of configured provisioned throughput for the table was "
+                "exceeded.",
+                operation,
+            )
+
+    def _skip_in_batch(self, kind: str, pk: Any) -> bool:
+        skip = not self._has_capacity(kind, pk) or (
+            self.unprocessed_rate and self._random.random() < self.unprocessed_rate
+        )
+        if skip:
+            self.unprocessed += 1
+        return skip
+
+    def _has_capacity(self, kind: str, pk: Any) -> bool:
+        # Token bucket per partition, holding up to one second of capacity.
+        # A request may overdraw it, later requests wait for it to refill.
+        capacity = self._capacity(kind)
+        if capacity is None:
+            return True
+
+        now = self.clock()
+        tokens, updated = self._buckets.get((kind, pk), (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * capacity)
+        self._buckets[(kind, pk)] = [tokens, now]
+        return tokens > 0
+
+    def _consume(self, kind: str, operation: str, pk: Any, units: float):
+        consumed = self.consumed_read if kind == "read" else self.consumed_write
+        consumed[operation] = consumed.get(operation, 0) + units
+        if self._capacity(kind) is not None and (kind, pk) in self._buckets:
+            self._buckets[(kind, pk)][0] -= units
+
+    def _capacity(self, kind: str) -> Optional[float]:
+        if kind == "read":
+            return self.partition_read_capacity
+        return self.partition_write_capacity
+
+    def _with_capacity(
+        self,
+        response: dict,
+        mode: str,
+        read: float = 0,
+        write: float = 0,
+        batch: bool = False,
+    ) -> dict:
+        if mode in (None, "NONE"):
+            return response
+        capacity = {"TableName": self.name, "CapacityUnits": read + write}
+        if read:
+            capacity["ReadCapacityUnits"] = read
+        if write:
+            capacity["WriteCapacityUnits"] = write
+        response["ConsumedCapacity"] = [capacity] if batch else capacity
+        return response
+
+    def _validation(self, operation: str):
+        return _ValidationErrors(operation)
+
+
+class _ValidationErrors:
+    """Turns ExpressionErrors into ValidationException ClientErrors."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, ex, traceback):
+        if kind is not None and issubclass(kind, ExpressionError):
+            raise _error("ValidationException", str(ex), self.operation) from ex
+        return False
+
+
+def _error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def _check_unused(names: Optional[dict], values: Optional[dict], expressions: list):
+    expressions = [e for e in expressions if e is not None]
+    used_names = set().union(*(e.names for e in expressions))
+    unused = set(names or ()) - used_names
+    if unused:
+        raise ExpressionError(
+            f"Value provided in ExpressionAttributeNames unused in expressions: "
+            f"keys: {{{', '.join(sorted(unused))}}}"
+        )
+
+    used_values = set().union(*(getattr(e, "values", ()) for e in expressions))
+    unused = set(values or ()) - used_values
+    if unused:
+        raise ExpressionError(
+            f"Value provided in ExpressionAttributeValues unused in expressions: "
+            f"keys: {{{', '.join(sorted(unused))}}}"
+        )
+
+
+def _check_size(item: dict):
+    if _item_size(item) > MAX_ITEM_BYTES:
+        raise ExpressionError("Item size has exceeded the maximum allowed size")
+
+
+def _return_values(mode: str, old: dict, new: dict, changed: List[str]):
+    if mode == "ALL_OLD":
+        return old
+    if mode == "ALL_NEW":
+        return new
+    if mode == "UPDATED_OLD":
+        return {name: old[name] for name in changed if old and name in old} or None
+    if mode == "UPDATED_NEW":
+        return {name: new[name] for name in changed if name in new} or None
+    return None
+
+
+def _conjuncts(tree: tuple) -> List[tuple]:
+    if tree[0] == "and":
+        return _conjuncts(tree[1]) + _conjuncts(tree[2])
+    return [tree]
+
+
+def _copy(value: Any) -> Any:
+    # Copy like a round trip through DynamoDB would: numbers come back as
+    # Decimal and floats are rejected, as boto3 does.
+    if isinstance(value, dict):
+        return {name: _copy(child) for name, child in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(child) for child in value]
+    if isinstance(value, (set, frozenset)):
+        return {_copy(child) for child in value}
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    return value
+
+
+def _sort_key(value: Any) -> Any:
+    return value if value is not None else ""
+
+
+def _item_size(item: dict) -> int:
+    return sum(len(name.encode()) + _value_size(value) for name, value in item.items())
+
+
+def _value_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, Decimal)):
+        digits = len(Decimal(value).as_tuple().digits)
+        return (digits + 1) // 2 + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(
+            len(name.encode()) + _value_size(child) + 1 for name, child in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(_value_size(child) + 1 for child in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(_value_size(child) for child in value)
+    return len(str(value))
+
+
+def _read_units(size: int, consistent: bool) -> float:
+    units = max(1, math.ceil(size / 4096))
+    return units if consistent else units / 2
+
+
+def _write_units(size: int) -> float:
+    return max(1, math.ceil(size / 1024))
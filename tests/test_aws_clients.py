@@ -0,0 +1,68 @@
+import pytest
+
+from cloudly.aws.clients import ClientRegistry, ClientSettings, resolve_table
+from cloudly.testing.table import InMemoryTable
+
+
+class FakeSession:
+    def __init__(self):
+        self.created = []
+
+    def client(self, service_name, region_name=None, config=None):
+        self.created.append(("client", service_name, region_name, config))
+        return object()
+
+    def resource(self, service_name, region_name=None, config=None):
+        self.created.append(("resource", service_name, region_name, config))
+        return FakeDynamoDB()
+
+
+class FakeDynamoDB:
+    def Table(self, name):
+        return InMemoryTable(name=name)
+
+
+def create_registry():
+    pytest.importorskip("botocore")
+    registry = ClientRegistry(ClientSettings(region_name="eu-west-1"))
+    registry._session = FakeSession()
+    return registry
+
+
+def test_clients_are_created_once():
+    registry = create_registry()
+
+    first = registry.client("cognito-idp")
+    assert registry.client("cognito-idp") is first
+    assert registry.client("cognito-idp", "us-east-1") is not first
+    assert registry.table("config") is registry.table("config")
+    assert len(registry._session.created) == 3
+
+
+def test_clients_use_the_tuned_config():
+    registry = create_registry()
+
+    registry.client("dynamodb")
+    _, _, region, config = registry._session.created[0]
+
+    assert region == "eu-west-1"
+    assert config.max_pool_connections == 50
+    assert config.tcp_keepalive is True
+    assert config.retries == {"mode": "standard", "max_attempts": 3}
+
+
+def test_configure_drops_existing_clients():
+    registry = create_registry()
+    first = registry.client("dynamodb")
+
+    registry.configure(max_pool_connections=10)
+    registry._session = FakeSession()
+
+    assert registry.client("dynamodb") is not first
+    assert registry._session.created[0][3].max_pool_connections == 10
+
+
+def test_resolve_table_passes_tables_through():
+    table = InMemoryTable()
+
+    assert resolve_table(table) is table
@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from cloudly.db.buffer import BufferedTable
+
+
+@dataclass
+class FakeTable:
+    name: str = "data"
+    items: dict = field(default_factory=dict)
+    calls: List[str] = field(default_factory=list)
+    unprocessed_once: bool = False
+
+    def get_item(self, Key, **kwargs):
+        self.calls.append("get_item")
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.calls.append("put_item")
+        self.items[(Item["pk"], Item["sk"])] = Item
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append("batch_write_item")
+        requests = RequestItems[self.name]
+        if self.unprocessed_once:
+            self.unprocessed_once = False
+            return {"UnprocessedItems": {self.name: requests}}
+
+        for request in requests:
+            if "PutRequest" in request:
+                item = request["PutRequest"]["Item"]
+                self.items[(item["pk"], item["sk"])] = item
+            else:
+                key = request["DeleteRequest"]["Key"]
+                self.items.pop((key["pk"], key["sk"]), None)
+        return {}
+
+
+def test_writes_are_deduped_and_batched():
+    table = FakeTable()
+    table.items[("b", "1")] = {"pk": "b", "sk": "1"}
+    tested = BufferedTable(table)
+
+    for i in range(30):
+        tested.put_item(Item={"pk": "a", "sk": str(i % 27), "n": i})
+    tested.delete_item(Key={"pk": "b", "sk": "1"})
+    assert table.calls == []
+
+    tested.flush()
+
+    assert table.calls == ["batch_write_item", "batch_write_item"]
+    assert len(table.items) == 27
+    assert table.items[("a", "0")]["n"] == 27
+
+
+def test_get_item_sees_pending_writes():
+    table = FakeTable()
+    tested = BufferedTable(table)
+
+    tested.put_item(Item={"pk": "a", "sk": "1", "n": 1})
+
+    assert tested.get_item(Key={"pk": "a", "sk": "1"}) == {
+        "Item": {"pk": "a", "sk": "1", "n": 1}
+    }
+    assert table.calls == []
+
+
+def test_unprocessed_items_are_retried():
+    table = FakeTable(unprocessed_once=True)
+    tested = BufferedTable(table)
+
+    tested.put_item(Item={"pk": "a", "sk": "1"})
+    tested.flush()
+
+    assert table.calls == ["batch_write_item", "batch_write_item"]
+    assert ("a", "1") in table.items
+
+
+def test_conditional_writes_flush_first():
+    table = FakeTable()
+    tested = BufferedTable(table, flush_threshold=2)
+
+    tested.put_item(Item={"pk": "a", "sk": "1"})
+    tested.put_item(Item={"pk": "a", "sk": "2"}, ConditionExpression="x")
+
+    assert table.calls == ["batch_write_item", "put_item"]
+
+
+def test_staged_writes_join_the_buffer_only_on_success():
+    table = FakeTable()
+    tested = BufferedTable(table)
+
+    with tested.staged():
+        tested.put_item(Item={"pk": "a", "sk": "1"})
+        assert tested.get_item(Key={"pk": "a", "sk": "1"})["Item"]["pk"] == "a"
+        assert tested.pending_count == 0
+    try:
+        with tested.staged():
+            tested.put_item(Item={"pk": "b", "sk": "1"})
+            raise ValueError("record failed")
+    except ValueError:
+        pass
+
+    assert tested.pending_count == 1
+    tested.clear()
+    tested.flush()
+    assert table.calls == []
@@ -0,0 +1,291 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+from cloudly.config.cache import ConfigCache
+from cloudly.config.client import ConfigClient
+
+
+@dataclass
+class FakeTable:
+    name: str = "config"
+    items: dict = field(default_factory=dict)
+    calls: List[str] = field(default_factory=list)
+
+    def add(self, pk, sk, value):
+        self.items[(pk, sk)] = {"pk": pk, "sk": sk, "value": value}
+
+    def get_item(self, Key, **kwargs):
+        self.calls.append("get_item")
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item):
+        self.calls.append("put_item")
+        self.items[(Item["pk"], Item["sk"])] = Item
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        self.calls.append("update_item")
+        item = self.items.setdefault((Key["pk"], Key["sk"]), {**Key})
+        if UpdateExpression.startswith("ADD"):
+            item["version"] = item.get("version", 0) + 1
+            return {"Attributes": {"version": item["version"]}}
+
+        old = dict(item)
+        item.setdefault("value", kwargs["ExpressionAttributeValues"][":default"])
+        return {"Attributes": old}
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append("batch_write_item")
+        for request in RequestItems[self.name]:
+            self.put_item(request["PutRequest"]["Item"])
+        return {}
+
+    def query(self, **kwargs):
+        self.calls.append("query")
+        pk = kwargs["ExpressionAttributeValues"][":pk"]
+        return {"Items": [i for (p, _), i in self.items.items() if p == pk]}
+
+    def batch_get_item(self, RequestItems):
+        self.calls.append("batch_get_item")
+        keys = [(k["pk"], k["sk"]) for k in RequestItems[self.name]["Keys"]]
+        found = [self.items[key] for key in keys if key in self.items]
+        return {"Responses": {self.name: found}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_client(table=None, clock=None, **cache_options):
+    cache = ConfigCache(clock=clock or FakeClock(), **cache_options)
+    return ConfigClient(table or FakeTable(), "app", cache=cache)
+
+
+def test_get_reads_table_once_while_fresh():
+    table = FakeTable()
+    table.add("APP#BETA", "flag", "on")
+    client = create_client(table)
+
+    assert client.get("flag") == "on"
+    assert client.get("flag") == "on"
+    assert table.calls == ["get_item"]
+
+
+def test_reads_are_not_cached_by_default():
+    table = FakeTable()
+    table.add("APP#BETA", "flag", "on")
+    client = ConfigClient(table, "app")
+
+    assert client.get("flag") == "on"
+    table.add("APP#BETA", "flag", "off")
+    assert client.get("flag") == "off"
+    assert table.calls == ["get_item", "get_item"]
+
+
+def test_missing_keys_are_cached():
+    table = FakeTable()
+    client = create_client(table)
+
+    assert client.get("missing") is None
+    assert client.get("missing") is None
+    assert table.calls == ["get_item"]
+
+
+def test_set_writes_through_to_cache():
+    table = FakeTable()
+    client = create_client(table)
+
+    assert client.get("flag") is None
+    client.set("flag", "off")
+
+    assert client.get("flag") == "off"
+    assert table.calls == ["get_item", "put_item", "update_item"]
+
+
+def test_stale_value_is_served_while_refreshing():
+    table = FakeTable()
+    table.add("APP#BETA", "flag", "old")
+    clock = FakeClock()
+    client = create_client(table, clock, ttl=10, stale_ttl=100)
+
+    assert client.get("flag") == "old"
+    table.add("APP#BETA", "flag", "new")
+    clock.now = 20
+
+    assert client.get("flag") == "old"
+    for _ in range(100):
+        if client.get("flag") == "new":
+            break
+        time.sleep(0.01)
+    assert client.get("flag") == "new"
+
+
+def test_concurrent_misses_are_coalesced():
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        release.wait(1)
+        return "value"
+
+    cache = ConfigCache()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("key", loader)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 5
+    assert len(loads) == 1
+
+
+def test_get_many_batches_uncached_keys():
+    table = FakeTable()
+    table.add("APP#BETA", "a", 1)
+    table.add("APP#BETA", "b", 2)
+    client = create_client(table)
+    client.get("a")
+
+    values = client.get_many(["a", "b", "c"])
+
+    assert values == {"a": 1, "b": 2, "c": None}
+    assert client.get("c") is None
+    assert table.calls == ["get_item", "batch_get_item"]
+
+
+def test_preload_fills_cache_from_one_query():
+    table = FakeTable()
+    table.add("APP#BETA", "a", 1)
+    table.add("app", "a", 0)
+    table.add("app", "s", 3)
+    client = create_client(table)
+
+    assert client.preload(include_shared=True) == {"a": 1, "s": 3}
+    assert client.get("a") == 1
+    assert client.get("s", shared=True) == 3
+    assert table.calls == ["query", "query"]
+
+
+def test_version_change_reloads_partition():
+    table = FakeTable()
+    table.add("APP#BETA", "a", 1)
+    table.add("APP#BETA", "b", 2)
+    clock = FakeClock()
+    cache = ConfigCache(ttl=300, clock=clock)
+    reader = ConfigClient(table, "app", cache=cache, poll_interval=5)
+    writer = ConfigClient(table, "app", cache=ConfigCache(clock=clock))
+
+    assert reader.get("a") == 1
+    writer.set("b", 3)
+    assert reader.get("b") == 3
+
+    writer.set("a", 10)
+    assert reader.get("a") == 1
+
+    table.calls.clear()
+    clock.now = 6
+    assert reader.get("a") == 10
+    assert reader.get("b") == 3
+    assert table.calls == ["get_item", "query"]
+
+
+def test_unchanged_version_keeps_cache():
+    table = FakeTable()
+    table.add("APP#BETA", "a", 1)
+    clock = FakeClock()
+    client = create_client(table, clock, ttl=300)
+    client.poll_interval = 5
+
+    assert client.get("a") == 1
+    client.set("a", 2)
+    table.calls.clear()
+    clock.now = 6
+
+    assert client.get("a") == 2
+    assert table.calls == ["get_item"]
+
+
+def test_polling_requires_a_cache():
+    with pytest.raises(ValueError):
+        ConfigClient(FakeTable(), "app", poll_interval=5)
+
+
+def test_get_or_set_stores_default_in_one_call():
+    table = FakeTable()
+    client = create_client(table)
+
+    assert client.get_or_set("flag", "on") == "on"
+    assert client.get("flag") == "on"
+    assert table.calls == ["update_item", "update_item"]
+
+
+def test_get_or_set_keeps_existing_value():
+    table = FakeTable()
+    table.add("APP#BETA", "flag", "off")
+    client = create_client(table)
+
+    assert client.get_or_set("flag", "on") == "off"
+    assert table.items[("APP#BETA", "flag")]["value"] == "off"
+    assert table.calls == ["update_item"]
+
+
+def test_batch_collects_sets_into_one_write():
+    table = FakeTable()
+    client = create_client(table)
+
+    with client.batch():
+        client.set("a", 1)
+        client.set("b", 2)
+        client.set("a", 3)
+        assert table.calls == []
+        assert client.get("a") == 3
+
+    assert table.items[("APP#BETA", "a")]["value"] == 3
+    assert table.items[("APP#BETA", "b")]["value"] == 2
+    assert table.calls == ["batch_write_item", "put_item", "put_item", "update_item"]
+
+
+def test_batch_is_dropped_when_the_block_raises():
+    table = FakeTable()
+    client = create_client(table)
+
+    try:
+        with client.batch():
+            client.set("a", 1)
+            raise ValueError("abort")
+    except ValueError:
+        pass
+
+    assert table.items == {}
+    assert table.calls == []
+    assert client.get("a") is None
+
+
+def test_batch_only_collects_sets_of_its_thread():
+    table = FakeTable()
+    client = create_client(table)
+
+    with client.batch():
+        client.set("a", 1)
+        writer = threading.Thread(target=client.set, args=("b", 2))
+        writer.start()
+        writer.join()
+        assert table.items[("APP#BETA", "b")]["value"] == 2
+        assert ("APP#BETA", "a") not in table.items
+
+    assert table.items[("APP#BETA", "a")]["value"] == 1
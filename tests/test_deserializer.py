@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from cloudly.db.deserializer import LazyImage, deserialize, deserialize_image
+from cloudly.streams.common import Change, _split_path
+
+
+def test_deserialize_scalar_types():
+    assert deserialize({"S": "text"}) == "text"
+    assert deserialize({"N": "10.5"}) == Decimal("10.5")
+    assert deserialize({"BOOL": False}) is False
+    assert deserialize({"NULL": True}) is None
+    assert deserialize({"B": "aGVsbG8="}) == b"hello"
+
+
+def test_deserialize_nested_types():
+    image = {
+        "tags": {"SS": ["a", "b"]},
+        "sizes": {"NS": ["1", "2"]},
+        "address": {"M": {"city": {"S": "Accra"}, "lines": {"L": [{"S": "1"}]}}},
+    }
+
+    assert deserialize_image(image) == {
+        "tags": {"a", "b"},
+        "sizes": {Decimal(1), Decimal(2)},
+        "address": {"city": "Accra", "lines": ["1"]},
+    }
+
+
+def test_lazy_image_decodes_on_access():
+    image = LazyImage({"name": {"S": "Yaw"}, "age": {"N": "5"}, "bad": {"??": 1}})
+
+    assert image["name"] == "Yaw"
+    assert image.get("age") == Decimal(5)
+    assert image.get("missing", "default") == "default"
+    assert "bad" in image
+    assert len(image) == 3
+    assert list(image._decoded) == ["name", "age"]
+
+
+def test_empty_lazy_image_is_falsy():
+    assert not LazyImage(None)
+    assert dict(LazyImage({})) == {}
+
+
+class CountingImage(dict):
+    reads = 0
+
+    def get(self, key, default=None):
+        CountingImage.reads += 1
+        return super().get(key, default)
+
+
+def create_change():
+    old = CountingImage(status="NEW", payment={"amount": 10})
+    new = {"status": "PAID", "payment": {"amount": 20}}
+    return Change("ORDER#1", "DETAILS", old, new, "MODIFY")
+
+
+def test_changed_fields_are_computed_once_per_change():
+    change = create_change()
+    CountingImage.reads = 0
+
+    first = change.get_changed_fields(change, ("status", "payment.amount"))
+    reads = CountingImage.reads
+    second = change.get_changed_fields(change, ("status", "payment.amount"))
+
+    assert first == second == {"status": "PAID", "amount": 20}
+    assert reads > 0
+    assert CountingImage.reads == reads
+
+
+def test_changed_fields_can_be_changed_by_the_caller():
+    change = create_change()
+
+    change.get_changed_fields(change, ("status",)).pop("status")
+
+    assert change.get_changed_fields(change, ("status",)) == {"status": "PAID"}
+
+
+def test_dotted_paths_are_split_once():
+    assert _split_path("payment.amount") == ("payment", "amount")
+    assert _split_path("payment.amount") is _split_path("payment.amount")
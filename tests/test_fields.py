@@ -0,0 +1,31 @@
+from cloudly.http.fields import compile_fields
+
+
+def test_compile_fields_merges_paths():
+    selector = compile_fields("a, b.c ,b.d.e,,x..y")
+
+    assert selector.select({"a": 1, "b": {"c": 2, "d": {"e": 3, "f": 4}, "g": 5}}) == {
+        "a": 1,
+        "b": {"c": 2, "d": {"e": 3}},
+    }
+
+
+def test_whole_field_wins_over_sub_fields():
+    data = {"b": {"c": 1, "d": 2}}
+
+    assert compile_fields("b.c,b").select(data) == data
+    assert compile_fields("b,b.c").select(data) == data
+
+
+def test_selection_does_not_copy_unselected_values():
+    address = {"city": "Accra"}
+
+    selected = compile_fields("address").select({"address": address, "big": [0] * 1000})
+
+    assert selected["address"] is address
+    assert "big" not in selected
+
+
+def test_compiled_fields_are_cached():
+    assert compile_fields("a,b") is compile_fields("a,b")
+    assert compile_fields("_request") is None
@@ -1,7 +1,9 @@
 import json
-from cloudly.http.decorators import http_api
+from cloudly.http.decorators import http_api, prewarm
+from cloudly.http.throttle import Throttle
 
 from cloudly.http.validators import IntegerNumber, string_field
+from cloudly.testing.table import InMemoryTable
 from flowfast.step import Task, Mapping
 
 validation_schema = {
@@ -121,3 +123,190 @@ def test_http_api_with_validator_required():
     tested = handler
     response = tested({"body": json.dumps({})}, {})
     assert response["statusCode"] == 400
+
+
+class CountCalls(Task):
+    calls = 0
+
+    def process(self, input: Mapping) -> Mapping:
+        CountCalls.calls += 1
+        return input
+
+
+def test_warmup_event_skips_the_pipeline():
+    initialized = []
+
+    @http_api(
+        CountCalls(),
+        validation_schema=validation_schema,
+        allow_groups=["admin"],
+        on_prewarm=[lambda: initialized.append(True)],
+    )
+    def handler(event, context):
+        pass
+
+    calls = CountCalls.calls
+    response = handler({"source": "serverless-plugin-warmup"}, {})
+    handler({"source": "aws.events", "detail-type": "Scheduled Event"}, {})
+
+    assert response == {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": "",
+    }
+    assert CountCalls.calls == calls
+    assert initialized == [True]
+
+
+def test_warmup_detection_can_be_replaced():
+    @http_api(CountCalls(), warmup=lambda event: event.get("ping") == "warm")
+    def handler(event, context):
+        pass
+
+    calls = CountCalls.calls
+    handler({"ping": "warm"}, {})
+    response = handler({"source": "serverless-plugin-warmup"}, {})
+
+    assert response["statusCode"] == 200
+    assert CountCalls.calls == calls + 1
+
+
+def test_prewarm_runs_initialization_once():
+    initialized = []
+
+    @http_api(AddHello(), on_prewarm=[lambda: initialized.append(True)])
+    def handler(event, context):
+        pass
+
+    prewarm(handler)
+    handler.prewarm()
+    response = handler({}, {})
+
+    assert initialized == [True]
+    assert json.loads(response["body"])["Hello"] == "World!"
+
+
+def test_steps_share_request_scoped_loaders():
+    table = InMemoryTable(name="users")
+    table.load(
+        {"pk": f"USER#{i}", "sk": "PROFILE", "name": f"user {i}"} for i in range(3)
+    )
+    keys = [{"pk": f"USER#{i}", "sk": "PROFILE"} for i in (0, 1, 2, 1, 9)]
+
+    class LoadProfiles(Task):
+        def process(self, input: Mapping) -> Mapping:
+            users = input["_request"]["loaders"].table(table)
+            for key in keys:
+                users.queue(key)
+            names = [(users.load(key) or {}).get("name") for key in keys]
+            return {**input, "names": names}
+
+    class LoadAgain(Task):
+        def process(self, input: Mapping) -> Mapping:
+            profile = input["_request"]["loaders"].load(table, keys[0])
+            return {**input, "first": profile["name"]}
+
+    @http_api(LoadProfiles(), LoadAgain())
+    def handler(event, context):
+        pass
+
+    body = json.loads(handler({}, {})["body"])
+    handler({}, {})
+
+    assert body["names"] == ["user 0", "user 1", "user 2", "user 1", None]
+    assert body["first"] == "user 0"
+    assert table.calls == {"batch_get_item": 2}
+
+
+class AddProfile(Task):
+    def process(self, input: Mapping) -> Mapping:
+        return {
+            **input,
+            "id": "1",
+            "name": "Ama",
+            "address": {"city": "Accra", "zip": "00233"},
+            "orders": [{"id": "a", "total": 1}, {"id": "b", "total": 2}],
+        }
+
+
+def test_sparse_fieldsets():
+    @http_api(AddProfile(), sparse_fields=True)
+    def handler(event, context):
+        pass
+
+    event = {
+        "queryStringParameters": {"fields": "name,address.city,orders.id,_request"}
+    }
+    body = json.loads(handler(event, {})["body"])
+    everything = json.loads(handler({}, {})["body"])
+
+    assert body == {
+        "name": "Ama",
+        "address": {"city": "Accra"},
+        "orders": [{"id": "a"}, {"id": "b"}],
+    }
+    assert set(everything) == {"id", "name", "address", "orders"}
+
+
+def test_fields_parameter_is_ignored_unless_enabled():
+    @http_api(AddProfile())
+    def handler(event, context):
+        pass
+
+    event = {"queryStringParameters": {"fields": "name"}}
+    body = json.loads(handler(event, {})["body"])
+
+    assert "address" in body
+
+
+def test_throttled_requests_get_429_before_parsing():
+    @http_api(CountCalls(), throttle=Throttle(rate=1))
+    def handler(event, context):
+        pass
+
+    claims = {"client_id": "app"}
+    event = {
+        "body": "not json",
+        "requestContext": {"authorizer": {"jwt": {"claims": claims}}},
+    }
+    calls = CountCalls.calls
+    first = handler(event, {})
+    second = handler(event, {})
+
+    assert first["statusCode"] == 500
+    assert second["statusCode"] == 429
+    assert second["headers"]["Retry-After"] == "1"
+    assert CountCalls.calls == calls
+
+
+def test_loaders_read_a_lone_key_with_get_item():
+    table = InMemoryTable(name="users")
+    table.load([{"pk": "USER#1", "sk": "PROFILE", "name": "user 1"}])
+
+    class LoadProfile(Task):
+        def process(self, input: Mapping) -> Mapping:
+            users = input["_request"]["loaders"].table(table)
+            profile = users.load({"pk": "USER#1", "sk": "PROFILE"})
+            missing = users.load({"pk": "USER#2", "sk": "PROFILE"})
+            users.load({"pk": "USER#1", "sk": "PROFILE"})
+            return {**input, "name": profile["name"], "missing": missing}
+
+    @http_api(LoadProfile())
+    def handler(event, context):
+        pass
+
+    body = json.loads(handler({}, {})["body"])
+
+    assert body == {"name": "user 1", "missing": None}
+    assert table.calls == {"get_item": 2}
+
+
+def test_handler_fields_keep_their_positions():
+    from cloudly.http.request import AwsLambdaApiHandler
+
+    middleware = [Task()]
+    handler = AwsLambdaApiHandler({}, None, None, None, middleware, {"a": 1})
+
+    assert handler.middleware is middleware
+    assert handler.validation_schema == {"a": 1}
+    assert handler.throttle is None and handler.idempotency is None
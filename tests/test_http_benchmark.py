@@ -0,0 +1,43 @@
+import json
+
+from cloudly.http.benchmark import (
+    CASES,
+    Case,
+    bytes_per_validated_item,
+    compare,
+    event_for,
+    run_case,
+)
+
+
+def test_cases_exercise_success_and_error_paths():
+    expected = {
+        "error-validation": 400,
+        "error-forbidden": 403,
+        "error-http": 404,
+        "error-exception": 500,
+    }
+    for case in CASES:
+        if case.body_bytes > 1024 or case.list_items > 100:
+            continue
+        result = run_case(case, iterations=20, warmup=1)
+        assert result.status_code == expected.get(case.name, 200), case.name
+        assert result.p50_us <= result.p99_us <= result.max_us
+
+
+def test_event_body_is_padded_to_size():
+    event = event_for(Case("padded", body_bytes=4096))
+
+    assert 4096 <= len(event["body"]) < 4200
+    assert json.loads(event["body"])["name"]
+
+
+def test_compare_reports_p50_change():
+    baseline = {"cases": [{"name": "flat-small", "p50_us": 100.0}]}
+    current = {"cases": [{"name": "flat-small", "p50_us": 110.0}]}
+
+    assert "+10.0%" in compare(baseline, current)[0]
+
+
+def test_bytes_per_validated_item():
+    assert 0 < bytes_per_validated_item(items=50) < 4096
@@ -0,0 +1,152 @@
+import json
+
+from flowfast.step import Task, Mapping
+
+from cloudly.http.decorators import http_api
+from cloudly.http.idempotency import Idempotency
+from cloudly.testing.table import InMemoryTable
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CreateOrder(Task):
+    created = []
+
+    def process(self, input: Mapping) -> Mapping:
+        if input.get("fail"):
+            raise RuntimeError("payment service down")
+        CreateOrder.created.append(input["item"])
+        return {"order": len(CreateOrder.created), "item": input["item"]}
+
+
+def create_handler(idempotency):
+    @http_api(CreateOrder(), status=201, idempotency=idempotency)
+    def handler(event, context):
+        pass
+
+    return handler
+
+
+def event_of(body, key="key-1", username="ama", source_ip=None):
+    claims = {"username": username} if username else {}
+    return {
+        "headers": {"idempotency-key": key} if key else {},
+        "body": json.dumps(body),
+        "requestContext": {
+            "http": {"method": "POST", "path": "/orders", "sourceIp": source_ip},
+            "authorizer": {"jwt": {"claims": claims}},
+        },
+    }
+
+
+def test_retries_get_the_stored_response():
+    CreateOrder.created = []
+    handler = create_handler(Idempotency(InMemoryTable()))
+
+    first = handler(event_of({"item": "tea"}), {})
+    retry = handler(event_of({"item": "tea"}), {})
+
+    assert first["statusCode"] == 201
+    assert retry == first
+    assert CreateOrder.created == ["tea"]
+
+
+def test_keys_are_scoped_to_the_caller():
+    CreateOrder.created = []
+    handler = create_handler(Idempotency(InMemoryTable()))
+
+    handler(event_of({"item": "tea"}, username="ama"), {})
+    handler(event_of({"item": "tea"}, username="kofi"), {})
+    handler(event_of({"item": "tea"}, key=None), {})
+    handler(event_of({"item": "tea"}, key=None), {})
+
+    assert len(CreateOrder.created) == 4
+
+
+def test_anonymous_keys_are_scoped_to_the_source_ip():
+    CreateOrder.created = []
+    handler = create_handler(Idempotency(InMemoryTable()))
+
+    for source_ip in ("10.0.0.1", "10.0.0.1", "10.0.0.2", None, None):
+        handler(event_of({"item": "tea"}, username=None, source_ip=source_ip), {})
+
+    assert len(CreateOrder.created) == 4
+
+
+def test_duplicates_of_a_running_request_get_409():
+    table = InMemoryTable()
+    idempotency = Idempotency(table, clock=Clock())
+    handler = create_handler(idempotency)
+    assert idempotency.claim(event_of({"item": "tea"})).key is not None
+
+    response = handler(event_of({"item": "tea"}), {})
+
+    assert response["statusCode"] == 409
+
+
+def test_abandoned_claims_expire():
+    clock = Clock()
+    idempotency = Idempotency(InMemoryTable(), in_progress_seconds=60, clock=clock)
+    handler = create_handler(idempotency)
+    idempotency.claim(event_of({"item": "tea"}))
+
+    clock.now += 61
+    response = handler(event_of({"item": "tea"}), {})
+
+    assert response["statusCode"] == 201
+
+
+def test_key_reused_for_another_body_gets_422():
+    handler = create_handler(Idempotency(InMemoryTable()))
+
+    handler(event_of({"item": "tea"}), {})
+    response = handler(event_of({"item": "coffee"}), {})
+
+    assert response["statusCode"] == 422
+
+
+def test_failed_requests_release_the_key():
+    CreateOrder.created = []
+    table = InMemoryTable()
+    handler = create_handler(Idempotency(table))
+    event = event_of({"item": "tea", "fail": True})
+
+    assert handler(event, {})["statusCode"] == 500
+    assert not table.items
+    assert handler(event, {})["statusCode"] == 500
+
+
+def test_stored_responses_expire():
+    CreateOrder.created = []
+    clock = Clock()
+    handler = create_handler(Idempotency(InMemoryTable(), ttl_seconds=10, clock=clock))
+
+    handler(event_of({"item": "tea"}), {})
+    clock.now += 11
+    handler(event_of({"item": "tea"}), {})
+
+    assert CreateOrder.created == ["tea", "tea"]
+
+
+def test_a_claim_taken_over_by_a_retry_is_left_to_the_retry():
+    clock = Clock()
+    table = InMemoryTable()
+    idempotency = Idempotency(table, in_progress_seconds=60, clock=clock)
+    event = event_of({"item": "tea"})
+    slow = idempotency.claim(event)
+    clock.now += 61
+    retry = idempotency.claim(event)
+    assert retry.key is not None
+
+    idempotency.complete(slow, event, {"statusCode": 201, "body": "slow"})
+    idempotency.complete(slow, event, {"statusCode": 500, "body": "slow"})
+
+    assert [item["status"] for item in table.items.values()] == ["IN_PROGRESS"]
+    idempotency.complete(retry, event, {"statusCode": 201, "body": "retry"})
+    assert idempotency.claim(event).response == {"statusCode": 201, "body": "retry"}
@@ -0,0 +1,235 @@
+from decimal import Decimal
+
+import pytest
+
+from cloudly.config.cache import ConfigCache
+from cloudly.config.client import ConfigClient
+from cloudly.db.batch import batch_get, batch_write
+from cloudly.db.errors import error_code, is_conditional_check_failed
+from cloudly.streams.dedup import ProcessedEvents
+from cloudly.testing.expressions import parse_condition, parse_update
+from cloudly.testing.table import ClientError, InMemoryTable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_table(**kwargs):
+    table = InMemoryTable(name="test", **kwargs)
+    table.load(
+        {"pk": "ORDER#1", "sk": f"ITEM#{i}", "qty": i, "tags": {"a"}}
+        for i in range(1, 6)
+    )
+    return table
+
+
+def test_conditions():
+    item = {"status": "OPEN", "total": Decimal(10), "tags": {"a", "b"}, "m": {"x": 1}}
+    values = {":open": "OPEN", ":five": 5, ":twenty": 20, ":a": "a", ":s": "S"}
+
+    def check(expression):
+        return parse_condition(expression).evaluate(item, values)
+
+    assert check("status = :open AND total BETWEEN :five AND :twenty")
+    assert check("contains(tags, :a) AND attribute_type(status, :s)")
+    assert check("NOT (total < :five) OR attribute_exists(missing)")
+    assert check("attribute_not_exists(missing) AND m.x < :five")
+    assert check("size(tags) < :five AND status IN (:a, :open)")
+    assert not check("begins_with(status, :a)")
+    assert not check("missing = :a")
+
+
+def test_update_expressions():
+    update = parse_update(
+        "SET #n = if_not_exists(#n, :zero) + :one, m.x = :one, l = list_append(l, :l) "
+        "REMOVE old ADD tags :tags DELETE gone :tags",
+        {"#n": "count"},
+    )
+    item = {"l": [1], "m": {}, "old": 1, "tags": {"a"}, "gone": {"b"}}
+    values = {":zero": 0, ":one": 1, ":l": [2], ":tags": {"b"}}
+
+    updated, changed = update.apply(item, values)
+
+    assert updated == {"count": 1, "l": [1, 2], "m": {"x": 1}, "tags": {"a", "b"}}
+    assert changed == ["count", "m", "l", "old", "tags", "gone"]
+    assert item["m"] == {}
+
+
+def test_conditional_errors_have_the_dynamodb_error_code():
+    table = create_table()
+
+    with pytest.raises(ClientError) as raised:
+        table.put_item(
+            Item={"pk": "ORDER#1", "sk": "ITEM#1"},
+            ConditionExpression="attribute_not_exists(pk)",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+
+    assert is_conditional_check_failed(raised.value)
+    assert raised.value.response["Item"]["qty"] == 1
+    assert table.total_write_units == 1
+
+
+def test_validation_errors_match_dynamodb():
+    table = create_table()
+
+    cases = [
+        lambda: table.put_item(Item={"pk": "A", "sk": "B", "price": 1.5}),
+        lambda: table.get_item(Key={"pk": "A"}),
+        lambda: table.query(
+            KeyConditionExpression="pk = :pk",
+            ExpressionAttributeValues={":pk": "A", ":unused": 1},
+        ),
+        lambda: table.update_item(
+            Key={"pk": "A", "sk": "B"},
+            UpdateExpression="SET sk = :v",
+            ExpressionAttributeValues={":v": "C"},
+        ),
+        lambda: table.batch_write_item(
+            RequestItems={
+                "test": [{"PutRequest": {"Item": {"pk": "A", "sk": "B"}}}] * 2
+            }
+        ),
+    ]
+
+    codes = []
+    for case in cases:
+        with pytest.raises((ClientError, TypeError)) as raised:
+            case()
+        codes.append(error_code(raised.value))
+
+    assert codes == ["TypeError"] + ["ValidationException"] * 4
+
+
+def test_update_item_return_values():
+    table = create_table()
+
+    response = table.update_item(
+        Key={"pk": "ORDER#1", "sk": "ITEM#1"},
+        UpdateExpression="ADD qty :one SET #s = :s",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={":one": 1, ":s": "DONE"},
+        ReturnValues="UPDATED_NEW",
+    )
+
+    assert response["Attributes"] == {"qty": 2, "status": "DONE"}
+    assert table.items[("ORDER#1", "ITEM#1")]["qty"] == Decimal(2)
+
+
+def test_query_pages_filters_and_projects():
+    table = create_table()
+    options = {
+        "KeyConditionExpression": "pk = :pk AND begins_with(sk, :item)",
+        "FilterExpression": "qty > :one",
+        "ProjectionExpression": "sk, qty",
+        "ExpressionAttributeValues": {":pk": "ORDER#1", ":item": "ITEM#", ":one": 1},
+        "ScanIndexForward": False,
+        "Limit": 3,
+    }
+
+    first = table.query(**options)
+    second = table.query(**options, ExclusiveStartKey=first["LastEvaluatedKey"])
+
+    assert [i["sk"] for i in first["Items"]] == ["ITEM#5", "ITEM#4", "ITEM#3"]
+    assert first["Items"][0] == {"sk": "ITEM#5", "qty": 5}
+    assert [i["sk"] for i in second["Items"]] == ["ITEM#2"]
+    assert second["ScannedCount"] == 2
+    assert "LastEvaluatedKey" not in second
+    assert table.consumed_read["query"] == 1
+
+
+def test_partition_throttling():
+    clock = FakeClock()
+    table = create_table(partition_read_capacity=2, clock=clock)
+    key = {"pk": "ORDER#1", "sk": "ITEM#1"}
+
+    for _ in range(4):
+        table.get_item(Key=key)
+
+    with pytest.raises(ClientError) as raised:
+        table.get_item(Key=key)
+    assert error_code(raised.value) == "ProvisionedThroughputExceededException"
+
+    table.get_item(Key={"pk": "ORDER#2", "sk": "ITEM#1"})
+    clock.now = 1.0
+    table.get_item(Key=key)
+    assert table.throttled == 1
+
+
+def test_batch_helpers_retry_unprocessed_items():
+    table = create_table(unprocessed_rate=0.2, seed=1)
+    keys = [{"pk": "ORDER#1", "sk": f"ITEM#{i}"} for i in range(1, 6)]
+
+    items = batch_get(table, keys, max_attempts=20)
+    batch_write(
+        table,
+        puts=[{"pk": "ORDER#2", "sk": f"ITEM#{i}"} for i in range(60)],
+        max_attempts=20,
+    )
+
+    assert len(items) == 5
+    assert len([key for key in table.items if key[0] == "ORDER#2"]) == 60
+    assert table.unprocessed > 0
+
+
+def test_batch_helpers_use_the_client_of_a_boto3_table():
+    boto3 = pytest.importorskip("boto3")
+    from botocore.stub import Stubber
+
+    table = boto3.resource(
+        "dynamodb",
+        region_name="us-east-1",
+        endpoint_url="http://localhost:8000",
+        aws_access_key_id="local",
+        aws_secret_access_key="local",
+    ).Table("orders")
+    key = {"pk": "ORDER#1", "sk": "ITEM#1"}
+    wire_item = {"pk": {"S": "ORDER#1"}, "sk": {"S": "ITEM#1"}, "qty": {"N": "2"}}
+
+    with Stubber(table.meta.client) as stub:
+        stub.add_response(
+            "batch_get_item",
+            {"Responses": {"orders": [wire_item]}},
+            {"RequestItems": {"orders": {"Keys": [key]}}},
+        )
+        stub.add_response(
+            "batch_write_item",
+            {"UnprocessedItems": {}},
+            {"RequestItems": {"orders": [{"PutRequest": {"Item": key}}]}},
+        )
+
+        items = batch_get(table, [key])
+        batch_write(table, puts=[key])
+        stub.assert_no_pending_responses()
+
+    assert items == [{"pk": "ORDER#1", "sk": "ITEM#1", "qty": 2}]
+    assert table.meta.client.meta.endpoint_url == "http://localhost:8000"
+
+
+def test_library_code_runs_against_the_table():
+    table = InMemoryTable(name="config")
+    config = ConfigClient(table, "app", cache=ConfigCache(), poll_interval=0)
+    events = ProcessedEvents(table, clock=lambda: 100)
+
+    config.set("limit", 10)
+    with config.batch():
+        config.set("a", "1")
+        config.set("b", "2")
+    events.mark_done("event-1", "SendEmail")
+    events.mark_done("event-1", "SendEmail")
+
+    assert config.get_or_set("limit", 99) == 10
+    assert config.get_many(["a", "b"]) == {"a": "1", "b": "2"}
+    assert not config.refresh_if_changed(force=True)
+
+    ConfigClient(table, "app", cache=ConfigCache()).set("a", "changed")
+    assert config.refresh_if_changed(force=True)
+    assert config.get("a") == "changed"
+    assert ProcessedEvents(table, clock=lambda: 100).completed("event-1") == {
+        "SendEmail"
+    }
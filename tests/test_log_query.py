@@ -0,0 +1,84 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List
+
+from cloudly.logging.query import LogQuery
+
+
+@dataclass
+class FakeTable:
+    items: List[dict] = field(default_factory=list)
+    calls: List[dict] = field(default_factory=list)
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        values = kwargs["ExpressionAttributeValues"]
+        matches = sorted(
+            (
+                item
+                for item in self.items
+                if item["pk"] == values[":pk"]
+                and values[":start"] <= item["sk"] <= values[":end"]
+            ),
+            key=lambda item: item["sk"],
+        )
+        start = kwargs.get("ExclusiveStartKey", {}).get("index", 0)
+        page = matches[start : start + kwargs["Limit"]]
+        response = {"Items": page}
+        if start + kwargs["Limit"] < len(matches):
+            response["LastEvaluatedKey"] = {"index": start + kwargs["Limit"]}
+        return response
+
+
+def create_table(*rows):
+    table = FakeTable()
+    for event_type, timestamp, metric in rows:
+        table.items.append(
+            {
+                "pk": "APP-01",
+                "sk": f"LOGS#{event_type}#{timestamp}",
+                "data": {"timestamp": Decimal(timestamp), "metric": metric},
+            }
+        )
+    return table
+
+
+def test_logs_are_read_within_the_time_window():
+    table = create_table(
+        ("info", "1000.5", {"orders": 1}),
+        ("info", "1001.5", {"orders": 1}),
+        ("info", "1002.5", {"orders": 1}),
+        ("error", "1001.0", {"count": 1}),
+    )
+
+    logs = list(LogQuery(table, "app-01", page_size=2).logs("info", 1000, 1002))
+
+    assert [log["timestamp"] for log in logs] == [Decimal("1000.5"), Decimal("1001.5")]
+    assert len(table.calls) == 1
+    assert table.calls[0]["ProjectionExpression"] == "#data"
+
+
+def test_logs_follow_last_evaluated_key():
+    table = create_table(*[("info", f"{1000 + i}", {}) for i in range(5)])
+
+    logs = list(LogQuery(table, "app-01", page_size=2).logs("info", 1000, 2000))
+
+    assert len(logs) == 5
+    assert len(table.calls) == 3
+
+
+def test_metrics_are_rolled_up_into_buckets():
+    table = create_table(
+        ("event", "1699999990", {"orders": 1}),
+        ("event", "1700000050", {"orders": 2}),
+        ("event", "1700000065", {"orders": 4}),
+    )
+
+    buckets = LogQuery(table, "APP-01").metrics(
+        "event", 1699999980, 1700000100, bucket_seconds=60
+    )
+
+    assert [b.start for b in buckets] == [Decimal(1699999980), Decimal(1700000040)]
+    assert buckets[0].values == {"orders": 1}
+    assert buckets[1].count == 2
+    assert buckets[1].values == {"orders": 6}
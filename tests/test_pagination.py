@@ -0,0 +1,119 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from cloudly.http.decorators import http_api
+from cloudly.http.pagination import CursorCodec, InvalidCursor, Paginate, page_response
+from cloudly.testing.table import InMemoryTable
+
+SECRET = "test-secret"
+
+
+def orders_of_user(input):
+    return {
+        "KeyConditionExpression": "pk = :pk",
+        "ExpressionAttributeValues": {":pk": input["_request"]["event"]["user"]},
+    }
+
+
+def create_handler(table, **options):
+    @http_api(
+        Paginate(table, orders_of_user, secret=SECRET, **options),
+        clean_response=page_response,
+    )
+    def handler(event, context):
+        pass
+
+    return handler
+
+
+def create_table(orders=7):
+    table = InMemoryTable()
+    table.load(
+        {"pk": user, "sk": f"ORDER#{index:02}", "total": index, "notes": "n"}
+        for user in ("ama", "kofi")
+        for index in range(orders)
+    )
+    return table
+
+
+def get_page(handler, user="ama", **parameters):
+    response = handler({"user": user, "queryStringParameters": parameters}, {})
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_cursor_round_trip_keeps_types():
+    codec = CursorCodec(SECRET)
+    key = {"pk": "ama", "sk": Decimal("1.5"), "blob": b"\x00\xff"}
+
+    cursor = codec.encode(key, scope="orders")
+
+    assert "=" not in cursor
+    assert codec.decode(cursor, scope="orders") == key
+
+
+def test_cursor_is_rejected_when_tampered_or_out_of_scope():
+    codec = CursorCodec(SECRET)
+    cursor = codec.encode({"pk": "ama", "sk": "ORDER#03"}, scope="orders")
+    payload, signature = cursor.split(".")
+    forged = CursorCodec("other").encode({"pk": "kofi", "sk": "ORDER#03"}, "orders")
+
+    for bad in (
+        f"{forged.split('.')[0]}.{signature}",
+        forged,
+        payload,
+        "not a cursor",
+    ):
+        with pytest.raises(InvalidCursor):
+            codec.decode(bad, scope="orders")
+    with pytest.raises(InvalidCursor):
+        codec.decode(cursor, scope="payments")
+
+
+def test_pages_through_a_partition():
+    handler = create_handler(create_table(), projection=["sk", "total"])
+
+    seen = []
+    parameters = {"limit": "3"}
+    while True:
+        status, body = get_page(handler, **parameters)
+        assert status == 200
+        assert len(body["items"]) <= 3
+        seen.extend(body["items"])
+        if body["next"] is None:
+            break
+        parameters = {"limit": "3", "cursor": body["next"]}
+
+    assert [item["sk"] for item in seen] == [f"ORDER#{i:02}" for i in range(7)]
+    assert all(set(item) == {"sk", "total"} for item in seen)
+
+
+def test_page_size_is_capped():
+    table = create_table(orders=10)
+    handler = create_handler(table, default_limit=2, max_limit=4)
+
+    assert len(get_page(handler)[1]["items"]) == 2
+    assert len(get_page(handler, limit="50")[1]["items"]) == 4
+    assert get_page(handler, limit="many")[0] == 400
+
+
+def test_cursor_of_another_user_is_rejected():
+    handler = create_handler(create_table(), default_limit=2)
+
+    cursor = get_page(handler, user="ama")[1]["next"]
+    status, body = get_page(handler, user="kofi", cursor=cursor)
+
+    assert status == 400
+    assert body == {"error": "Invalid cursor"}
+
+
+def test_paginate_is_checked_when_created():
+    table = create_table()
+
+    with pytest.raises(ValueError):
+        Paginate(table, orders_of_user)
+    with pytest.raises(ValueError):
+        Paginate(table, secret=SECRET)
+    with pytest.raises(ValueError):
+        Paginate(table, orders_of_user, secret=SECRET, default_limit=500)
@@ -0,0 +1,49 @@
+from cloudly.streams.dedup import ProcessedEvents
+from cloudly.testing.table import InMemoryTable
+
+
+def test_new_events_have_no_completed_processors():
+    table = InMemoryTable()
+    tested = ProcessedEvents(table, clock=lambda: 100)
+
+    assert tested.completed("event-1") == frozenset()
+
+
+def test_completed_processors_survive_a_cold_start():
+    table = InMemoryTable()
+    ProcessedEvents(table, clock=lambda: 100).mark_done("event-1", "SendEmail")
+
+    tested = ProcessedEvents(table, clock=lambda: 100)
+
+    assert tested.completed("event-1") == {"SendEmail"}
+    assert table.items[("PROCESSED#event-1", "SendEmail")]["expires"] == 86500
+
+
+def test_warm_container_skips_the_table():
+    table = InMemoryTable()
+    tested = ProcessedEvents(table, clock=lambda: 100)
+
+    tested.completed("event-1")
+    tested.mark_done("event-1", "SendEmail")
+    tested.mark_done("event-1", "SendEmail")
+
+    assert tested.completed("event-1") == {"SendEmail"}
+    assert table.calls == {"query": 1, "put_item": 2}
+
+
+def test_expired_markers_are_ignored():
+    table = InMemoryTable()
+    ProcessedEvents(table, ttl=10, clock=lambda: 100).mark_done("event-1", "A")
+
+    tested = ProcessedEvents(table, clock=lambda: 200)
+
+    assert tested.completed("event-1") == frozenset()
+
+
+def test_lru_is_bounded():
+    tested = ProcessedEvents(InMemoryTable(), max_entries=2, clock=lambda: 100)
+
+    for event_id in ("a", "b", "c"):
+        tested.mark_done(event_id, "A")
+
+    assert list(tested._done) == ["b", "c"]
@@ -0,0 +1,111 @@
+import pickle
+from dataclasses import FrozenInstanceError, dataclass, field, replace
+
+import pytest
+
+from cloudly.http.context import RequestContext
+from cloudly.http.validators import (
+    BooleanValidator,
+    DecimalNumber,
+    Email,
+    IntegerNumber,
+    ListFieldValidator,
+    MaxLength,
+    MinLength,
+    OptionsValidator,
+    RegexValidator,
+    Required,
+)
+from cloudly.slots import add_slots
+from cloudly.streams.common import Change, DynamicObject
+
+
+@add_slots
+@dataclass
+class Base:
+    name: str = None
+
+
+@add_slots
+@dataclass
+class Child(Base):
+    size: int = 0
+    tags: list = field(default_factory=list)
+
+
+@add_slots
+@dataclass(frozen=True)
+class Point:
+    x: int
+    y: int = 0
+
+
+def test_instances_have_no_dict():
+    child = Child("a", 2)
+
+    assert not hasattr(child, "__dict__")
+    assert Child.__slots__ == ("size", "tags")
+    assert child == Child("a", 2, [])
+    with pytest.raises(AttributeError):
+        child.color = "red"
+
+
+def test_frozen_classes_stay_frozen_and_pickle():
+    point = Point(1)
+
+    with pytest.raises(FrozenInstanceError):
+        point.x = 2
+    assert pickle.loads(pickle.dumps(point)) == point
+    assert replace(point, y=3) == Point(1, 3)
+
+
+def test_plain_subclasses_still_work():
+    @dataclass
+    class Extended(Base):
+        extra: int = 1
+
+    assert Extended("a").extra == 1
+
+
+def test_only_dataclasses_are_accepted():
+    with pytest.raises(TypeError):
+        add_slots(int)
+
+
+def test_init_false_fields_need_a_default_factory():
+    @dataclass
+    class Cached:
+        cache: dict = field(default=None, init=False)
+
+    with pytest.raises(TypeError):
+        add_slots(Cached)
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        Change("pk", "sk", {}, {"status": "new"}, "INSERT"),
+        DynamicObject({"status": "new"}),
+        RequestContext({}),
+        Required(),
+        MinLength(min=1),
+        MaxLength(max=10),
+        Email(),
+        DecimalNumber(),
+        IntegerNumber(),
+        RegexValidator(pattern="^a"),
+        OptionsValidator(options=["a"]),
+        BooleanValidator(),
+        ListFieldValidator(),
+    ],
+    ids=lambda instance: instance.__class__.__name__,
+)
+def test_shipped_classes_have_no_dict(instance):
+    assert not hasattr(instance, "__dict__")
+
+
+def test_change_is_frozen():
+    change = Change("pk", "sk", {}, {"status": "new"}, "INSERT")
+
+    with pytest.raises(FrozenInstanceError):
+        change.event = "MODIFY"
@@ -0,0 +1,101 @@
+import json
+
+from cloudly.streams.benchmark import (
+    Workload,
+    replay_events,
+    run_benchmark,
+    synthetic_events,
+)
+from cloudly.streams.common import Change, DbStreamProcessor, ErrorPolicy
+from cloudly.testing.table import InMemoryTable
+
+
+class CopyItem(DbStreamProcessor):
+    def execute(self, change: Change) -> Change:
+        if not change.is_delete:
+            self.database_table.put_item(Item={"pk": change.pk, "sk": "COPY"})
+
+
+class FailOnRemove(DbStreamProcessor):
+    on_error = ErrorPolicy.FAIL_BATCH
+
+    def execute(self, change: Change) -> Change:
+        if change.is_delete:
+            raise ValueError("removed")
+        return change
+
+
+def test_synthetic_events_follow_the_workload():
+    workload = Workload(records=250, batch_size=100, width=12, keys=10)
+    events = list(synthetic_events(workload))
+
+    assert [len(e["Records"]) for e in events] == [100, 100, 50]
+    record = events[0]["Records"][0]
+    image = record["dynamodb"].get("NewImage") or record["dynamodb"]["OldImage"]
+    assert len(image) == 12
+    assert {r["eventName"] for e in events for r in e["Records"]} <= {
+        "INSERT",
+        "MODIFY",
+        "REMOVE",
+    }
+
+
+def test_skew_concentrates_records_on_few_keys():
+    def hottest_share(skew):
+        events = synthetic_events(Workload(records=1000, keys=100, skew=skew))
+        keys = [r["dynamodb"]["Keys"]["pk"]["S"] for e in events for r in e["Records"]]
+        return max(keys.count(k) for k in set(keys)) / len(keys)
+
+    assert hottest_share(3.0) > 3 * hottest_share(0.0)
+
+
+def test_replay_rebatches_captured_records(tmp_path):
+    records = list(synthetic_events(Workload(records=30, batch_size=30)))[0]["Records"]
+    path = tmp_path / "events.json"
+    path.write_text(json.dumps({"Records": records}))
+
+    assert len(list(replay_events([str(path)]))) == 1
+    assert [len(e["Records"]) for e in replay_events([str(path)], 8)] == [8, 8, 8, 6]
+
+
+def test_run_benchmark_reports_throughput_and_processor_time():
+    table = InMemoryTable(name="benchmark")
+    events = synthetic_events(Workload(records=200, batch_size=50))
+
+    result = run_benchmark([CopyItem], events, table=table)
+
+    assert result.records == 200
+    assert result.batches == 4
+    assert result.records_per_second > 0
+    assert result.processor_calls == {"CopyItem": 200}
+    assert result.failed == 0
+    assert result.peak_memory_bytes > 0
+    assert 0 < result.bytes_per_change < 2048
+    assert table.calls["put_item"] > 0
+
+
+def test_memory_pass_does_not_touch_the_benchmarked_table():
+    table = InMemoryTable(name="benchmark")
+    table.load([{"pk": "ITEM#0", "sk": "COPY", "seen": True}])
+    events = list(synthetic_events(Workload(records=100, batch_size=50)))
+    copies = sum(r["eventName"] != "REMOVE" for e in events for r in e["Records"])
+
+    run_benchmark([CopyItem], events, table=table)
+
+    assert table.calls["put_item"] == copies
+
+
+def test_raised_batches_count_as_failed():
+    events = synthetic_events(
+        Workload(records=100, batch_size=10, event_mix={"MODIFY": 0.9, "REMOVE": 0.1})
+    )
+    events = list(events)
+    raised = [
+        e for e in events if any(r["eventName"] == "REMOVE" for r in e["Records"])
+    ]
+
+    result = run_benchmark([FailOnRemove], events, measure_memory=False)
+
+    assert raised
+    assert result.failed_batches == len(raised)
+    assert result.failed == sum(len(e["Records"]) for e in raised)
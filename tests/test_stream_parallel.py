@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cloudly.streams.aio import event_loop, run_partitioned_async, run_sync
+from cloudly.streams.parallel import record_key, run_partitioned
+
+
+def create_record(pk, sk="A", seq=1):
+    return {
+        "eventName": "MODIFY",
+        "dynamodb": {
+            "Keys": {"pk": {"S": pk}, "sk": {"S": sk}},
+            "SequenceNumber": str(seq),
+        },
+    }
+
+
+def test_records_of_same_item_share_a_key():
+    assert record_key(create_record("1", seq=1)) == record_key(create_record("1", seq=2))
+    assert record_key(create_record("1")) != record_key(create_record("2"))
+
+
+def test_same_key_runs_in_order_and_keys_run_concurrently():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abab")]
+    seen = []
+    running = set()
+    overlap = threading.Event()
+    lock = threading.Lock()
+
+    def handler(record):
+        pk = record["dynamodb"]["Keys"]["pk"]["S"]
+        with lock:
+            running.add(pk)
+            if len(running) > 1:
+                overlap.set()
+        time.sleep(0.02)
+        with lock:
+            running.discard(pk)
+            seen.append((pk, record["dynamodb"]["SequenceNumber"]))
+
+    failures = run_partitioned(records, handler, key=record_key, max_workers=2)
+
+    assert failures == []
+    assert overlap.is_set()
+    assert [seq for pk, seq in seen if pk == "a"] == ["0", "2"]
+    assert [seq for pk, seq in seen if pk == "b"] == ["1", "3"]
+
+
+def test_failures_are_reported_in_record_order():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abcab")]
+    handled = []
+
+    def handler(record):
+        seq = record["dynamodb"]["SequenceNumber"]
+        if seq in ("1", "2"):
+            time.sleep(0.01 if seq == "1" else 0)
+            raise ValueError(seq)
+        handled.append(seq)
+
+    failures = run_partitioned(records, handler, key=record_key, max_workers=3)
+
+    assert [index for index, _ in failures] == [1, 2, 4]
+    assert str(failures[2][1]) == "1"
+    assert sorted(handled) == ["0", "3"]
+
+
+def test_single_worker_keeps_stream_order():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abab")]
+    seen = []
+
+    def handler(record):
+        if record["dynamodb"]["SequenceNumber"] == "0":
+            raise ValueError("0")
+        seen.append(record["dynamodb"]["SequenceNumber"])
+
+    failures = run_partitioned(records, handler, key=record_key)
+
+    assert seen == ["1", "3"]
+    assert [index for index, _ in failures] == [0, 2]
+
+
+def test_fatal_errors_are_raised():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abc")]
+
+    def handler(record):
+        if record["dynamodb"]["SequenceNumber"] == "1":
+            raise KeyError("fatal")
+        raise ValueError("not fatal")
+
+    for workers in (1, 3):
+        with pytest.raises(KeyError):
+            run_partitioned(records, handler, record_key, workers, fatal=(KeyError,))
+
+
+def test_async_keys_run_concurrently_with_bounded_concurrency():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abcabc")]
+    seen = []
+    running = [0, 0]
+
+    async def handler(record):
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        seen.append(record["dynamodb"]["SequenceNumber"])
+
+    failures = run_sync(run_partitioned_async(records, handler, record_key, 2))
+
+    assert failures == []
+    assert running[1] == 2
+    assert seen.index("0") < seen.index("3")
+    assert seen.index("2") < seen.index("5")
+
+
+def test_async_failures_skip_the_rest_of_the_key():
+    records = [create_record(pk, seq=i) for i, pk in enumerate("abab")]
+
+    async def handler(record):
+        if record["dynamodb"]["SequenceNumber"] == "1":
+            raise ValueError("1")
+
+    failures = run_sync(run_partitioned_async(records, handler, record_key))
+
+    assert [index for index, _ in failures] == [1, 3]
+
+
+def test_event_loop_is_reused():
+    assert event_loop() is event_loop()
@@ -0,0 +1,399 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+from cloudly.logging.logger import Logger
+from cloudly.streams.common import (
+    AsyncDbStreamProcessor,
+    Change,
+    DbStreamProcessor,
+    ErrorPolicy,
+    StreamProcessor,
+)
+from cloudly.streams.dedup import ProcessedEvents
+from cloudly.streams.exceptions import BatchProcessingError
+from cloudly.testing.table import InMemoryTable
+
+
+@dataclass
+class FakeTable:
+    items: List[dict] = field(default_factory=list)
+
+    def put_item(self, Item, **kwargs):
+        self.items.append(Item)
+
+
+def normalize(image: dict) -> dict:
+    return {name: list(value.values())[0] for name, value in image.items()}
+
+
+def create_event(*changes):
+    records = []
+    for seq, (event_name, pk, status) in enumerate(changes):
+        image = {"pk": {"S": pk}, "sk": {"S": "A"}, "status": {"S": status}}
+        records.append(
+            {
+                "eventID": f"event-{seq}",
+                "eventName": event_name,
+                "dynamodb": {
+                    "Keys": {"pk": {"S": pk}, "sk": {"S": "A"}},
+                    "NewImage": image,
+                    "SequenceNumber": str(seq),
+                },
+            }
+        )
+    return {"Records": records}
+
+
+def create_processor(*processor_classes, **kwargs):
+    table = FakeTable()
+    logger = Logger.createLogger(__name__, "APP-01", FakeTable())
+    return StreamProcessor(processor_classes, table, logger, None, normalize, **kwargs)
+
+
+class RecordStatus(DbStreamProcessor):
+    def execute(self, change: Change) -> Change:
+        if change.new["status"] == "bad":
+            raise ValueError("bad status")
+        self.database_table.put_item(Item={**change.new})
+        return change
+
+
+class FailRecord(RecordStatus):
+    on_error = ErrorPolicy.FAIL_RECORD
+
+
+class FailBatch(RecordStatus):
+    on_error = ErrorPolicy.FAIL_BATCH
+
+
+def test_swallowed_failures_are_not_reported():
+    tested = create_processor(RecordStatus, report_batch_item_failures=True)
+
+    response = tested.run(create_event(("INSERT", "1", "bad"), ("INSERT", "2", "ok")))
+
+    assert response == {"batchItemFailures": []}
+    assert len(tested.database_table.items) == 1
+
+
+def test_failed_records_are_reported():
+    tested = create_processor(FailRecord, report_batch_item_failures=True)
+    event = create_event(
+        ("INSERT", "1", "bad"),
+        ("INSERT", "2", "ok"),
+        ("MODIFY", "1", "ok"),
+    )
+
+    response = tested.run(event)
+
+    assert response == {
+        "batchItemFailures": [{"itemIdentifier": "0"}, {"itemIdentifier": "2"}]
+    }
+    assert [item["pk"] for item in tested.database_table.items] == ["2"]
+
+
+def test_failed_batch_is_raised():
+    tested = create_processor(FailBatch, report_batch_item_failures=True)
+
+    with pytest.raises(BatchProcessingError):
+        tested.run(create_event(("INSERT", "1", "ok"), ("INSERT", "2", "bad")))
+
+
+def test_failed_record_fails_batch_without_reporting():
+    tested = create_processor(FailRecord)
+
+    with pytest.raises(BatchProcessingError):
+        tested.run(create_event(("INSERT", "1", "bad")))
+
+
+def create_buffered_processor(*processor_classes, **kwargs):
+    tested = create_processor(*processor_classes, buffer_writes=True, **kwargs)
+    tested.database_table = InMemoryTable()
+    return tested
+
+
+def written_keys(tested):
+    return sorted(pk for pk, _ in tested.database_table.items)
+
+
+def test_failed_batch_leaves_no_buffered_writes_behind():
+    tested = create_buffered_processor(FailBatch)
+
+    with pytest.raises(BatchProcessingError):
+        tested.run(
+            create_event(
+                ("INSERT", "a", "ok"), ("INSERT", "b", "ok"), ("INSERT", "x", "bad")
+            )
+        )
+    tested.run(create_event(("INSERT", "c", "ok")))
+
+    assert written_keys(tested) == ["c"]
+
+
+def test_writes_of_reported_records_are_not_flushed():
+    class WriteThenFail(FailRecord):
+        def execute(self, change: Change) -> Change:
+            self.database_table.put_item(Item={**change.new, "sk": "LOG"})
+            return super().execute(change)
+
+    tested = create_buffered_processor(
+        WriteThenFail, report_batch_item_failures=True, max_workers=2
+    )
+
+    response = tested.run(
+        create_event(
+            ("INSERT", "1", "ok"), ("INSERT", "2", "bad"), ("INSERT", "3", "ok")
+        )
+    )
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+    assert written_keys(tested) == ["1", "1", "3", "3"]
+
+
+def test_updates_are_not_overtaken_by_staged_writes():
+    class CreateThenCount(DbStreamProcessor):
+        def execute(self, change: Change) -> Change:
+            key = {"pk": change.pk, "sk": "COUNT"}
+            self.database_table.put_item(Item={**key, "n": 1})
+            self.database_table.update_item(
+                Key=key,
+                UpdateExpression="SET n = :n",
+                ExpressionAttributeValues={":n": 5},
+            )
+            return change
+
+    tested = create_buffered_processor(CreateThenCount)
+
+    tested.run(create_event(("INSERT", "1", "ok")))
+
+    assert tested.database_table.items[("1", "COUNT")]["n"] == 5
+
+
+def test_parallel_run_reports_failures():
+    tested = create_processor(
+        FailRecord, max_workers=4, report_batch_item_failures=True
+    )
+    changes = [("INSERT", str(i), "bad" if i == 3 else "ok") for i in range(8)]
+
+    response = tested.run(create_event(*changes))
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "3"}]}
+    assert len(tested.database_table.items) == 7
+
+
+def test_processors_only_run_for_routed_records():
+    calls = []
+
+    class OrdersOnly(DbStreamProcessor):
+        event_types = ("INSERT",)
+        pk_prefix = "ORDER#"
+
+        def execute(self, change: Change) -> Change:
+            calls.append(("orders", change.pk))
+            return change
+
+    class StatusChanges(DbStreamProcessor):
+        watch_fields = ("status",)
+
+        def execute(self, change: Change) -> Change:
+            calls.append(("status", change.pk))
+            return change
+
+    tested = create_processor(OrdersOnly, StatusChanges)
+    event = create_event(("INSERT", "ORDER#1", "new"), ("INSERT", "USER#1", "new"))
+    event["Records"].append(
+        {
+            "eventName": "MODIFY",
+            "dynamodb": {
+                "Keys": {"pk": {"S": "ORDER#1"}, "sk": {"S": "A"}},
+                "OldImage": {"pk": {"S": "ORDER#1"}, "status": {"S": "new"}},
+                "NewImage": {"pk": {"S": "ORDER#1"}, "status": {"S": "new"}},
+                "SequenceNumber": "2",
+            },
+        }
+    )
+
+    tested.run(event)
+
+    assert calls == [("orders", "ORDER#1"), ("status", "ORDER#1"), ("status", "USER#1")]
+
+
+def test_coalesce_runs_processors_once_per_item():
+    changes = []
+
+    class Collect(DbStreamProcessor):
+        def execute(self, change: Change) -> Change:
+            changes.append(change)
+            return change
+
+    tested = create_processor(Collect, coalesce=True)
+    event = create_event(
+        ("INSERT", "1", "new"),
+        ("MODIFY", "1", "paid"),
+        ("MODIFY", "1", "shipped"),
+        ("INSERT", "2", "new"),
+        ("REMOVE", "2", "new"),
+    )
+
+    tested.run(event)
+
+    assert len(changes) == 1
+    assert changes[0].event == "INSERT"
+    assert changes[0].new["status"] == "shipped"
+
+
+def test_processed_events_are_not_processed_again():
+    calls = []
+
+    class Collect(DbStreamProcessor):
+        def execute(self, change: Change) -> Change:
+            calls.append(change.event_id)
+            return change
+
+    processed = ProcessedEvents(InMemoryTable())
+    tested = create_processor(Collect, processed_events=processed)
+    event = create_event(("INSERT", "1", "new"), ("INSERT", "2", "new"))
+
+    tested.run(event)
+    tested.run(event)
+
+    assert calls == ["event-0", "event-1"]
+
+
+def test_processed_markers_wait_for_buffered_writes():
+    class Audit(RecordStatus):
+        def execute(self, change: Change) -> Change:
+            self.database_table.put_item(Item={**change.new, "sk": "AUDIT"})
+            return change
+
+    class Unavailable(InMemoryTable):
+        def batch_write_item(self, **kwargs):
+            raise ConnectionError("table unavailable")
+
+    events = InMemoryTable()
+    tested = create_buffered_processor(
+        Audit,
+        FailRecord,
+        report_batch_item_failures=True,
+        processed_events=ProcessedEvents(events),
+    )
+
+    response = tested.run(create_event(("INSERT", "1", "ok"), ("INSERT", "2", "bad")))
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+    assert sorted(events.items) == [
+        ("PROCESSED#event-0", "Audit"),
+        ("PROCESSED#event-0", "FailRecord"),
+    ]
+
+    events = InMemoryTable()
+    tested = create_buffered_processor(Audit, processed_events=ProcessedEvents(events))
+    tested.database_table = Unavailable()
+
+    with pytest.raises(ConnectionError):
+        tested.run(create_event(("INSERT", "1", "ok")))
+    assert not events.items
+
+
+class FakeContext:
+    def __init__(self, *remaining_ms):
+        self.remaining_ms = list(remaining_ms)
+
+    def get_remaining_time_in_millis(self):
+        return (
+            self.remaining_ms.pop(0)
+            if len(self.remaining_ms) > 1
+            else self.remaining_ms[0]
+        )
+
+
+def test_run_stops_before_the_deadline():
+    tested = create_processor(
+        RecordStatus, report_batch_item_failures=True, safety_margin_ms=1000
+    )
+    event = create_event(*[("INSERT", str(i), "ok") for i in range(4)])
+
+    response = tested.run(event, FakeContext(5000, 5000, 900))
+
+    assert response == {
+        "batchItemFailures": [{"itemIdentifier": "2"}, {"itemIdentifier": "3"}]
+    }
+    assert len(tested.database_table.items) == 2
+    assert tested.last_report.deferred == 2
+    assert [t.sequence_number for t in tested.last_report.timings] == ["0", "1"]
+
+
+def test_short_timeouts_still_make_progress():
+    tested = create_processor(RecordStatus, report_batch_item_failures=True)
+    event = create_event(*[("INSERT", str(i), "ok") for i in range(3)])
+
+    response = tested.run(event, FakeContext(2900))
+
+    assert response == {"batchItemFailures": []}
+    assert len(tested.database_table.items) == 3
+
+    tested = create_processor(RecordStatus, report_batch_item_failures=True)
+
+    response = tested.run(event, FakeContext(2900, 1000))
+
+    assert response == {
+        "batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "2"}]
+    }
+    assert len(tested.database_table.items) == 1
+
+
+def test_deadline_is_not_checked_without_reporting():
+    tested = create_processor(RecordStatus)
+    event = create_event(*[("INSERT", str(i), "ok") for i in range(3)])
+
+    tested.run(event, FakeContext(2900, 1000))
+
+    assert len(tested.database_table.items) == 3
+
+
+def test_async_processors_mix_with_sync_processors():
+    calls = []
+
+    class Notify(AsyncDbStreamProcessor):
+        async def execute(self, change: Change) -> Change:
+            await asyncio.sleep(0)
+            calls.append(("notify", change.pk))
+            return change
+
+    class Audit(DbStreamProcessor):
+        def execute(self, change: Change) -> Change:
+            calls.append(("audit", change.pk))
+            return change
+
+    tested = create_processor(Notify, Audit, report_batch_item_failures=True)
+
+    response = tested.run(create_event(("INSERT", "1", "ok"), ("MODIFY", "1", "ok")))
+
+    assert response == {"batchItemFailures": []}
+    assert calls == [("notify", "1"), ("audit", "1"), ("notify", "1"), ("audit", "1")]
+
+
+def test_sync_processors_do_not_block_async_processors():
+    released = threading.Event()
+    waited = []
+
+    class Wait(DbStreamProcessor):
+        def execute(self, change: Change) -> Change:
+            if change.pk == "1":
+                waited.append(released.wait(timeout=1))
+            return change
+
+    class Release(AsyncDbStreamProcessor):
+        async def execute(self, change: Change) -> Change:
+            if change.pk == "2":
+                released.set()
+            return change
+
+    tested = create_processor(Wait, Release, report_batch_item_failures=True)
+
+    tested.run(create_event(("INSERT", "1", "ok"), ("INSERT", "2", "ok")))
+
+    assert waited == [True]
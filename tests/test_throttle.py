@@ -0,0 +1,81 @@
+from cloudly.http.throttle import Throttle
+from cloudly.testing.table import InMemoryTable
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def event_of(client_id=None, username=None):
+    claims = {"client_id": client_id, "username": username}
+    return {"requestContext": {"authorizer": {"jwt": {"claims": claims}}}}
+
+
+def test_bucket_allows_bursts_and_refills():
+    clock = Clock()
+    throttle = Throttle(rate=2, burst=3, clock=clock)
+    event = event_of(client_id="app")
+
+    assert [throttle.allow(event) for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 0.5
+    assert throttle.allow(event)
+    assert not throttle.allow(event)
+
+
+def test_callers_have_separate_buckets():
+    throttle = Throttle(rate=1, clock=Clock())
+
+    assert throttle.allow(event_of(client_id="a"))
+    assert throttle.allow(event_of(username="b"))
+    assert not throttle.allow(event_of(client_id="a"))
+
+
+def test_anonymous_requests_are_not_limited():
+    throttle = Throttle(rate=1, clock=Clock())
+
+    assert all(throttle.allow({}) for _ in range(5))
+
+
+def test_least_recent_callers_are_forgotten():
+    throttle = Throttle(rate=1, max_callers=2, clock=Clock())
+
+    for caller in ("a", "b", "c"):
+        throttle.allow(event_of(client_id=caller))
+
+    assert list(throttle._buckets) == ["b", "c"]
+
+
+def test_shared_table_limits_across_containers():
+    table = InMemoryTable()
+    clock = Clock(now=120.0)
+    containers = [
+        Throttle(rate=0.05, burst=5, table=table, wall_clock=clock, clock=clock)
+        for _ in range(2)
+    ]
+    event = event_of(client_id="app")
+
+    allowed = [container.allow(event) for container in containers for _ in range(3)]
+
+    # 0.05 requests per second over the 60 second window
+    assert allowed.count(True) == 3
+    item = table.get_item(Key={"pk": "THROTTLE#app", "sk": "120"})["Item"]
+    assert item["count"] == 3
+    assert item["expires"] == 240
+
+    clock.now += 60
+    assert containers[1].allow(event)
+
+
+def test_unreachable_table_allows_requests():
+    class BrokenTable:
+        def update_item(self, **kwargs):
+            raise ConnectionError("no route")
+
+    throttle = Throttle(rate=1, table=BrokenTable(), clock=Clock())
+
+    assert throttle.allow(event_of(client_id="app"))